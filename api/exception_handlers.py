@@ -3,13 +3,15 @@
 统一处理 HTTPException 和未捕获的异常，提供标准化的 JSON 错误响应。
 """
 
-import traceback
-
-from fastapi import Request, HTTPException
-from fastapi.responses import JSONResponse
+import orjson
+from fastapi import Request, HTTPException, Response
 from starlette import status
 
 from core.logging import logger
+from api.responses import ORJSONResponse
+
+# 500 兜底响应体内容固定，模块加载时编码一次，异常路径上不再序列化
+_INTERNAL_ERROR_BODY = orjson.dumps({"code": 500, "message": "Internal Server Error"})
 
 
 async def http_exception_handler(request: Request, exc: HTTPException):
@@ -17,7 +19,7 @@ async def http_exception_handler(request: Request, exc: HTTPException):
     业务级 HTTPException 原样返回（如 400 参数校验失败），
     保留具体业务错误信息以便前端展示。
     """
-    return JSONResponse(
+    return ORJSONResponse(
         status_code=exc.status_code,
         content={"code": exc.status_code, "message": exc.detail}
     )
@@ -26,17 +28,20 @@ async def http_exception_handler(request: Request, exc: HTTPException):
 async def global_exception_handler(request: Request, exc: Exception):
     """
     全局兜底异常处理器：
-    - 将详细的错误 traceback 记录到 stderr（含请求路径和方法）
+    - 将详细的错误 traceback 记录到 stderr（含请求路径和方法），
+      traceback 经 exc_info 传递，由日志后台线程渲染，不占用请求处理时间
     - 返回给客户端泛化的错误信息，不泄露内部实现细节
     """
     logger.error(
-        "未处理异常 [%s %s]: %s\n%s",
+        "未处理异常 [%s %s] %s: %s",
         request.method,
         request.url.path,
-        str(exc),
-        traceback.format_exc()
+        type(exc).__name__,
+        exc,
+        exc_info=exc,
     )
-    return JSONResponse(
+    return Response(
+        content=_INTERNAL_ERROR_BODY,
         status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-        content={"code": 500, "message": "Internal Server Error"}
+        media_type="application/json",
     )
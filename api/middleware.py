@@ -1,49 +1,93 @@
 """
 JWT 认证中间件
 拦截所有请求，校验 JWT Token，白名单路径和 CORS 预检请求放行。
+
+采用纯 ASGI 中间件实现：直接读取 scope 中的原始 headers，
+不构造 Request 对象，也不引入 BaseHTTPMiddleware 的任务组开销。
 """
 
 import jwt
-from fastapi import Request
-from fastapi.responses import JSONResponse
+import orjson
 from starlette import status
 
-from core.config import JWT_SECRET, JWT_ALGORITHM
-from core.security import is_jwt_whitelisted
-
-
-async def verify_jwt_token(request: Request, call_next):
-    """JWT Token 校验中间件"""
-    # 放行 CORS 预检请求（浏览器在发送带自定义 Header 的跨域请求前会先发 OPTIONS）
-    if request.method == "OPTIONS":
-        return await call_next(request)
-
-    # 使用正则白名单匹配，支持文档子路径
-    if is_jwt_whitelisted(request.url.path):
-        return await call_next(request)
-
-    auth_header = request.headers.get("Authorization")
-    if not auth_header or not auth_header.startswith("Bearer "):
-        return JSONResponse(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            content={"code": 401, "message": "缺失或无效的认证 Token"}
-        )
-
-    token = auth_header.split(" ")[1]
-    try:
-        # 解析并校验 Token（会自动校验 exp 过期时间）
-        payload = jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGORITHM])
-        # 将用户信息挂载到 request.state 以供后续路由使用
-        request.state.user = payload
-    except jwt.ExpiredSignatureError:
-        return JSONResponse(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            content={"code": 401, "message": "Token 已过期，请重新登录"}
-        )
-    except jwt.InvalidTokenError:
-        return JSONResponse(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            content={"code": 401, "message": "无效的 Token"}
-        )
-
-    return await call_next(request)
+from core.security import decode_jwt_token, is_jwt_whitelisted
+
+
+def _unauthorized(message: str) -> tuple:
+    """
+    预构建 401 响应（模块加载时生成一次，请求期间直接复用）。
+    返回 (响应头列表, 响应体)；响应体与 Content-Length 均已提前编码。
+    """
+    body = orjson.dumps({"code": 401, "message": message})
+    headers = (
+        (b"content-type", b"application/json"),
+        (b"content-length", str(len(body)).encode("latin-1")),
+    )
+    return headers, body
+
+
+_RESP_MISSING_TOKEN = _unauthorized("缺失或无效的认证 Token")
+_RESP_EXPIRED_TOKEN = _unauthorized("Token 已过期，请重新登录")
+_RESP_INVALID_TOKEN = _unauthorized("无效的 Token")
+
+
+class JWTAuthMiddleware:
+    """JWT Token 校验中间件（纯 ASGI 实现）"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        # 非 HTTP 请求（lifespan / websocket）直接放行
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        # 放行 CORS 预检请求（浏览器在发送带自定义 Header 的跨域请求前会先发 OPTIONS）
+        if scope["method"] == "OPTIONS":
+            await self.app(scope, receive, send)
+            return
+
+        # 使用正则白名单匹配，支持文档子路径
+        if is_jwt_whitelisted(scope["path"]):
+            await self.app(scope, receive, send)
+            return
+
+        auth_header = None
+        for key, value in scope["headers"]:
+            if key == b"authorization":
+                auth_header = value.decode("latin-1")
+                break
+
+        if not auth_header or not auth_header.startswith("Bearer "):
+            await self._send_unauthorized(send, _RESP_MISSING_TOKEN)
+            return
+
+        token = auth_header.split(" ")[1]
+        try:
+            # 解析并校验 Token：签名校验结果按 Token 缓存，exp 每次都会重新检查
+            payload = decode_jwt_token(token)
+        except jwt.ExpiredSignatureError:
+            await self._send_unauthorized(send, _RESP_EXPIRED_TOKEN)
+            return
+        except jwt.InvalidTokenError:
+            await self._send_unauthorized(send, _RESP_INVALID_TOKEN)
+            return
+
+        # 将用户信息挂载到 scope["state"]，路由中可通过 request.state.user 读取
+        scope.setdefault("state", {})["user"] = payload
+        await self.app(scope, receive, send)
+
+    @staticmethod
+    async def _send_unauthorized(send, response: tuple):
+        """
+        直接写出预构建的 401 响应。
+        headers 每次复制为新列表：外层中间件（如压缩）可能原地修改响应头。
+        """
+        headers, body = response
+        await send({
+            "type": "http.response.start",
+            "status": status.HTTP_401_UNAUTHORIZED,
+            "headers": list(headers),
+        })
+        await send({"type": "http.response.body", "body": body})
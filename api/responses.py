@@ -0,0 +1,40 @@
+"""
+orjson 响应类
+替代标准库 json.dumps 序列化，作为全局默认响应类以降低大列表接口的编码开销。
+"""
+
+import datetime
+from decimal import Decimal
+from typing import Any
+
+import orjson
+from fastapi.responses import JSONResponse
+
+
+def _orjson_default(obj: Any) -> Any:
+    """orjson 无法原生处理的类型兜底（ClickHouse 返回的 Decimal、日期等）"""
+    if isinstance(obj, Decimal):
+        return float(obj)
+    if isinstance(obj, (datetime.date, datetime.datetime)):
+        return obj.isoformat()
+    return str(obj)
+
+
+class ORJSONResponse(JSONResponse):
+    """基于 orjson 的 JSON 响应，兼容 numpy 数值与非字符串键"""
+
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(
+            content,
+            option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY,
+            default=_orjson_default,
+        )
+
+
+def ok_response(data: Any) -> ORJSONResponse:
+    """
+    直接以 orjson 序列化标准成功响应 {"code": 200, "message": "ok", "data": ...}。
+    跳过 response_model 校验与 jsonable_encoder 遍历，
+    仅用于数据结构已由 format_* 函数保证的大列表接口（留存矩阵、趋势）。
+    """
+    return ORJSONResponse(content={"code": 200, "message": "ok", "data": data})
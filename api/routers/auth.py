@@ -3,15 +3,19 @@
 POST /api/auth/login — 用户登录，返回 JWT Token。
 """
 
-from fastapi import APIRouter
-from fastapi.responses import JSONResponse
+import orjson
+from fastapi import APIRouter, Response
 from pydantic import BaseModel
 from starlette import status
+from starlette.concurrency import run_in_threadpool
 
 from services.auth_service import authenticate_user
 
 router = APIRouter(prefix="/api/auth", tags=["认证"])
 
+# 登录失败响应体为常量，模块加载时预序列化
+_LOGIN_FAILED_BODY = orjson.dumps({"code": 401, "message": "用户名或密码错误"})
+
 
 class LoginRequest(BaseModel):
     username: str
@@ -19,12 +23,16 @@ class LoginRequest(BaseModel):
 
 
 @router.post("/login")
-def login(request: LoginRequest):
-    """用户登录接口"""
-    result = authenticate_user(request.username, request.password)
+async def login(request: LoginRequest):
+    """
+    用户登录接口。
+    路由本身在事件循环上运行，仅将口令校验与 Token 签名（CPU 计算）交给线程池。
+    """
+    result = await run_in_threadpool(authenticate_user, request.username, request.password)
     if result is None:
-        return JSONResponse(
+        return Response(
+            content=_LOGIN_FAILED_BODY,
             status_code=status.HTTP_401_UNAUTHORIZED,
-            content={"code": 401, "message": "用户名或密码错误"}
+            media_type="application/json"
         )
     return {"code": 200, "data": result}
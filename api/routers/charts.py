@@ -9,16 +9,18 @@ GET /api/charts/rfm       — RFM 分布
 GET /api/charts/retention — 留存矩阵
 """
 
-from typing import Optional, List
+from typing import Annotated, Optional, List
 
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Query
 
-from core.config import PERIOD_MAP
+from core.cache import ttl_cache_by_args
+from core.config import PERIOD_MAP, PERIOD_SET, TREND_TARGET_PIXELS, TREND_MAX_PIXELS
 from db.manager import db_manager
 from services.dashboard_service import (
     resolve_dates, get_core_metrics_data, format_trend, format_funnel,
     format_rankings, format_dimensions, format_rfm, format_retention
 )
+from api.responses import ok_response
 from api.schemas import (
     ApiResponse, CoreMetricsData, TrendData, NameValueItem,
     RankingsData, DimensionsData
@@ -28,13 +30,14 @@ router = APIRouter(prefix="/api", tags=["图表"])
 
 
 @router.get("/metrics/core", response_model=ApiResponse[CoreMetricsData])
+@ttl_cache_by_args
 def get_core_metrics(
     start_date: Optional[str] = None,
     end_date: Optional[str] = None,
     period: str = 'day'
 ):
     """核心指标端点。period 参数校验为业务级错误，使用 HTTPException 抛出。"""
-    if period not in PERIOD_MAP:
+    if period not in PERIOD_SET:
         raise HTTPException(status_code=400, detail="period 参数非法，仅支持 day/week/month")
 
     backend = db_manager.get_backend()
@@ -44,22 +47,25 @@ def get_core_metrics(
 
 
 @router.get("/charts/trend", response_model=ApiResponse[TrendData])
+@ttl_cache_by_args
 def get_trend_chart(
     start_date: Optional[str] = None,
     end_date: Optional[str] = None,
-    period: str = 'day'
+    period: str = 'day',
+    target_pixels: Annotated[int, Query(ge=1, le=TREND_MAX_PIXELS)] = TREND_TARGET_PIXELS
 ):
-    """销售趋势图表"""
-    if period not in PERIOD_MAP:
+    """销售趋势图表（大列表接口，直接 orjson 序列化，跳过响应模型校验；点数过多时按 M4 降采样）"""
+    if period not in PERIOD_SET:
         raise HTTPException(status_code=400, detail="period 参数非法，仅支持 day/week/month")
 
     backend = db_manager.get_backend()
     sd, ed = resolve_dates(start_date, end_date, backend)
     trend = backend.fetch_trend(sd, ed, PERIOD_MAP[period])
-    return ApiResponse(data=format_trend(trend))
+    return ok_response(format_trend(trend, target_pixels))
 
 
 @router.get("/charts/funnel", response_model=ApiResponse[List[NameValueItem]])
+@ttl_cache_by_args
 def get_funnel_chart(start_date: Optional[str] = None, end_date: Optional[str] = None):
     """转化漏斗图表"""
     backend = db_manager.get_backend()
@@ -69,6 +75,7 @@ def get_funnel_chart(start_date: Optional[str] = None, end_date: Optional[str] =
 
 
 @router.get("/charts/rankings", response_model=ApiResponse[RankingsData])
+@ttl_cache_by_args
 def get_rankings_chart(start_date: Optional[str] = None, end_date: Optional[str] = None):
     """Top10 商品排行"""
     backend = db_manager.get_backend()
@@ -78,17 +85,17 @@ def get_rankings_chart(start_date: Optional[str] = None, end_date: Optional[str]
 
 
 @router.get("/charts/dimensions", response_model=ApiResponse[DimensionsData])
+@ttl_cache_by_args
 def get_dimensions_chart(start_date: Optional[str] = None, end_date: Optional[str] = None):
     """多维分析图表（品类/渠道/年龄）"""
     backend = db_manager.get_backend()
     sd, ed = resolve_dates(start_date, end_date, backend)
-    cat_rows = backend.fetch_category(sd, ed)
-    chan_rows = backend.fetch_channel(sd, ed)
-    age_rows = backend.fetch_age_group(sd, ed)
-    return ApiResponse(data=format_dimensions(cat_rows, chan_rows, age_rows))
+    dims = backend.fetch_dimensions(sd, ed)
+    return ApiResponse(data=format_dimensions(dims["category"], dims["channel"], dims["age_group"]))
 
 
 @router.get("/charts/rfm", response_model=ApiResponse[List[NameValueItem]])
+@ttl_cache_by_args
 def get_rfm_chart(start_date: Optional[str] = None, end_date: Optional[str] = None):
     """RFM 分布图表"""
     backend = db_manager.get_backend()
@@ -98,9 +105,10 @@ def get_rfm_chart(start_date: Optional[str] = None, end_date: Optional[str] = No
 
 
 @router.get("/charts/retention", response_model=ApiResponse[List[list]])
+@ttl_cache_by_args
 def get_retention_chart(start_date: Optional[str] = None, end_date: Optional[str] = None):
-    """留存矩阵图表"""
+    """留存矩阵图表（大列表接口，直接 orjson 序列化，跳过响应模型校验）"""
     backend = db_manager.get_backend()
     sd, ed = resolve_dates(start_date, end_date, backend)
     cohort_rows = backend.fetch_cohort(sd, ed)
-    return ApiResponse(data=format_retention(cohort_rows))
+    return ok_response(format_retention(cohort_rows))
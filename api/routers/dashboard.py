@@ -4,11 +4,14 @@ GET /api/dashboard/all  — 聚合端点，一次返回所有看板数据
 GET /api/config/date_range — 获取数据日期范围配置
 """
 
-from typing import Optional
+import hashlib
+from typing import Annotated, Optional
 
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Query, Request, Response
+from starlette.concurrency import run_in_threadpool
 
-from core.config import PERIOD_MAP
+from core.cache import ttl_cache_by_args
+from core.config import PERIOD_SET, DATE_RANGE_CACHE_TTL, TREND_TARGET_PIXELS, TREND_MAX_PIXELS
 from db.manager import db_manager
 from dao.user_dao import fetch_date_range
 from services.dashboard_service import resolve_dates, get_dashboard_all_data
@@ -18,21 +21,26 @@ router = APIRouter(prefix="/api", tags=["看板"])
 
 
 @router.get("/dashboard/all", response_model=ApiResponse[DashboardAllData])
-def get_dashboard_all(
+@ttl_cache_by_args
+async def get_dashboard_all(
     start_date: Optional[str] = None,
     end_date: Optional[str] = None,
-    period: str = 'day'
+    period: str = 'day',
+    target_pixels: Annotated[int, Query(ge=1, le=TREND_MAX_PIXELS)] = TREND_TARGET_PIXELS
 ):
     """
     聚合端点：一次请求返回所有看板数据。
     将 8 次 HTTP 请求合并为 1 次，内部只调用一次 resolve_dates。
+    阻塞的数据库操作均交给线程池执行，不阻塞事件循环。
+    target_pixels 为趋势图宽度（像素列数，1 ~ TREND_MAX_PIXELS，越界由参数校验返回 422），
+    趋势点数远超该宽度时按 M4 降采样。
     """
-    if period not in PERIOD_MAP:
+    if period not in PERIOD_SET:
         raise HTTPException(status_code=400, detail="period 参数非法，仅支持 day/week/month")
 
-    backend = db_manager.get_backend()
-    sd, ed = resolve_dates(start_date, end_date, backend)
-    data = get_dashboard_all_data(sd, ed, period, backend)
+    backend = await run_in_threadpool(db_manager.get_backend)
+    sd, ed = await run_in_threadpool(resolve_dates, start_date, end_date, backend)
+    data = await get_dashboard_all_data(sd, ed, period, backend, target_pixels)
     resp = ApiResponse(data=data)
     
     from core.logging import logger
@@ -42,8 +50,21 @@ def get_dashboard_all(
 
 
 @router.get("/config/date_range", response_model=ApiResponse[DateRangeConfigData])
-def get_date_range_config():
-    """获取数据日期范围配置"""
+def get_date_range_config(request: Request, response: Response):
+    """
+    获取数据日期范围配置。
+    日期范围仅在 ETL 导入后变化，响应携带 ETag，浏览器带 If-None-Match 复查时命中直接返回 304。
+    """
     backend = db_manager.get_backend()
     base_start, base_end = fetch_date_range(backend)
+
+    etag = '"' + hashlib.md5(f"{base_start}{base_end}".encode()).hexdigest() + '"'
+    cache_headers = {
+        "ETag": etag,
+        "Cache-Control": f"max-age={int(DATE_RANGE_CACHE_TTL)}",
+    }
+    if request.headers.get("If-None-Match") == etag:
+        return Response(status_code=304, headers=cache_headers)
+
+    response.headers.update(cache_headers)
     return ApiResponse(data={"min": base_start, "max": base_end})
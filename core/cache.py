@@ -0,0 +1,107 @@
+"""
+进程内 TTL 缓存模块
+缓存图表/看板接口序列化后的响应体，看板轮询时相同 (路由, 日期, period) 直接命中，
+跳过 SQL 聚合与 JSON 序列化。
+
+说明：ETL 以独立进程运行，无法在写库后主动通知本进程，
+因此缓存新鲜度由 TTL 兜底；需要立即生效时可调用 response_cache.clear()。
+"""
+
+import time
+import inspect
+import threading
+import functools
+from collections import OrderedDict
+from typing import Any, Hashable, Optional
+
+import orjson
+from fastapi import Response
+from fastapi.encoders import jsonable_encoder
+
+# 响应缓存参数
+RESPONSE_CACHE_MAXSIZE = 512     # 最多缓存条目数（超出按 LRU 淘汰）
+RESPONSE_CACHE_TTL = 60.0        # 缓存有效期（秒）
+
+
+class TTLCache:
+    """
+    带容量上限的线程安全 TTL 缓存。
+    同步路由运行在线程池中，读写统一由 Lock 保护。
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """命中且未过期返回缓存值，否则返回 None"""
+        now = time.monotonic()
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            expires_at, value = item
+            if expires_at <= now:
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: Hashable, value: Any) -> None:
+        """写入缓存，超出容量时淘汰最久未使用的条目"""
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self) -> None:
+        """清空缓存（数据重新导入后手动失效）"""
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+# 全局响应缓存实例
+response_cache = TTLCache(maxsize=RESPONSE_CACHE_MAXSIZE, ttl=RESPONSE_CACHE_TTL)
+
+
+def _encode(result: Any) -> bytes:
+    """路由返回值 → JSON 字节；已是 Response（预序列化）时直接取其 body"""
+    if isinstance(result, Response):
+        return result.body
+    return orjson.dumps(jsonable_encoder(result))
+
+
+def ttl_cache_by_args(func):
+    """
+    路由级响应缓存装饰器。
+    以 (路由函数名, 查询参数) 为键缓存序列化后的 JSON 字节，命中时直接返回 Response。
+    抛出的 HTTPException 不会被缓存。同时支持 def 与 async def 路由。
+    """
+    if inspect.iscoroutinefunction(func):
+        @functools.wraps(func)
+        async def async_wrapper(*args, **kwargs):
+            key = (func.__qualname__, args, tuple(sorted(kwargs.items())))
+            body = response_cache.get(key)
+            if body is None:
+                body = _encode(await func(*args, **kwargs))
+                response_cache.set(key, body)
+            return Response(content=body, media_type="application/json")
+
+        return async_wrapper
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        key = (func.__qualname__, args, tuple(sorted(kwargs.items())))
+        body = response_cache.get(key)
+        if body is None:
+            body = _encode(func(*args, **kwargs))
+            response_cache.set(key, body)
+        return Response(content=body, media_type="application/json")
+
+    return wrapper
@@ -6,14 +6,41 @@
 import os
 import re
 
+# SQLite 看板索引与按日预聚合表语句与 ETL 共用，定义见 sqlite_schema.py
+from sqlite_schema import SQLITE_INDEX_STMTS, SQLITE_ROLLUP_TABLES, SQLITE_ROLLUP_STMTS  # noqa: F401
+
 # --- 数据库配置 ---
 
 SQLITE_DB = "ecommerce.db"
 
+# SQLite 连接池大小：长连接跨请求复用，保留页缓存
+SQLITE_POOL_SIZE = min(os.cpu_count() or 4, 8)
+
+# SQLite 连接级 PRAGMA（WAL 并发读 + 内存临时表 + 64MiB 页缓存 + 256MiB mmap）
+SQLITE_PRAGMAS = (
+    "journal_mode=WAL",
+    "busy_timeout=5000",
+    "synchronous=NORMAL",
+    "temp_store=MEMORY",
+    "cache_size=-65536",
+    "mmap_size=268435456",
+)
+
+# 日期范围缓存 TTL（秒）：MIN/MAX(date) 只在 ETL 导入后变化
+DATE_RANGE_CACHE_TTL = 3600.0
+
+# ClickHouse 连接参数（环境变量与 ETL ConfigManager 保持一致）
+CH_HOST = os.environ.get("CH_HOST", "localhost")
+CH_PORT = int(os.environ.get("CH_PORT", "8123"))
+CH_USER = os.environ.get("CH_USER", "default")
+CH_PASSWORD = os.environ.get("CH_PASSWORD", "password123")
+CH_DATABASE = os.environ.get("CH_DATABASE", "default")
+
 # ClickHouse 重连重试：指数退避策略，避免网络抖动导致服务不可用
 CH_MAX_RETRIES = 3          # 最大重试次数
 CH_RETRY_BASE_DELAY = 1.0   # 初始退避延迟（秒）
 CH_RETRY_BACKOFF = 2.0      # 退避倍数
+CH_HEARTBEAT_TTL = 10.0     # 心跳成功后的免检时长（秒），期间不再发送 SELECT 1
 
 # --- CORS 配置 ---
 
@@ -32,9 +59,22 @@ PERIOD_MAP = {
     "month": {"sqlite": "%Y-%m",    "ch": "%Y-%m",    "label": "月"},
 }
 
-# 日期格式正则（编译一次复用，避免重复编译开销）
+# 合法 period 取值集合（路由层参数校验用，frozenset 成员判断无需再经 dict 取值）
+PERIOD_SET = frozenset(PERIOD_MAP)
+
+# 趋势图 M4 降采样：默认目标像素列数（前端图表宽度量级），点数超过 4 倍像素列时降采样
+TREND_TARGET_PIXELS = 400
+# target_pixels 请求参数上限（超宽屏图表宽度量级）：限制缓存键取值范围，过大的值也会使降采样失效
+TREND_MAX_PIXELS = 4096
+
+# 日期格式正则（请求路径已改用 date.fromisoformat 校验，保留供严格格式匹配场景使用）
 DATE_PATTERN = re.compile(r'^\d{4}-\d{2}-\d{2}$')
 
+# --- 响应压缩配置 ---
+
+GZIP_MINIMUM_SIZE = 1024     # 响应体小于该字节数不压缩
+GZIP_COMPRESS_LEVEL = 5      # 压缩级别（1-9），5 在压缩比与 CPU 开销间折中
+
 # --- JWT 安全配置 ---
 
 JWT_SECRET = os.environ.get("JWT_SECRET", "graduation_project_super_secret_key_2026")
@@ -42,16 +82,19 @@ JWT_ALGORITHM = "HS256"
 JWT_EXPIRATION_HOURS = 24
 
 # JWT 白名单路径：匹配的请求跳过 Token 校验（Swagger 文档和登录接口）
-JWT_WHITELIST_PATTERNS = [
-    re.compile(r"^/docs(/.*)?$"),         # Swagger UI 及其静态资源
-    re.compile(r"^/redoc(/.*)?$"),         # ReDoc 及其静态资源
-    re.compile(r"^/openapi\.json$"),       # OpenAPI 规范
-    re.compile(r"^/api/auth/login$"),       # 登录接口
-    re.compile(r"^/$"),                    # 前端首页
-    re.compile(r"^/index\.html$"),         # 前端首页
-    re.compile(r"^/assets(/.*)?$"),        # Vite 静态资源
-    re.compile(r"^/(favicon\.ico|.*\.(png|jpg|jpeg|gif|svg|woff2?|ttf|css|js))$"), # 前端散落资源
-]
+# 各分支合并为单个交替正则，每个请求只需一次 match 调用
+JWT_WHITELIST_RE = re.compile(
+    r"^(?:"
+    r"/docs(?:/.*)?"                # Swagger UI 及其静态资源
+    r"|/redoc(?:/.*)?"              # ReDoc 及其静态资源
+    r"|/openapi\.json"              # OpenAPI 规范
+    r"|/api/auth/login"             # 登录接口
+    r"|/"                           # 前端首页
+    r"|/index\.html"                # 前端首页
+    r"|/assets(?:/.*)?"             # Vite 静态资源
+    r"|/(?:favicon\.ico|.*\.(?:png|jpg|jpeg|gif|svg|woff2?|ttf|css|js))"  # 前端散落资源
+    r")$"
+)
 
 # --- LLM 大语言模型配置 ---
 
@@ -1,16 +1,41 @@
 """
 日志配置模块
 统一日志格式和输出方式，全项目共用 logger 实例。
+
+请求线程只把 LogRecord 放入内存队列，由后台 QueueListener 线程负责格式化
+（含 traceback 渲染）与 stderr 写入，避免异常高峰时日志 I/O 阻塞请求处理。
 """
 
 import sys
+import queue
+import atexit
 import logging
+import logging.handlers
 
 logger = logging.getLogger("ecommerce_backend")
 logger.setLevel(logging.INFO)
 
+
+class _DeferredQueueHandler(logging.handlers.QueueHandler):
+    """
+    不在调用线程预格式化的 QueueHandler。
+    标准实现的 prepare() 会在入队前调用 format()（含 traceback.format_exception），
+    队列仅在进程内使用，无需序列化，直接入队原始 record，格式化推迟到监听线程。
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
 _stderr_handler = logging.StreamHandler(sys.stderr)
 _stderr_handler.setFormatter(logging.Formatter(
     "%(asctime)s [%(levelname)s] %(name)s: %(message)s"
 ))
-logger.addHandler(_stderr_handler)
+
+_log_queue: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+_listener = logging.handlers.QueueListener(_log_queue, _stderr_handler)
+_listener.start()
+# 进程退出前排空队列，保证最后的日志不丢失
+atexit.register(_listener.stop)
+
+logger.addHandler(_DeferredQueueHandler(_log_queue))
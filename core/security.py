@@ -1,32 +1,102 @@
 """
 JWT 安全工具模块
-提供 Token 签发、解码和白名单检查功能。
+提供口令哈希校验、Token 签发、解码和白名单检查功能。
 """
 
-import datetime
+import os
+import hmac
+import time
+import base64
+import hashlib
+from functools import lru_cache
+
 import jwt
+import orjson
 
-from core.config import JWT_SECRET, JWT_ALGORITHM, JWT_EXPIRATION_HOURS, JWT_WHITELIST_PATTERNS
+from core.config import JWT_SECRET, JWT_ALGORITHM, JWT_EXPIRATION_HOURS, JWT_WHITELIST_RE
 
 
-def create_jwt_token(username: str, role: str) -> str:
-    """签发 JWT Token"""
-    expiration = datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(
-        hours=JWT_EXPIRATION_HOURS
+def _b64url(data: bytes) -> bytes:
+    """JWT 使用的无填充 base64url 编码"""
+    return base64.urlsafe_b64encode(data).rstrip(b"=")
+
+
+# HS256 签发快速路径：Header 段与签名密钥在模块加载时构造一次
+_JWT_HEADER_SEGMENT = _b64url(orjson.dumps({"alg": JWT_ALGORITHM, "typ": "JWT"}))
+_JWT_KEY = JWT_SECRET.encode()
+
+
+@lru_cache(maxsize=64)
+def _sign_hs256(username: str, role: str, exp: int) -> str:
+    """
+    直接以 HMAC-SHA256 拼装签名 Token，跳过 PyJWT 的算法分发与 payload 校验。
+    按 (用户, 角色, exp) 缓存：exp 按分钟取整，同一分钟内重复登录复用同一个合法 Token。
+    """
+    signing_input = (
+        _JWT_HEADER_SEGMENT + b"." + _b64url(orjson.dumps({"sub": username, "role": role, "exp": exp}))
     )
-    payload = {
-        "sub": username,
-        "role": role,
-        "exp": expiration
-    }
+    signature = hmac.new(_JWT_KEY, signing_input, hashlib.sha256).digest()
+    return (signing_input + b"." + _b64url(signature)).decode()
+
+
+def create_jwt_token(username: str, role: str) -> str:
+    """签发 JWT Token（exp 按分钟取整，有效期最多提前不足一分钟结束）"""
+    exp = int(time.time()) // 60 * 60 + JWT_EXPIRATION_HOURS * 3600
+    if JWT_ALGORITHM == "HS256":
+        return _sign_hs256(username, role, exp)
+    payload = {"sub": username, "role": role, "exp": exp}
     return jwt.encode(payload, JWT_SECRET, algorithm=JWT_ALGORITHM)
 
 
+# 口令哈希参数（scrypt，约 16MB 内存 / 数十毫秒，抵御离线暴力破解）
+_SCRYPT_N = 2 ** 14
+_SCRYPT_R = 8
+_SCRYPT_P = 1
+
+
+def hash_password(password: str, salt: bytes | None = None) -> str:
+    """生成口令哈希，格式 scrypt$N$r$p$盐(hex)$摘要(hex)，参数随哈希保存以便日后调整"""
+    salt = salt if salt is not None else os.urandom(16)
+    digest = hashlib.scrypt(password.encode(), salt=salt, n=_SCRYPT_N, r=_SCRYPT_R, p=_SCRYPT_P)
+    return f"scrypt${_SCRYPT_N}${_SCRYPT_R}${_SCRYPT_P}${salt.hex()}${digest.hex()}"
+
+
+def verify_password(password: str, password_hash: str) -> bool:
+    """按哈希中记录的参数重新计算并以常量时间比较，格式非法时返回 False"""
+    try:
+        scheme, n, r, p, salt_hex, digest_hex = password_hash.split("$")
+        if scheme != "scrypt":
+            return False
+        digest = hashlib.scrypt(
+            password.encode(), salt=bytes.fromhex(salt_hex), n=int(n), r=int(r), p=int(p)
+        )
+        expected = bytes.fromhex(digest_hex)
+    except ValueError:
+        return False
+    return hmac.compare_digest(digest, expected)
+
+
+@lru_cache(maxsize=1024)
+def _decode_cached(token: str) -> dict:
+    """
+    缓存签名校验 + payload 解析结果（按原始 Token 字符串）。
+    仅缓存解码本身，不跳过过期检查：exp 由调用方每次对照当前时间校验。
+    """
+    return jwt.decode(
+        token, JWT_SECRET, algorithms=[JWT_ALGORITHM],
+        options={"verify_exp": False}
+    )
+
+
 def decode_jwt_token(token: str) -> dict:
-    """解码并校验 JWT Token（会自动校验 exp 过期时间）"""
-    return jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGORITHM])
+    """解码并校验 JWT Token（会校验 exp 过期时间，过期抛出 ExpiredSignatureError）"""
+    payload = _decode_cached(token)
+    exp = payload.get("exp")
+    if exp is not None and exp <= time.time():
+        raise jwt.ExpiredSignatureError("Signature has expired")
+    return payload
 
 
 def is_jwt_whitelisted(path: str) -> bool:
     """检查请求路径是否匹配 JWT 白名单"""
-    return any(pattern.match(path) for pattern in JWT_WHITELIST_PATTERNS)
+    return JWT_WHITELIST_RE.match(path) is not None
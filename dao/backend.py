@@ -7,9 +7,27 @@ from abc import ABC, abstractmethod
 from typing import Optional
 
 
+# 维度合并查询中 kind 判别列的取值（同时作为结果字典键）
+_DIMENSION_KINDS = ("category", "channel", "age_group")
+
+
+def _split_dimension_rows(rows) -> dict:
+    """
+    将 UNION ALL 合并查询的 (kind, key, sales) 行按判别列拆回三个 (key, sales) 列表。
+    UNION ALL 不保证各分支输出顺序（ClickHouse 会并行执行分支），拆分后按销售额重新降序。
+    """
+    result = {kind: [] for kind in _DIMENSION_KINDS}
+    for kind, key, sales in rows:
+        result[kind].append((key, sales))
+    for items in result.values():
+        items.sort(key=lambda r: r[1] or 0, reverse=True)
+    return result
+
+
 class DatabaseBackend(ABC):
     """
     数据库抽象基类，定义所有业务层所需的查询接口。
+    列表型查询统一返回原生 tuple 行（不物化为 dict），列顺序见各方法说明。
     """
     
     @abstractmethod
@@ -21,23 +39,38 @@ class DatabaseBackend(ABC):
         pass
 
     @abstractmethod
-    def fetch_comparison_sales(self, start_date: str, end_date: str) -> float:
+    def fetch_core_with_comparison(self, start_date: str, end_date: str,
+                                   prev_start: str, prev_end: str,
+                                   ly_start: str, ly_end: str) -> dict:
+        """
+        当期核心指标与环比/同比周期销售额合并为一次扫描，
+        返回 {total_sales, total_orders, prev_sales, ly_sales}
+        """
         pass
 
     @abstractmethod
     def fetch_top10(self, start_date: str, end_date: str) -> list:
+        """返回 (item_id, sales) 行"""
         pass
 
     @abstractmethod
     def fetch_category(self, start_date: str, end_date: str) -> list:
+        """返回 (category_id, sales) 行"""
         pass
 
     @abstractmethod
     def fetch_channel(self, start_date: str, end_date: str) -> list:
+        """返回 (channel, sales) 行"""
         pass
 
     @abstractmethod
     def fetch_age_group(self, start_date: str, end_date: str) -> list:
+        """返回 (age_group, sales) 行"""
+        pass
+
+    @abstractmethod
+    def fetch_dimensions(self, start_date: str, end_date: str) -> dict:
+        """品类/渠道/年龄段三个维度合并为一次查询，返回 {category, channel, age_group}，值为 (key, sales) 行"""
         pass
 
     @abstractmethod
@@ -50,28 +83,86 @@ class DatabaseBackend(ABC):
 
     @abstractmethod
     def fetch_rfm(self, start_date: str, end_date: str) -> list:
+        """返回 (rfm_label, cnt) 行"""
         pass
 
     @abstractmethod
     def fetch_cohort(self, start_date: str, end_date: str) -> list:
+        """返回 (cohort_date, day_diff, active_users, cohort_users) 行"""
         pass
 
 
+def _sqlite_sales_sql(use_rollups: bool) -> dict:
+    """
+    生成 SQLite 销售类查询语句。
+    use_rollups=True 读取按日汇总表（sales_daily*，见 sqlite_schema.SQLITE_ROLLUP_STMTS），
+    False 时直接聚合 buy_fact 明细（汇总表未就绪时回退），两套语句结果一致。
+    order_id 由 (user_id, ts, item_id) 派生，同一订单只落在一天内，按日订单数求和即区间订单数。
+    """
+    if use_rollups:
+        table, sales, dim_value = "sales_daily", "total_sales", "sales"
+        orders = "SUM({})".format
+        order_col = "total_orders"
+        dim_tables = {kind: f"sales_daily_{kind}" for kind in _DIMENSION_KINDS}
+    else:
+        table, sales, dim_value = "buy_fact", "price", "price"
+        orders = "COUNT(DISTINCT {})".format
+        order_col = "order_id"
+        dim_tables = dict.fromkeys(_DIMENSION_KINDS, "buy_fact")
+
+    dim_columns = {"category": ("category_id", " LIMIT 10"), "channel": ("channel", ""),
+                   "age_group": ("age_group", "")}
+    return {
+        "core": f"SELECT SUM({sales}) as total_sales, {orders(order_col)} as total_orders "
+                f"FROM {table} WHERE date BETWEEN ? AND ?",
+        "trend": f"SELECT strftime(?, date) as dt, SUM({sales}) as sales, {orders(order_col)} as orders "
+                 f"FROM {table} WHERE date BETWEEN ? AND ? GROUP BY dt ORDER BY dt",
+        # WHERE 仅覆盖三个区间（可走 date 索引），CASE 按日归属各区间，区间重叠时同一天可计入多列
+        "core_with_comparison":
+            f"SELECT SUM(CASE WHEN date BETWEEN ?1 AND ?2 THEN {sales} END), "
+            f"{orders(f'CASE WHEN date BETWEEN ?1 AND ?2 THEN {order_col} END')}, "
+            f"SUM(CASE WHEN date BETWEEN ?3 AND ?4 THEN {sales} END), "
+            f"SUM(CASE WHEN date BETWEEN ?5 AND ?6 THEN {sales} END) "
+            f"FROM {table} WHERE date BETWEEN ?1 AND ?2 "
+            f"OR date BETWEEN ?3 AND ?4 OR date BETWEEN ?5 AND ?6",
+        **{
+            kind: f"SELECT {column}, SUM({dim_value}) AS sales FROM {dim_tables[kind]} "
+                  f"WHERE date BETWEEN ? AND ? GROUP BY {column} ORDER BY sales DESC{limit}"
+            for kind, (column, limit) in dim_columns.items()
+        },
+        # 三个维度合并为一条 UNION ALL，kind 判别列标识各行所属维度
+        "dimensions": " UNION ALL ".join(
+            f"SELECT * FROM (SELECT '{kind}' AS kind, {column} AS key, SUM({dim_value}) AS sales "
+            f"FROM {dim_tables[kind]} WHERE date BETWEEN ?1 AND ?2 "
+            f"GROUP BY {column} ORDER BY sales DESC{limit})"
+            for kind, (column, limit) in dim_columns.items()
+        ),
+    }
+
+
+_SQLITE_SALES_SQL = {True: _sqlite_sales_sql(True), False: _sqlite_sales_sql(False)}
+
+
 class SqliteBackend(DatabaseBackend):
-    """SQLite 具体实现"""
+    """
+    SQLite 具体实现。
+    核心指标、趋势与维度分布优先读取按日汇总表；汇总表未就绪（db_manager.sqlite_rollups_ready 为 False）
+    时回退到 buy_fact 明细聚合。Top10、RFM 等需要行级明细的查询始终访问 buy_fact。
+    """
     
     def __init__(self, db_manager):
         self.db_manager = db_manager
+        self._sql = _SQLITE_SALES_SQL[bool(db_manager.sqlite_rollups_ready)]
+
+    def _fetch_tuples(self, sql: str, params: tuple) -> list:
+        """执行查询并以原生 tuple 返回所有行（跳过 sqlite3.Row 构造与 dict 物化）"""
+        with self.db_manager.get_sqlite_cursor() as cursor:
+            cursor.row_factory = None
+            return cursor.execute(sql, params).fetchall()
 
-    from dao.base import safe_float, safe_int
-    
     def fetch_core_metrics(self, start_date: str, end_date: str) -> dict:
         with self.db_manager.get_sqlite_cursor() as cursor:
-            row = cursor.execute(
-                "SELECT SUM(price) as total_sales, COUNT(DISTINCT order_id) as total_orders "
-                "FROM buy_fact WHERE date BETWEEN ? AND ?",
-                (start_date, end_date)
-            ).fetchone()
+            row = cursor.execute(self._sql["core"], (start_date, end_date)).fetchone()
             from dao.base import safe_float, safe_int
             return {
                 "total_sales": round(safe_float(row['total_sales']), 2) if row else 0.0,
@@ -80,61 +171,47 @@ class SqliteBackend(DatabaseBackend):
 
     def fetch_trend(self, start_date: str, end_date: str, period_cfg: dict) -> dict:
         sqlite_fmt = period_cfg["sqlite"]
-        with self.db_manager.get_sqlite_cursor() as cursor:
-            trend_rows = [dict(r) for r in cursor.execute(
-                "SELECT strftime(?, date) as dt, SUM(price) as sales, "
-                "COUNT(DISTINCT order_id) as orders "
-                "FROM buy_fact WHERE date BETWEEN ? AND ? "
-                "GROUP BY dt ORDER BY dt",
-                (sqlite_fmt, start_date, end_date)
-            ).fetchall()]
-            from dao.base import safe_float, safe_int
-            return {
-                "dates": [r['dt'] for r in trend_rows],
-                "sales": [round(safe_float(r['sales']), 2) for r in trend_rows],
-                "orders": [safe_int(r['orders']) for r in trend_rows],
-            }
+        trend_rows = self._fetch_tuples(self._sql["trend"], (sqlite_fmt, start_date, end_date))
+        from dao.base import fast_float, fast_int
+        return {
+            "dates": [dt for dt, _, _ in trend_rows],
+            "sales": [round(fast_float(sales), 2) for _, sales, _ in trend_rows],
+            "orders": [fast_int(orders) for _, _, orders in trend_rows],
+        }
 
-    def fetch_comparison_sales(self, start_date: str, end_date: str) -> Optional[float]:
-        with self.db_manager.get_sqlite_cursor() as cursor:
-            row = cursor.execute(
-                "SELECT SUM(price) as sales FROM buy_fact WHERE date BETWEEN ? AND ?",
-                (start_date, end_date)
-            ).fetchone()
-            from dao.base import safe_float
-            return safe_float(row['sales'], default=None) if row else None
+    def fetch_core_with_comparison(self, start_date: str, end_date: str,
+                                   prev_start: str, prev_end: str,
+                                   ly_start: str, ly_end: str) -> dict:
+        sales, orders, prev_sales, ly_sales = self._fetch_tuples(
+            self._sql["core_with_comparison"],
+            (start_date, end_date, prev_start, prev_end, ly_start, ly_end)
+        )[0]
+        from dao.base import safe_float, safe_int
+        return {
+            "total_sales": round(safe_float(sales), 2),
+            "total_orders": safe_int(orders),
+            "prev_sales": safe_float(prev_sales, default=None),
+            "ly_sales": safe_float(ly_sales, default=None),
+        }
 
     def fetch_top10(self, start_date: str, end_date: str) -> list:
-        with self.db_manager.get_sqlite_cursor() as cursor:
-            return [dict(r) for r in cursor.execute(
-                "SELECT item_id, SUM(price) as sales FROM buy_fact "
-                "WHERE date BETWEEN ? AND ? GROUP BY item_id ORDER BY sales DESC LIMIT 10",
-                (start_date, end_date)
-            ).fetchall()]
+        return self._fetch_tuples(
+            "SELECT item_id, SUM(price) as sales FROM buy_fact "
+            "WHERE date BETWEEN ? AND ? GROUP BY item_id ORDER BY sales DESC LIMIT 10",
+            (start_date, end_date)
+        )
 
     def fetch_category(self, start_date: str, end_date: str) -> list:
-        with self.db_manager.get_sqlite_cursor() as cursor:
-            return [dict(r) for r in cursor.execute(
-                "SELECT category_id, SUM(price) as sales FROM buy_fact "
-                "WHERE date BETWEEN ? AND ? GROUP BY category_id ORDER BY sales DESC LIMIT 10",
-                (start_date, end_date)
-            ).fetchall()]
+        return self._fetch_tuples(self._sql["category"], (start_date, end_date))
 
     def fetch_channel(self, start_date: str, end_date: str) -> list:
-        with self.db_manager.get_sqlite_cursor() as cursor:
-            return [dict(r) for r in cursor.execute(
-                "SELECT channel, SUM(price) as sales FROM buy_fact "
-                "WHERE date BETWEEN ? AND ? GROUP BY channel ORDER BY sales DESC",
-                (start_date, end_date)
-            ).fetchall()]
+        return self._fetch_tuples(self._sql["channel"], (start_date, end_date))
 
     def fetch_age_group(self, start_date: str, end_date: str) -> list:
-        with self.db_manager.get_sqlite_cursor() as cursor:
-            return [dict(r) for r in cursor.execute(
-                "SELECT age_group, SUM(price) as sales FROM buy_fact "
-                "WHERE date BETWEEN ? AND ? GROUP BY age_group ORDER BY sales DESC",
-                (start_date, end_date)
-            ).fetchall()]
+        return self._fetch_tuples(self._sql["age_group"], (start_date, end_date))
+
+    def fetch_dimensions(self, start_date: str, end_date: str) -> dict:
+        return _split_dimension_rows(self._fetch_tuples(self._sql["dimensions"], (start_date, end_date)))
 
     def fetch_date_range_impl(self) -> tuple:
         import datetime
@@ -161,103 +238,148 @@ class SqliteBackend(DatabaseBackend):
         return {'pv': 0, 'cart': 0, 'buy': 0}
 
     def fetch_rfm(self, start_date: str, end_date: str) -> list:
-        with self.db_manager.get_sqlite_cursor() as cursor:
-            return [dict(r) for r in cursor.execute(
-                "SELECT r.rfm_label, COUNT(DISTINCT b.user_id) as cnt "
-                "FROM buy_fact b JOIN user_rfm r ON b.user_id = r.user_id "
-                "WHERE b.date BETWEEN ? AND ? GROUP BY r.rfm_label",
-                (start_date, end_date)
-            ).fetchall()]
+        return self._fetch_tuples(
+            "SELECT r.rfm_label, COUNT(DISTINCT b.user_id) as cnt "
+            "FROM buy_fact b JOIN user_rfm r ON b.user_id = r.user_id "
+            "WHERE b.date BETWEEN ? AND ? GROUP BY r.rfm_label",
+            (start_date, end_date)
+        )
 
     def fetch_cohort(self, start_date: str, end_date: str) -> list:
-        with self.db_manager.get_sqlite_cursor() as cursor:
-            return [dict(r) for r in cursor.execute(
-                "SELECT cohort_date, day_diff, active_users, cohort_users "
-                "FROM cohort_matrix WHERE cohort_date BETWEEN ? AND ? "
-                "ORDER BY cohort_date, day_diff",
-                (start_date, end_date)
-            ).fetchall()]
+        return self._fetch_tuples(
+            "SELECT cohort_date, day_diff, active_users, cohort_users "
+            "FROM cohort_matrix WHERE cohort_date BETWEEN ? AND ? "
+            "ORDER BY cohort_date, day_diff",
+            (start_date, end_date)
+        )
 
 
 class ClickHouseBackend(DatabaseBackend):
-    """ClickHouse 具体实现"""
+    """ClickHouse 具体实现（统一读取 result_rows 原生 tuple，不构造逐行 dict）"""
     
     def __init__(self, db):
         self.db = db
 
+    def _query_rows(self, sql: str, parameters: Optional[dict] = None) -> list:
+        """
+        执行查询并返回 result_rows。
+        心跳按 TTL 缓存，期间连接失效只能由真实查询发现：查询异常时令心跳立即过期，
+        下一次 get_connection() 会重新探测并在必要时降级。
+        """
+        try:
+            return self.db.query(sql, parameters=parameters).result_rows
+        except Exception:
+            from db.manager import db_manager
+            db_manager.expire_clickhouse_heartbeat()
+            raise
+
     def fetch_core_metrics(self, start_date: str, end_date: str) -> dict:
-        rows = list(self.db.query(
+        rows = self._query_rows(
             "SELECT SUM(price) as total_sales, uniqExact(order_id) as total_orders "
             "FROM buy_fact WHERE date BETWEEN {sd:String} AND {ed:String}",
             parameters={'sd': start_date, 'ed': end_date}
-        ).named_results())
+        )
         from dao.base import safe_float, safe_int
         return {
-            "total_sales": round(safe_float(rows[0]['total_sales']), 2) if rows else 0.0,
-            "total_orders": safe_int(rows[0]['total_orders']) if rows else 0,
+            "total_sales": round(safe_float(rows[0][0]), 2) if rows else 0.0,
+            "total_orders": safe_int(rows[0][1]) if rows else 0,
         }
 
     def fetch_trend(self, start_date: str, end_date: str, period_cfg: dict) -> dict:
         ch_fmt = period_cfg["ch"]
-        trend_rows = list(self.db.query(
+        trend_rows = self._query_rows(
             "SELECT formatDateTime(date, {fmt:String}) as dt, "
             "SUM(price) as sales, uniqExact(order_id) as orders "
             "FROM buy_fact WHERE date BETWEEN {sd:String} AND {ed:String} "
             "GROUP BY dt ORDER BY dt",
             parameters={'fmt': ch_fmt, 'sd': start_date, 'ed': end_date}
-        ).named_results())
-        from dao.base import safe_float, safe_int
+        )
+        from dao.base import fast_float, fast_int
         return {
-            "dates": [r['dt'] for r in trend_rows],
-            "sales": [round(safe_float(r['sales']), 2) for r in trend_rows],
-            "orders": [safe_int(r['orders']) for r in trend_rows],
+            "dates": [dt for dt, _, _ in trend_rows],
+            "sales": [round(fast_float(sales), 2) for _, sales, _ in trend_rows],
+            "orders": [fast_int(orders) for _, _, orders in trend_rows],
         }
 
-    def fetch_comparison_sales(self, start_date: str, end_date: str) -> Optional[float]:
-        rows = list(self.db.query(
-            "SELECT SUM(price) as sales FROM buy_fact "
-            "WHERE date BETWEEN {sd:String} AND {ed:String}",
-            parameters={'sd': start_date, 'ed': end_date}
-        ).named_results())
-        from dao.base import safe_float
-        return safe_float(rows[0]['sales'], default=None) if rows else None
+    def fetch_core_with_comparison(self, start_date: str, end_date: str,
+                                   prev_start: str, prev_end: str,
+                                   ly_start: str, ly_end: str) -> dict:
+        # -If 组合子在一次 MergeTree 扫描中按区间分别聚合
+        rows = self._query_rows(
+            "SELECT sumIf(price, date BETWEEN {sd:String} AND {ed:String}), "
+            "uniqExactIf(order_id, date BETWEEN {sd:String} AND {ed:String}), "
+            "sumIf(price, date BETWEEN {psd:String} AND {ped:String}), "
+            "sumIf(price, date BETWEEN {lsd:String} AND {led:String}) "
+            "FROM buy_fact WHERE date BETWEEN {sd:String} AND {ed:String} "
+            "OR date BETWEEN {psd:String} AND {ped:String} "
+            "OR date BETWEEN {lsd:String} AND {led:String}",
+            parameters={'sd': start_date, 'ed': end_date,
+                        'psd': prev_start, 'ped': prev_end,
+                        'lsd': ly_start, 'led': ly_end}
+        )
+        from dao.base import safe_float, safe_int
+        sales, orders, prev_sales, ly_sales = rows[0] if rows else (None, None, None, None)
+        return {
+            "total_sales": round(safe_float(sales), 2),
+            "total_orders": safe_int(orders),
+            "prev_sales": safe_float(prev_sales, default=None),
+            "ly_sales": safe_float(ly_sales, default=None),
+        }
 
     def fetch_top10(self, start_date: str, end_date: str) -> list:
-        return list(self.db.query(
+        return self._query_rows(
             "SELECT item_id, SUM(price) as sales FROM buy_fact "
             "WHERE date BETWEEN {sd:String} AND {ed:String} "
             "GROUP BY item_id ORDER BY sales DESC LIMIT 10",
             parameters={'sd': start_date, 'ed': end_date}
-        ).named_results())
+        )
 
     def fetch_category(self, start_date: str, end_date: str) -> list:
-        return list(self.db.query(
+        return self._query_rows(
             "SELECT category_id, SUM(price) as sales FROM buy_fact "
             "WHERE date BETWEEN {sd:String} AND {ed:String} "
             "GROUP BY category_id ORDER BY sales DESC LIMIT 10",
             parameters={'sd': start_date, 'ed': end_date}
-        ).named_results())
+        )
 
     def fetch_channel(self, start_date: str, end_date: str) -> list:
-        return list(self.db.query(
+        return self._query_rows(
             "SELECT channel, SUM(price) as sales FROM buy_fact "
             "WHERE date BETWEEN {sd:String} AND {ed:String} "
             "GROUP BY channel ORDER BY sales DESC",
             parameters={'sd': start_date, 'ed': end_date}
-        ).named_results())
+        )
 
     def fetch_age_group(self, start_date: str, end_date: str) -> list:
-        return list(self.db.query(
+        return self._query_rows(
             "SELECT age_group, SUM(price) as sales FROM buy_fact "
             "WHERE date BETWEEN {sd:String} AND {ed:String} "
             "GROUP BY age_group ORDER BY sales DESC",
             parameters={'sd': start_date, 'ed': end_date}
-        ).named_results())
+        )
+
+    def fetch_dimensions(self, start_date: str, end_date: str) -> dict:
+        # UNION ALL 各分支列类型需一致，维度键统一转为 String
+        rows = self._query_rows(
+            "SELECT * FROM (SELECT 'category' AS kind, toString(category_id) AS key, SUM(price) AS sales "
+            "FROM buy_fact WHERE date BETWEEN {sd:String} AND {ed:String} "
+            "GROUP BY category_id ORDER BY sales DESC LIMIT 10) "
+            "UNION ALL "
+            "SELECT * FROM (SELECT 'channel' AS kind, toString(channel) AS key, SUM(price) AS sales "
+            "FROM buy_fact WHERE date BETWEEN {sd:String} AND {ed:String} "
+            "GROUP BY channel ORDER BY sales DESC) "
+            "UNION ALL "
+            "SELECT * FROM (SELECT 'age_group' AS kind, toString(age_group) AS key, SUM(price) AS sales "
+            "FROM buy_fact WHERE date BETWEEN {sd:String} AND {ed:String} "
+            "GROUP BY age_group ORDER BY sales DESC)",
+            parameters={'sd': start_date, 'ed': end_date}
+        )
+        return _split_dimension_rows(rows)
 
     def fetch_date_range_impl(self) -> tuple:
         import datetime
         today_str = str(datetime.date.today())
-        rows = self.db.query("SELECT MIN(date) as min_d, MAX(date) as max_d FROM buy_fact").result_rows
+        rows = self._query_rows("SELECT MIN(date) as min_d, MAX(date) as max_d FROM buy_fact")
         if rows and rows[0]:
             base_start = str(rows[0][0]) if rows[0][0] else today_str
             base_end = str(rows[0][1]) if rows[0][1] else today_str
@@ -266,31 +388,32 @@ class ClickHouseBackend(DatabaseBackend):
         return base_start, base_end
 
     def fetch_funnel(self, start_date: str, end_date: str) -> dict:
-        rows = list(self.db.query(
+        rows = self._query_rows(
             "SELECT SUM(has_pv) as pv, SUM(has_cart) as cart, SUM(has_buy) as buy "
             "FROM user_funnel_mart WHERE date BETWEEN {sd:String} AND {ed:String}",
             parameters={'sd': start_date, 'ed': end_date}
-        ).named_results())
+        )
         from dao.base import safe_int
         if rows:
-            return {'pv': safe_int(rows[0]['pv']), 'cart': safe_int(rows[0]['cart']), 'buy': safe_int(rows[0]['buy'])}
+            pv, cart, buy = rows[0]
+            return {'pv': safe_int(pv), 'cart': safe_int(cart), 'buy': safe_int(buy)}
         return {'pv': 0, 'cart': 0, 'buy': 0}
 
     def fetch_rfm(self, start_date: str, end_date: str) -> list:
-        return list(self.db.query(
+        return self._query_rows(
             "SELECT r.rfm_label as rfm_label, uniqExact(b.user_id) as cnt "
             "FROM buy_fact b JOIN user_rfm r ON b.user_id = r.user_id "
             "WHERE b.date BETWEEN {sd:String} AND {ed:String} GROUP BY r.rfm_label",
             parameters={'sd': start_date, 'ed': end_date}
-        ).named_results())
+        )
 
     def fetch_cohort(self, start_date: str, end_date: str) -> list:
-        return list(self.db.query(
+        return self._query_rows(
             "SELECT cohort_date, day_diff, active_users, cohort_users "
             "FROM cohort_matrix WHERE cohort_date BETWEEN {sd:String} AND {ed:String} "
             "ORDER BY cohort_date, day_diff",
             parameters={'sd': start_date, 'ed': end_date}
-        ).named_results())
+        )
 
 
 def get_backend(db, is_sqlite: bool) -> DatabaseBackend:
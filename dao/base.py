@@ -22,3 +22,20 @@ def safe_int(val: Any, default: int = 0) -> int:
         return int(val) if val is not None else default
     except (TypeError, ValueError):
         return default
+
+
+def fast_float(val: Any) -> float:
+    """
+    聚合列（SUM 等）的快速 float 转换：无 try/except，仅用于驱动保证为数值或 NULL 的列。
+    已是 float 时直接返回，NULL 记为 0.0；不可信输入仍应使用 safe_float。
+    """
+    if val.__class__ is float:
+        return val
+    return 0.0 if val is None else float(val)
+
+
+def fast_int(val: Any) -> int:
+    """聚合列（COUNT 等）的快速 int 转换，约束同 fast_float"""
+    if val.__class__ is int:
+        return val
+    return 0 if val is None else int(val)
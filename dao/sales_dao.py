@@ -3,8 +3,6 @@
 通过 DatabaseBackend 策略接口，直接调用后端实现。
 """
 
-from typing import Optional
-
 
 def fetch_core_metrics(backend, start_date: str, end_date: str) -> dict:
     """查询核心指标（总销售额、总订单数）"""
@@ -16,9 +14,13 @@ def fetch_trend(backend, start_date: str, end_date: str, period_cfg: dict) -> di
     return backend.fetch_trend(start_date, end_date, period_cfg)
 
 
-def fetch_comparison_sales(backend, start_date: str, end_date: str) -> Optional[float]:
-    """查询对比周期的销售额（用于环比/同比）"""
-    return backend.fetch_comparison_sales(start_date, end_date)
+def fetch_core_with_comparison(backend, start_date: str, end_date: str,
+                               prev_start: str, prev_end: str,
+                               ly_start: str, ly_end: str) -> dict:
+    """一次查询获取当期核心指标及环比/同比周期销售额"""
+    return backend.fetch_core_with_comparison(
+        start_date, end_date, prev_start, prev_end, ly_start, ly_end
+    )
 
 
 def fetch_top10(backend, start_date: str, end_date: str) -> list:
@@ -39,3 +41,8 @@ def fetch_channel(backend, start_date: str, end_date: str) -> list:
 def fetch_age_group(backend, start_date: str, end_date: str) -> list:
     """查询年龄段维度销售分布"""
     return backend.fetch_age_group(start_date, end_date)
+
+
+def fetch_dimensions(backend, start_date: str, end_date: str) -> dict:
+    """一次查询获取品类/渠道/年龄段三个维度的销售分布"""
+    return backend.fetch_dimensions(start_date, end_date)
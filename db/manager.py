@@ -1,90 +1,111 @@
 """
-数据库连接管理器（单例模式）
+数据库连接管理器（模块级单例）
 
 连接策略：
-- SQLite: 使用 threading.local() 实现每线程独立连接缓存，
-  消除 Lock 竞争瓶颈，天然支持 WAL 模式下的并发读取。
+- SQLite: 启动时按需创建固定大小的只读长连接池（queue.Queue），
+  连接跨请求复用以保留页缓存，WAL 模式下支持并发读取；
+  写操作走单独一个由锁串行化的写连接（WAL 单写多读）。
 - ClickHouse: 缓存单个 clickhouse_connect Client 实例，
   内部基于 urllib3.PoolManager 已实现 HTTP 连接池。
   增加指数退避的重连重试逻辑，提升面对网络抖动时的稳定性。
 """
 
 import os
+import math
 import time
+import random
+import queue
 import sqlite3
 import threading
-from typing import Optional, List
+from typing import Any, List, Optional, Tuple
 from contextlib import contextmanager
 
 from core.config import (
     SQLITE_DB,
+    SQLITE_POOL_SIZE,
+    SQLITE_PRAGMAS,
+    SQLITE_ROLLUP_TABLES,
+    SQLITE_ROLLUP_STMTS,
+    DATE_RANGE_CACHE_TTL,
+    CH_HOST,
+    CH_PORT,
+    CH_USER,
+    CH_PASSWORD,
+    CH_DATABASE,
     CH_MAX_RETRIES,
     CH_RETRY_BASE_DELAY,
     CH_RETRY_BACKOFF,
+    CH_HEARTBEAT_TTL,
 )
 from core.logging import logger
 
 
 class DatabaseManager:
     """
-    数据库连接管理器（单例模式）。
+    数据库连接管理器。
+    全局唯一实例为模块末尾的 db_manager（模块导入本身由导入锁保证只执行一次），
+    业务代码统一引用该实例，不再自行实例化。
 
     连接策略：
-    - SQLite: 使用 threading.local() 实现每线程独立连接缓存，
-      消除 Lock 竞争瓶颈，天然支持 WAL 模式下的并发读取。
-      每线程首次使用时自动创建连接，应用退出时统一关闭。
+    - SQLite: 首次使用时创建 SQLITE_POOL_SIZE 个长连接放入 queue.Queue，
+      get_sqlite_cursor() 借出连接、用完归还；连接数有上限且跨请求复用，
+      页缓存得以保留，WAL 模式下支持并发读取（池内连接 query_only）。
+      写操作通过 get_sqlite_writer() 使用唯一的写连接。应用退出时统一关闭。
     - ClickHouse: 缓存单个 clickhouse_connect Client 实例，
       内部基于 urllib3.PoolManager 已实现 HTTP 连接池。
       增加指数退避的重连重试逻辑（最多 CH_MAX_RETRIES 次），
       提升面对网络抖动时的稳定性。
     """
 
-    _instance = None
-    _lock = threading.Lock()
-
-    def __new__(cls):
-        if cls._instance is None:
-            with cls._lock:
-                if cls._instance is None:
-                    cls._instance = super().__new__(cls)
-                    cls._instance._initialized = False
-        return cls._instance
-
     def __init__(self):
-        if self._initialized:
-            return
-        self._initialized = True
-        # SQLite: 每线程独立连接缓存
-        self._thread_local = threading.local()
-        self._sqlite_conns: List[sqlite3.Connection] = []  # 追踪所有线程连接，用于统一关闭
+        # SQLite: 只读长连接池（首次使用时创建）+ 单写连接
+        self._sqlite_pool: Optional[queue.Queue] = None
+        self._sqlite_conns: List[sqlite3.Connection] = []  # 追踪池内所有连接，用于统一关闭
         self._sqlite_conns_lock = threading.Lock()
+        self._sqlite_writer: Optional[sqlite3.Connection] = None
+        self._sqlite_writer_lock = threading.Lock()  # SQLite 同一时刻只允许一个写事务
+        # 按日汇总表是否可用：建池时确认，未就绪时 SqliteBackend 回退到 buy_fact 明细聚合
+        self.sqlite_rollups_ready: bool = False
         # ClickHouse
-        self._ch_client = None
+        # (可用状态, client) 不可变二元组，整体单次赋值替换：读线程一次取出，
+        # 不会读到另一线程重连途中"可用标志与 client 不一致"的中间状态。
+        # 可用状态 None=未检测, True/False=缓存结果
+        self._ch_state: Tuple[Optional[bool], Any] = (None, None)
         self._ch_lock = threading.Lock()  # 保护 ClickHouse 重连操作
-        self._ch_available: Optional[bool] = None  # None=未检测, True/False=缓存结果
         self._backend_type: Optional[str] = None   # "clickhouse" 或 "sqlite"
-        # 日期范围缓存（TTL 60 秒，避免每个请求都查 MIN/MAX）
+        # 日期范围缓存（TTL 1 小时，数据仅在 ETL 导入后变化，可通过 invalidate_date_range 手动失效）
         self._date_range_cache: Optional[tuple] = None
-        self._date_range_ts: float = 0.0
-        self._date_range_ttl: float = 60.0
+        self._date_range_ts: float = -math.inf  # time.monotonic() 时间戳，不受系统时钟调整影响
+        self._date_range_ttl: float = DATE_RANGE_CACHE_TTL
         # ClickHouse 心跳与断路器配置
+        # 心跳成功后 TTL 内不再发送 SELECT 1，期间的连接失效由真实查询异常触发过期
         self._ch_heartbeat_ts: float = 0.0
-        self._ch_heartbeat_ttl: float = 10.0  # 心跳缓存 10 秒
+        self._ch_heartbeat_ttl: float = CH_HEARTBEAT_TTL
         self._ch_cb_open_until: float = 0.0   # 断路器打开到什么时间（默认闭合）
 
     def get_date_range_cached(self, backend) -> tuple:
         """
-        获取日期范围，60 秒内复用缓存。
+        获取日期范围，DATE_RANGE_CACHE_TTL 内复用缓存。
         backend: DatabaseBackend 实例，直接调用其 fetch_date_range_impl() 方法。
         """
-        now = time.time()
-        if self._date_range_cache and (now - self._date_range_ts) < self._date_range_ttl:
-            return self._date_range_cache
+        now = time.monotonic()
+        cached = self._date_range_cache
+        if cached is not None and (now - self._date_range_ts) < self._date_range_ttl:
+            return cached
         result = backend.fetch_date_range_impl()
         self._date_range_cache = result
         self._date_range_ts = now
         return result
 
+    def invalidate_date_range(self):
+        """使日期范围缓存失效（数据重新导入后调用）"""
+        self._date_range_cache = None
+        self._date_range_ts = -math.inf
+
+    def expire_clickhouse_heartbeat(self):
+        """令 ClickHouse 心跳缓存立即过期（查询失败时调用），下次获取连接时重新探测"""
+        self._ch_heartbeat_ts = 0.0
+
     def get_backend(self):
         """获取当前活跃的 DatabaseBackend 实例（策略模式入口）"""
         db, is_sqlite = self.get_connection()
@@ -94,19 +115,30 @@ class DatabaseManager:
     def _try_clickhouse_with_retry(self) -> bool:
         """
         尝试连接 ClickHouse，带指数退避重试逻辑。
+        退避时长乘以 [0.5, 1.5) 的随机抖动，避免多个实例在故障恢复时同步重连冲击 ClickHouse。
         成功则缓存 client 并返回 True，全部失败返回 False。
         """
-        delay = CH_RETRY_BASE_DELAY
+        try:
+            import clickhouse_connect
+        except ImportError:
+            # 驱动未安装时重试无意义，直接回退
+            self._ch_state = (False, None)
+            logger.warning("未安装 clickhouse_connect，使用 SQLite 后端")
+            return False
+
+        # 关闭自动 session_id：同一 session 不允许并发查询，
+        # 看板聚合接口会在多个线程中共享该 client 并发执行子查询
+        client_kwargs = dict(
+            host=CH_HOST, port=CH_PORT,
+            username=CH_USER, password=CH_PASSWORD,
+            database=CH_DATABASE,
+            autogenerate_session_id=False,
+        )
         for attempt in range(1, CH_MAX_RETRIES + 1):
             try:
-                import clickhouse_connect
-                client = clickhouse_connect.get_client(
-                    host='localhost', port=8123,
-                    username='default', password='password123'
-                )
+                client = clickhouse_connect.get_client(**client_kwargs)
                 client.query("SELECT 1")  # 心跳验证
-                self._ch_client = client
-                self._ch_available = True
+                self._ch_state = (True, client)
                 self._backend_type = "clickhouse"
                 self._ch_heartbeat_ts = time.time()
                 logger.info("ClickHouse 连接成功（第 %d 次尝试），使用 ClickHouse 后端", attempt)
@@ -117,96 +149,185 @@ class DatabaseManager:
                     attempt, CH_MAX_RETRIES, str(e)
                 )
                 if attempt < CH_MAX_RETRIES:
-                    time.sleep(delay)
-                    delay *= CH_RETRY_BACKOFF
+                    delay = CH_RETRY_BASE_DELAY * CH_RETRY_BACKOFF ** (attempt - 1)
+                    time.sleep(delay * random.uniform(0.5, 1.5))
 
-        self._ch_available = False
+        self._ch_state = (False, None)
         self._ch_cb_open_until = time.time() + 60.0  # 连不上时打开断路器 60 秒
         logger.warning("ClickHouse 全部 %d 次重试失败，回退到 SQLite (断路器打开 60s)", CH_MAX_RETRIES)
         return False
 
-    def _get_sqlite_conn(self) -> sqlite3.Connection:
+    @staticmethod
+    def _open_sqlite_conn(read_only: bool = True) -> sqlite3.Connection:
         """
-        获取当前线程专属的 SQLite 连接。
-        利用 threading.local() 实现每线程独立连接缓存，无需加锁即可并发读取。
+        创建一个已完成 PRAGMA 调优的 SQLite 连接（允许在线程池中跨线程借用）。
+        read_only=True 时开启 query_only，误写入会直接报错而不是与写连接争用写锁。
         """
-        conn = getattr(self._thread_local, 'sqlite_conn', None)
-        if conn is not None:
-            return conn
-
         if not os.path.exists(SQLITE_DB):
             raise Exception(f"SQLite 数据库文件不存在: {SQLITE_DB}")
-
-        conn = sqlite3.connect(SQLITE_DB)
+        conn = sqlite3.connect(SQLITE_DB, check_same_thread=False)
         conn.row_factory = sqlite3.Row
-        conn.execute("PRAGMA journal_mode=WAL")
-        conn.execute("PRAGMA busy_timeout=5000")
-        self._thread_local.sqlite_conn = conn
+        for pragma in SQLITE_PRAGMAS:
+            conn.execute(f"PRAGMA {pragma}")
+        if read_only:
+            conn.execute("PRAGMA query_only=1")
+        return conn
+
+    def _get_sqlite_pool(self) -> queue.Queue:
+        """
+        获取 SQLite 只读连接池，首次调用时创建 SQLITE_POOL_SIZE 个长连接。
+        数据库文件不存在时抛出异常（由调用方决定是否降级）。
+        """
+        pool = self._sqlite_pool
+        if pool is not None:
+            return pool
 
-        # 追踪连接以便统一关闭
         with self._sqlite_conns_lock:
-            self._sqlite_conns.append(conn)
+            if self._sqlite_pool is None:
+                pool = queue.Queue(maxsize=SQLITE_POOL_SIZE)
+                for _ in range(SQLITE_POOL_SIZE):
+                    conn = self._open_sqlite_conn()
+                    self._sqlite_conns.append(conn)
+                    pool.put(conn)
+                self._sqlite_pool = pool
+                created = True
+                logger.info("SQLite 连接池已创建: %d 个连接", SQLITE_POOL_SIZE)
+            else:
+                created = False
+
+        # 启动时选用 SQLite 与运行中从 ClickHouse 降级都经过这里，首次建池时统一准备汇总表
+        if created:
+            self._prepare_sqlite_rollups()
 
         if self._backend_type != "sqlite":
             self._backend_type = "sqlite"
             logger.info("使用 SQLite 后端: %s", SQLITE_DB)
-        return conn
+        return self._sqlite_pool
+
+    def _prepare_sqlite_rollups(self):
+        """
+        幂等构建/补齐按日汇总表，再按实际存在情况设置 sqlite_rollups_ready。
+        写入失败（buy_fact 尚不存在、数据库只读或被 ETL 长时间占用写锁）只记录告警：
+        汇总表已存在则照常使用，否则看板查询回退到 buy_fact。
+        """
+        try:
+            with self.get_sqlite_writer() as cursor:
+                for stmt in SQLITE_ROLLUP_STMTS:
+                    cursor.execute(stmt)
+        except Exception as e:
+            logger.warning("按日汇总表构建失败: %s", e)
+
+        with self.get_sqlite_cursor() as cursor:
+            existing = {
+                row[0] for row in cursor.execute(
+                    "SELECT name FROM sqlite_master WHERE type = 'table'"
+                )
+            }
+        self.sqlite_rollups_ready = existing.issuperset(SQLITE_ROLLUP_TABLES)
+        if not self.sqlite_rollups_ready:
+            logger.warning("按日汇总表不可用，SQLite 看板查询回退到 buy_fact 明细聚合")
 
     def get_connection(self):
         """
         获取数据库连接。
         返回: (connection_or_client, is_sqlite: bool)
+        SQLite 连接统一通过 get_sqlite_cursor() 从连接池借用，此时第一个返回值为 None。
         """
         now = time.time()
 
         # 断路器开启中，直接回退 SQLite 保护系统
         if now < self._ch_cb_open_until:
-            return self._get_sqlite_conn(), True
+            self._get_sqlite_pool()
+            return None, True
 
         # 如果已确认 ClickHouse 可用，检查心跳
-        if self._ch_available is True and self._ch_client is not None:
-            # 采用 TTL 缓存：距离上次成功心跳在 10s 内，则直接认定可用，减少网络往返
+        available, client = self._ch_state
+        if available is True and client is not None:
+            # 采用 TTL 缓存：距离上次成功心跳在 CH_HEARTBEAT_TTL 内，则直接认定可用，减少网络往返
             if (now - self._ch_heartbeat_ts) < self._ch_heartbeat_ttl:
-                return self._ch_client, False
+                return client, False
 
             try:
                 # 心跳过期，真实去检测一次
-                self._ch_client.query("SELECT 1")
+                client.query("SELECT 1")
                 self._ch_heartbeat_ts = now
-                return self._ch_client, False
+                return client, False
             except Exception:
                 logger.warning("ClickHouse 心跳失败，尝试重新连接...")
                 with self._ch_lock:
-                    if self._ch_available is True:
-                        self._ch_client = None
-                        self._ch_available = None
+                    # 仅当状态仍是本线程探测失败的那个 client 时才重置，避免覆盖其他线程刚完成的重连
+                    if self._ch_state[1] is client:
+                        self._ch_state = (None, None)
 
         # 首次检测或 ClickHouse 失效后重试
-        if self._ch_available is None:
+        if self._ch_state[0] is None:
             with self._ch_lock:
-                if self._ch_available is None:
+                if self._ch_state[0] is None:
                     if self._try_clickhouse_with_retry():
-                        return self._ch_client, False
+                        return self._ch_state[1], False
+                elif self._ch_state[0] is True:
+                    # 等锁期间其他线程已重连成功
+                    return self._ch_state[1], False
 
         # 回退到 SQLite
-        return self._get_sqlite_conn(), True
+        self._get_sqlite_pool()
+        return None, True
 
     @contextmanager
     def get_sqlite_cursor(self):
         """
-        获取当前线程 SQLite 连接的 cursor（上下文管理器）。
-        由于每线程独立连接，cursor 无需加锁。
+        从只读连接池借出一个 SQLite 连接并返回其 cursor（上下文管理器）。
+        池中连接全部借出时阻塞等待归还；退出时回滚未结束的读事务后归还连接。
+        写操作请使用 get_sqlite_writer()。
         """
-        conn = self._get_sqlite_conn()
+        pool = self._get_sqlite_pool()
+        conn = pool.get()
         cursor = conn.cursor()
         try:
             yield cursor
         finally:
             cursor.close()
+            if conn.in_transaction:
+                conn.rollback()
+            pool.put(conn)
+
+    @contextmanager
+    def get_sqlite_writer(self):
+        """
+        获取唯一的 SQLite 写连接 cursor（上下文管理器）。
+        写连接由锁串行化，正常退出时提交，异常时回滚。
+        WAL 模式下写事务不阻塞只读连接池中的并发读取。
+
+        事务以 BEGIN IMMEDIATE 开启，进入时即取得 RESERVED 锁：
+        与其他进程（如 ETL）的写事务冲突时在入口处按 busy_timeout 等待，
+        而不是在 DEFERRED 事务中途由读锁升级写锁失败返回 SQLITE_BUSY。
+        """
+        with self._sqlite_writer_lock:
+            if self._sqlite_writer is None:
+                self._sqlite_writer = self._open_sqlite_conn(read_only=False)
+            conn = self._sqlite_writer
+            cursor = conn.cursor()
+            try:
+                cursor.execute("BEGIN IMMEDIATE")
+                yield cursor
+                conn.commit()
+            except BaseException:
+                conn.rollback()
+                raise
+            finally:
+                cursor.close()
 
     def close_all(self):
         """应用关闭时释放所有线程的连接"""
-        # 关闭所有追踪到的 SQLite 连接
+        with self._sqlite_writer_lock:
+            if self._sqlite_writer is not None:
+                try:
+                    self._sqlite_writer.close()
+                except Exception:
+                    pass
+                self._sqlite_writer = None
+
+        # 关闭连接池中的所有 SQLite 连接
         with self._sqlite_conns_lock:
             for conn in self._sqlite_conns:
                 try:
@@ -214,20 +335,20 @@ class DatabaseManager:
                 except Exception:
                     pass
             self._sqlite_conns.clear()
+            self._sqlite_pool = None
+            self.sqlite_rollups_ready = False
 
-        if self._ch_client is not None:
+        _, client = self._ch_state
+        self._ch_state = (None, None)
+        if client is not None:
             try:
-                if hasattr(self._ch_client, 'close'):
-                    self._ch_client.close()
-                elif hasattr(self._ch_client, 'disconnect'):
-                    self._ch_client.disconnect()
+                if hasattr(client, 'close'):
+                    client.close()
+                elif hasattr(client, 'disconnect'):
+                    client.disconnect()
             except Exception:
                 pass
-            self._ch_client = None
-
-        self._ch_available = None
-        self._initialized = False
 
 
-# 全局单例
+# 全局单例（导入时即创建，无需双重检查锁定）
 db_manager = DatabaseManager()
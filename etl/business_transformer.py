@@ -3,8 +3,13 @@
 负责同期群留存矩阵、双口径漏斗聚合和 buy_fact 事实表抽取。
 """
 
+from concurrent.futures import ThreadPoolExecutor
+
 from pyspark.sql import functions as F
 
+# 同期群 Day 1~7 活跃用户近似去重的相对标准误差（HyperLogLog++）
+COHORT_APPROX_RSD = 0.02
+
 
 class BusinessTransformer:
     """同期群留存 + 双口径漏斗 + 事实表抽取"""
@@ -21,13 +26,23 @@ class BusinessTransformer:
         user_cohorts = df_joined.groupBy("user_id").agg(F.min("date").alias("cohort_date"))
         cohort_sizes = user_cohorts.groupBy("cohort_date").agg(F.count("user_id").alias("cohort_users"))
 
+        # Day 0 活跃用户即同期群全体成员（cohort_date 本身就是其首次行为日），直接复用精确的 cohort_users；
+        # Day 1~7 用 HyperLogLog 近似去重，避免 countDistinct 的全量去重 shuffle
+        day0 = cohort_sizes.select(
+            "cohort_date",
+            F.lit(0).alias("day_diff"),
+            F.col("cohort_users").alias("active_users"),
+        )
         retention_raw = df_joined.join(user_cohorts, "user_id") \
             .withColumn("day_diff", F.datediff("date", "cohort_date")) \
-            .filter((F.col("day_diff") >= 0) & (F.col("day_diff") <= 7)) \
+            .filter((F.col("day_diff") >= 1) & (F.col("day_diff") <= 7)) \
             .groupBy("cohort_date", "day_diff") \
-            .agg(F.countDistinct("user_id").alias("active_users"))
+            .agg(F.approx_count_distinct("user_id", COHORT_APPROX_RSD).alias("active_users"))
 
-        cohort_matrix = retention_raw.join(cohort_sizes, "cohort_date", "inner")
+        # 近似值在小同期群上可能略超过群体规模，按 cohort_users 封顶保证留存率不超过 100%
+        cohort_matrix = day0.unionByName(retention_raw) \
+            .join(cohort_sizes, "cohort_date", "inner") \
+            .withColumn("active_users", F.least(F.col("active_users"), F.col("cohort_users")))
         return cohort_matrix
 
     def build_funnels(self, df_joined):
@@ -45,23 +60,16 @@ class BusinessTransformer:
         )
 
         # Step 2A: 严格口径（时序约束：cart_ts >= pv_ts 且 buy_ts >= cart_ts）
+        # 后一阶段条件复用前一阶段的布尔表达式，不再重复展开 isNotNull 判断；
+        # 前项为 false 时 AND 短路为 false（不会因 NULL 比较产生 NULL），最后统一转为 0/1
+        pv_ok = F.col("first_pv").isNotNull()
+        cart_ok = pv_ok & F.col("first_cart").isNotNull() & (F.col("first_cart") >= F.col("first_pv"))
+        buy_ok = cart_ok & F.col("first_buy").isNotNull() & (F.col("first_buy") >= F.col("first_cart"))
         strict_funnel = item_funnel.select(
             "user_id",
-            F.when(F.col("first_pv").isNotNull(), 1).otherwise(0).alias("has_pv"),
-            F.when(
-                (F.col("first_cart").isNotNull()) &
-                (F.col("first_pv").isNotNull()) &
-                (F.col("first_cart") >= F.col("first_pv")),
-                1
-            ).otherwise(0).alias("has_cart"),
-            F.when(
-                (F.col("first_buy").isNotNull()) &
-                (F.col("first_cart").isNotNull()) &
-                (F.col("first_pv").isNotNull()) &
-                (F.col("first_buy") >= F.col("first_cart")) &
-                (F.col("first_cart") >= F.col("first_pv")),
-                1
-            ).otherwise(0).alias("has_buy"),
+            pv_ok.cast("int").alias("has_pv"),
+            cart_ok.cast("int").alias("has_cart"),
+            buy_ok.cast("int").alias("has_buy"),
             F.to_date(F.from_unixtime(
                 F.coalesce(F.col("first_pv"), F.col("first_cart"), F.col("first_buy"))
             )).alias("pv_date"),
@@ -92,47 +100,34 @@ class BusinessTransformer:
 
     @staticmethod
     def _build_funnel_mart(funnel_df):
-        """将漏斗标志 DataFrame 展开为按日期聚合的事实表"""
-        events = funnel_df.select(
+        """
+        将漏斗标志 DataFrame 展开为按日期聚合的事实表。
+        三个行为阶段各自做一次过滤投影后 unionByName，
+        不再为每行构造 3 元素 struct 数组再 explode + 过滤空值；
+        三个分支共享同一上游聚合，Spark 的 ReuseExchange 规则会复用其 shuffle 结果。
+        """
+        pv = funnel_df.filter(F.col("has_pv") == 1).select(
             "user_id",
-            F.explode(
-                F.filter(
-                    F.array(
-                        F.when(F.col("has_pv") == 1,
-                            F.struct(
-                                F.col("pv_date").alias("date"),
-                                F.lit(1).alias("has_pv"),
-                                F.lit(0).alias("has_cart"),
-                                F.lit(0).alias("has_buy"),
-                            )
-                        ),
-                        F.when(F.col("has_cart") == 1,
-                            F.struct(
-                                F.col("cart_date").alias("date"),
-                                F.lit(0).alias("has_pv"),
-                                F.lit(1).alias("has_cart"),
-                                F.lit(0).alias("has_buy"),
-                            )
-                        ),
-                        F.when(F.col("has_buy") == 1,
-                            F.struct(
-                                F.col("buy_date").alias("date"),
-                                F.lit(0).alias("has_pv"),
-                                F.lit(0).alias("has_cart"),
-                                F.lit(1).alias("has_buy"),
-                            )
-                        ),
-                    ),
-                    lambda x: x.isNotNull()
-                )
-            ).alias("event")
-        ).select(
+            F.col("pv_date").alias("date"),
+            F.lit(1).alias("has_pv"),
+            F.lit(0).alias("has_cart"),
+            F.lit(0).alias("has_buy"),
+        )
+        cart = funnel_df.filter(F.col("has_cart") == 1).select(
+            "user_id",
+            F.col("cart_date").alias("date"),
+            F.lit(0).alias("has_pv"),
+            F.lit(1).alias("has_cart"),
+            F.lit(0).alias("has_buy"),
+        )
+        buy = funnel_df.filter(F.col("has_buy") == 1).select(
             "user_id",
-            F.col("event.date").alias("date"),
-            F.col("event.has_pv").alias("has_pv"),
-            F.col("event.has_cart").alias("has_cart"),
-            F.col("event.has_buy").alias("has_buy"),
+            F.col("buy_date").alias("date"),
+            F.lit(0).alias("has_pv"),
+            F.lit(0).alias("has_cart"),
+            F.lit(1).alias("has_buy"),
         )
+        events = pv.unionByName(cart).unionByName(buy)
 
         return events.groupBy("user_id", "date").agg(
             F.max("has_pv").alias("has_pv"),
@@ -149,9 +144,20 @@ class BusinessTransformer:
         return buy_fact
 
     def collect_counts(self, buy_fact, user_rfm, cohort_matrix, user_funnel_mart, user_funnel_loose_mart):
-        """记录各表行数到 DQ 报告"""
-        self.dq.add_metric("buy_fact 行数", buy_fact.count())
-        self.dq.add_metric("user_rfm 行数", user_rfm.count())
-        self.dq.add_metric("cohort_matrix 行数", cohort_matrix.count())
-        self.dq.add_metric("user_funnel_mart 行数", user_funnel_mart.count())
-        self.dq.add_metric("user_funnel_loose_mart 行数", user_funnel_loose_mart.count())
+        """
+        记录各表行数到 DQ 报告。
+        5 个 count() 相互独立，从多个驱动线程并发提交，
+        配合 FAIR 调度（见 DataLoader.init_spark）让各 Job 的 Stage 交错执行，
+        总耗时由各 Job 之和降为最慢的一个；指标按固定顺序写入报告。
+        """
+        tables = [
+            ("buy_fact 行数", buy_fact),
+            ("user_rfm 行数", user_rfm),
+            ("cohort_matrix 行数", cohort_matrix),
+            ("user_funnel_mart 行数", user_funnel_mart),
+            ("user_funnel_loose_mart 行数", user_funnel_loose_mart),
+        ]
+        with ThreadPoolExecutor(max_workers=len(tables)) as executor:
+            futures = [(name, executor.submit(df.count)) for name, df in tables]
+            for name, future in futures:
+                self.dq.add_metric(name, future.result())
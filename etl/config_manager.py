@@ -9,6 +9,26 @@ import json
 import platform
 
 
+# 顶层字段校验表：(键, 期望类型, 取值约束, 错误描述)
+_FIELD_RULES = (
+    *((key, str, bool, "必须为非空字符串") for key in (
+        "ch_host", "ch_user", "ch_password", "ch_database",
+        "behavior_csv", "items_csv", "users_csv",
+        "driver_memory", "default_parallelism",
+    )),
+    ("ch_port", int, lambda v: v > 0, "必须为正整数"),
+)
+
+# 需检查文件存在性的 CSV 路径字段
+_CSV_KEYS = ("behavior_csv", "items_csv", "users_csv")
+
+# 嵌套字典校验表：(键, 必需的数值子键)
+_NESTED_RULES = (
+    ("rfm_weights", ("R", "F", "M")),
+    ("rfm_thresholds", ("high_r", "high_m", "high_f")),
+)
+
+
 class ConfigManager:
     """配置加载、校验和环境准备"""
 
@@ -34,6 +54,8 @@ class ConfigManager:
             "items_csv": os.environ.get("ITEMS_CSV", "items_simulated.csv"),
             "users_csv": os.environ.get("USERS_CSV", "users_simulated.csv"),
             "data_limit": None,
+            # 源 CSV 的 Parquet 缓存目录（置空则每次直接解析 CSV）
+            "parquet_cache_dir": os.environ.get("PARQUET_CACHE_DIR", "parquet_cache"),
 
             "driver_memory": os.environ.get("SPARK_DRIVER_MEMORY", "4g"),
             "default_parallelism": os.environ.get("SPARK_PARALLELISM", "8"),
@@ -61,46 +83,31 @@ class ConfigManager:
     # ── 配置预检 ──
 
     def _validate_config(self):
-        """CONFIG 预检：在 Spark 初始化前发现配置错误"""
+        """CONFIG 预检：在 Spark 初始化前发现配置错误（按 _FIELD_RULES / _NESTED_RULES 声明式校验）"""
         cfg = self.config
         errors = []
 
-        # 必填字符串字段
-        for key in ["ch_host", "ch_user", "ch_password", "ch_database",
-                     "behavior_csv", "items_csv", "users_csv",
-                     "driver_memory", "default_parallelism"]:
+        # 顶层字段：类型 + 取值约束
+        for key, expected_type, check, desc in _FIELD_RULES:
             val = cfg.get(key)
-            if not val or not isinstance(val, str):
-                errors.append(f"'{key}' 必须为非空字符串，当前值: {val!r}")
-
-        # 端口必须为正整数
-        port = cfg.get("ch_port")
-        if not isinstance(port, int) or port <= 0:
-            errors.append(f"'ch_port' 必须为正整数，当前值: {port!r}")
+            if not isinstance(val, expected_type) or not check(val):
+                errors.append(f"'{key}' {desc}，当前值: {val!r}")
 
         # CSV 文件可达性
-        for csv_key in ["behavior_csv", "items_csv", "users_csv"]:
+        for csv_key in _CSV_KEYS:
             path = cfg.get(csv_key, "")
             if path and not os.path.exists(path):
                 errors.append(f"'{csv_key}' 指向的文件不存在: {path}")
 
-        # RFM 权重必须包含 R/F/M 三个浮点数
-        weights = cfg.get("rfm_weights", {})
-        if not isinstance(weights, dict):
-            errors.append(f"'rfm_weights' 必须为字典，当前类型: {type(weights).__name__}")
-        else:
-            for k in ["R", "F", "M"]:
-                if k not in weights or not isinstance(weights[k], (int, float)):
-                    errors.append(f"'rfm_weights.{k}' 必须为数值，当前: {weights.get(k)!r}")
-
-        # RFM 阈值检查
-        thresholds = cfg.get("rfm_thresholds", {})
-        if not isinstance(thresholds, dict):
-            errors.append(f"'rfm_thresholds' 必须为字典")
-        else:
-            for k in ["high_r", "high_m", "high_f"]:
-                if k not in thresholds or not isinstance(thresholds[k], (int, float)):
-                    errors.append(f"'rfm_thresholds.{k}' 必须为数值")
+        # 嵌套字典（RFM 权重 / 阈值）：必须为字典且包含全部数值子键
+        for key, sub_keys in _NESTED_RULES:
+            sub = cfg.get(key, {})
+            if not isinstance(sub, dict):
+                errors.append(f"'{key}' 必须为字典，当前类型: {type(sub).__name__}")
+                continue
+            for k in sub_keys:
+                if not isinstance(sub.get(k), (int, float)):
+                    errors.append(f"'{key}.{k}' 必须为数值，当前: {sub.get(k)!r}")
 
         if errors:
             print("\n[ERROR] CONFIG 配置预检失败:")
@@ -5,6 +5,8 @@
 
 import os
 import sys
+import shutil
+import hashlib
 
 from pyspark.sql import SparkSession
 from pyspark.sql import functions as F
@@ -14,6 +16,20 @@ from pyspark import StorageLevel
 # 确保 PySpark Worker 使用当前 Python 解释器
 os.environ['PYSPARK_PYTHON'] = sys.executable
 
+# 源数据 schema（列顺序与 generate_data.py 输出一致）
+SCHEMA_BEHAVIOR = "user_id INT, item_id INT, category_id INT, type STRING, ts INT"
+SCHEMA_ITEMS = "item_id INT, category_id INT, price DOUBLE"
+SCHEMA_USERS = "user_id INT, age_group STRING, channel STRING"
+
+
+def _parquet_cache_path(cache_dir: str, csv_path: str, schema: str, header: bool) -> str:
+    """Parquet 缓存路径：文件名 + (源文件绝对路径, schema, header) 的短哈希"""
+    name = os.path.splitext(os.path.basename(csv_path))[0]
+    key = hashlib.sha256(
+        f"{os.path.abspath(csv_path)}\0{schema}\0{header}".encode()
+    ).hexdigest()[:16]
+    return os.path.join(cache_dir, f"{name}-{key}.parquet")
+
 
 class DataLoader:
     """Spark 初始化 + 数据加载 + 清洗"""
@@ -30,16 +46,29 @@ class DataLoader:
         self.max_date_str = None    # 数据集截止日期
 
     def init_spark(self) -> SparkSession:
-        """创建 SparkSession"""
+        """
+        创建 SparkSession。
+        开启 AQE：shuffle 分区初始值取较大值，运行时按实际数据量合并小分区，
+        并自动拆分 user_id 等倾斜键上的大分区。
+        Arrow 批次大小与 DataWriter 的 ClickHouse 插入块（65536 行）对齐。
+        """
         cfg = self.config
+        shuffle_partitions = str(max(200, 4 * int(cfg["default_parallelism"])))
         self.spark = SparkSession.builder \
             .appName("Strict_DS_Pipeline") \
             .config("spark.driver.memory", cfg["driver_memory"]) \
             .config("spark.ui.enabled", "false") \
             .config("spark.sql.execution.arrow.pyspark.enabled", "true") \
+            .config("spark.sql.execution.arrow.maxRecordsPerBatch", "65536") \
             .config("spark.default.parallelism", cfg["default_parallelism"]) \
             .config("spark.locality.wait", cfg["locality_wait"]) \
-            .config("spark.sql.shuffle.partitions", cfg["default_parallelism"]) \
+            .config("spark.sql.shuffle.partitions", shuffle_partitions) \
+            .config("spark.sql.adaptive.enabled", "true") \
+            .config("spark.sql.adaptive.coalescePartitions.enabled", "true") \
+            .config("spark.sql.adaptive.skewJoin.enabled", "true") \
+            .config("spark.sql.adaptive.advisoryPartitionSizeInBytes", "64MB") \
+            .config("spark.scheduler.mode", "FAIR") \
+            .config("spark.sql.autoBroadcastJoinThreshold", "200MB") \
             .config("spark.jars.packages",
                     "com.clickhouse:clickhouse-jdbc:0.6.0,"
                     "org.apache.httpcomponents.client5:httpclient5:5.3.1") \
@@ -55,13 +84,12 @@ class DataLoader:
         cfg = self.config
         spark = self.spark
 
-        # 读取原始数据
-        schema_bhv = "user_id INT, item_id INT, category_id INT, type STRING, ts INT"
-        df_bhv_raw = spark.read.csv(cfg["behavior_csv"], header=False, schema=schema_bhv)
+        # 读取原始数据（维表同样显式给出 schema，避免 inferSchema 额外扫描一遍文件）
+        df_bhv_raw = self._read_source(cfg["behavior_csv"], SCHEMA_BEHAVIOR, header=False)
         df_bhv = df_bhv_raw.limit(5000000) if cfg["data_limit"] else df_bhv_raw
 
-        df_items = spark.read.csv(cfg["items_csv"], header=True, inferSchema=True)
-        df_users_info = spark.read.csv(cfg["users_csv"], header=True, inferSchema=True)
+        df_items = self._read_source(cfg["items_csv"], SCHEMA_ITEMS, header=True)
+        df_users_info = self._read_source(cfg["users_csv"], SCHEMA_USERS, header=True)
 
         # 记录原始数据量
         raw_count = df_bhv.count()
@@ -69,11 +97,12 @@ class DataLoader:
         self.dq.add_metric("商品维表行数", df_items.count())
         self.dq.add_metric("用户维表行数", df_users_info.count())
 
-        # 日期解析与过滤
-        df_cleaned = df_bhv \
-            .withColumn("date", F.to_date(F.from_unixtime(F.col("ts")))) \
-            .filter((F.col("date") >= "2017-11-01") & (F.col("date") <= "2017-12-10")) \
-            .withColumn("order_id", F.concat_ws('_', F.col('user_id'), F.col('ts'), F.col('item_id')))
+        # 日期解析与过滤：date / order_id 在同一个 select 中派生，只生成一层投影
+        df_cleaned = df_bhv.select(
+            "*",
+            F.to_date(F.from_unixtime(F.col("ts"))).alias("date"),
+            F.concat_ws('_', F.col('user_id'), F.col('ts'), F.col('item_id')).alias("order_id"),
+        ).filter(F.col("date").between("2017-11-01", "2017-12-10"))
 
         max_date_val = df_cleaned.agg(F.max("date")).collect()[0][0]
         self.max_date_str = str(max_date_val)
@@ -81,14 +110,24 @@ class DataLoader:
         self.dq.add_metric("数据集截止日期", self.max_date_str)
 
         # 构建大宽表（JOIN 维表）
+        # 先缓存 JOIN 结果：质量校验聚合与下方清洗缓存两次 Action 共用，JOIN 只执行一次
+        # 商品/用户维表体量小，显式广播为 Hash Join，事实表侧无需 shuffle
         df_with_price = df_cleaned \
-            .join(df_items.drop("category_id"), on="item_id", how="left") \
-            .join(df_users_info, on="user_id", how="left")
+            .join(F.broadcast(df_items.drop("category_id")), on="item_id", how="left") \
+            .join(F.broadcast(df_users_info), on="user_id", how="left") \
+            .persist(StorageLevel.MEMORY_AND_DISK)
 
-        # 数据质量校验
-        missing_price_count = df_with_price.filter(F.col("price").isNull()).count()
-        missing_channel = df_with_price.filter(F.col("channel").isNull()).count()
-        missing_age = df_with_price.filter(F.col("age_group").isNull()).count()
+        # 数据质量校验：三项缺失计数合并为一次聚合（一个 Spark Job、一次扫描），
+        # 避免三次 filter().count() 各自重跑 JOIN
+        dq_row = df_with_price.agg(
+            F.sum(F.when(F.col("price").isNull(), 1).otherwise(0)).alias("missing_price"),
+            F.sum(F.when(F.col("channel").isNull(), 1).otherwise(0)).alias("missing_channel"),
+            F.sum(F.when(F.col("age_group").isNull(), 1).otherwise(0)).alias("missing_age"),
+        ).first()
+        # 空表时 SUM 返回 NULL，按 0 处理
+        missing_price_count = dq_row["missing_price"] or 0
+        missing_channel = dq_row["missing_channel"] or 0
+        missing_age = dq_row["missing_age"] or 0
 
         self.dq.add_metric("缺失价格记录数", missing_price_count)
         self.dq.add_metric("缺失渠道记录数", missing_channel)
@@ -106,18 +145,54 @@ class DataLoader:
             self.dq.add_warning(f"发现 {missing_age} 条记录缺失年龄分组(age_group)字段，已填充为'未知'")
 
         # 清洗并缓存（MEMORY_AND_DISK 策略：优先内存，溢出写磁盘）
+        # 丢弃缺价记录 + 缺失维度填充合并为一次 filter + select（原位 coalesce，保持列顺序）
+        fill_values = {"channel": "未知渠道", "age_group": "未知"}
         self.df_joined = df_with_price \
-            .dropna(subset=["price"]) \
-            .fillna({"channel": "未知渠道", "age_group": "未知"}) \
+            .filter(F.col("price").isNotNull()) \
+            .select(*[
+                F.coalesce(F.col(c), F.lit(fill_values[c])).alias(c) if c in fill_values else F.col(c)
+                for c in df_with_price.columns
+            ]) \
             .persist(StorageLevel.MEMORY_AND_DISK)
 
         clean_count = self.df_joined.count()
+        # df_joined 已物化，释放中间 JOIN 缓存
+        df_with_price.unpersist()
         self.dq.add_metric("清洗后有效记录数", clean_count)
         self.dq.add_metric("数据丢弃率", f"{(1 - clean_count / max(raw_count, 1)) * 100:.2f}%")
         print(f"  [*] 清洗后有效记录数: {clean_count:,}")
 
         return self.df_joined, self.max_date_str
 
+    def _read_source(self, csv_path: str, schema: str, header: bool):
+        """
+        读取源 CSV。配置了 parquet_cache_dir 时首次运行转存为 Snappy 压缩的 Parquet，
+        后续运行直接读取列式缓存，跳过文本解析。
+        缓存目录名包含源文件绝对路径与 schema 的哈希：同名不同目录的源文件互不冲突，
+        修改 SCHEMA_* 后自动改用新缓存。缓存仅在 Spark 写出 _SUCCESS 标记且标记比 CSV 新时才被信任。
+        """
+        spark = self.spark
+        cache_dir = self.config.get("parquet_cache_dir")
+        if not cache_dir:
+            return spark.read.csv(csv_path, header=header, schema=schema)
+
+        parquet_path = _parquet_cache_path(cache_dir, csv_path, schema, header)
+        success_marker = os.path.join(parquet_path, "_SUCCESS")
+        if not os.path.exists(success_marker) or os.path.getmtime(csv_path) > os.path.getmtime(success_marker):
+            print(f"  [*] 转存 Parquet 缓存: {csv_path} → {parquet_path}")
+            # 先写临时目录，成功后再替换正式缓存：转换中途失败或被中断不会留下残缺的缓存
+            tmp_path = f"{parquet_path}.tmp-{os.getpid()}"
+            try:
+                spark.read.csv(csv_path, header=header, schema=schema) \
+                    .write.mode("overwrite") \
+                    .option("compression", "snappy") \
+                    .parquet(tmp_path)
+                shutil.rmtree(parquet_path, ignore_errors=True)
+                os.replace(tmp_path, parquet_path)
+            finally:
+                shutil.rmtree(tmp_path, ignore_errors=True)
+        return spark.read.parquet(parquet_path)
+
     def unpersist(self):
         """释放缓存"""
         if self.df_joined is not None:
@@ -3,6 +3,7 @@
 贯穿 ETL 全链路，收集数据量指标、质量告警和聚类画像。
 """
 
+import time
 import datetime
 import json
 
@@ -10,11 +11,14 @@ import json
 class DataQualityReport:
     """收集 ETL 过程中的数据质量指标，在管道结束时输出统一报告"""
 
+    __slots__ = ("metrics", "warnings", "cluster_profiles", "start_time", "_mono_start")
+
     def __init__(self):
         self.metrics = {}
         self.warnings = []
         self.cluster_profiles = []
-        self.start_time = datetime.datetime.now()
+        self.start_time = datetime.datetime.now()   # 墙上时间，仅用于展示
+        self._mono_start = time.monotonic()          # 耗时统计用单调时钟，不受系统时钟调整影响
 
     def add_metric(self, name: str, value):
         """记录一个质量指标"""
@@ -37,7 +41,7 @@ class DataQualityReport:
 
     def print_report(self):
         """输出完整的数据质量报告"""
-        elapsed = datetime.datetime.now() - self.start_time
+        elapsed = datetime.timedelta(seconds=time.monotonic() - self._mono_start)
         print("\n" + "=" * 70)
         print("数据质量报告 (Data Quality Report)")
         print("=" * 70)
@@ -68,7 +72,7 @@ class DataQualityReport:
 
     def to_json_dict(self):
         """导出为 JSON 可序列化字典（供 DQ 日志写入使用）"""
-        elapsed = (datetime.datetime.now() - self.start_time).total_seconds()
+        elapsed = time.monotonic() - self._mono_start
         return {
             "run_time": datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
             "elapsed_seconds": elapsed,
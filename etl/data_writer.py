@@ -7,9 +7,45 @@ import os
 import json
 import datetime
 import sqlite3
+from concurrent.futures import ThreadPoolExecutor
 
+import pyarrow as pa
 import clickhouse_connect
 
+from sqlite_schema import SQLITE_INDEX_STMTS, SQLITE_ROLLUP_TABLES, SQLITE_ROLLUP_STMTS
+
+# SQLite 回退写入的连接级 PRAGMA（约 200MB 页缓存）
+SQLITE_BULK_PRAGMAS = (
+    "journal_mode=WAL",
+    "synchronous=NORMAL",
+    "cache_size=-200000",
+    "temp_store=MEMORY",
+)
+
+# ClickHouse 单次插入的行数（与服务端默认 max_block_size 一致）
+CH_INSERT_BLOCK_ROWS = 65536
+
+# etl_dq_log 单行写入走服务端异步插入；等待落盘确认，写入失败仍能被捕获告警
+DQ_LOG_INSERT_SETTINGS = {"async_insert": 1, "wait_for_async_insert": 1}
+
+# 日期列按 ISO 字符串存储（与原 pandas.to_sql 的落库格式一致，
+# 同时避开 Python 3.12 起弃用的 sqlite3 默认 date 适配器）
+sqlite3.register_adapter(datetime.date, datetime.date.isoformat)
+
+def _spark_to_arrow(df):
+    """
+    Spark DataFrame → pyarrow.Table，仅使用公开 API。
+    Spark 4.0+ 直接 toArrow()；更早版本走 toPandas()（init_spark 已开启 Arrow 传输），
+    再按 Spark schema 转回 Arrow，保持 Decimal / Date 等列类型不变。
+    内存上界：整表在 Driver 端物化一次；_write_clickhouse 并发写入时，
+    Driver 同时持有所有待写表的 Arrow 副本（toPandas 路径另有一份 pandas 副本），
+    driver_memory 需按各表体量之和预留。
+    """
+    if hasattr(df, "toArrow"):
+        return df.toArrow()
+    from pyspark.sql.pandas.types import to_arrow_schema
+    return pa.Table.from_pandas(df.toPandas(), schema=to_arrow_schema(df.schema), preserve_index=False)
+
 
 class DataWriter:
     """ClickHouse 原子写入 + SQLite 回退"""
@@ -53,6 +89,36 @@ class DataWriter:
         """,
     }
 
+    # SQLite 回退建表 DDL（与 TABLE_DDL 列一一对应）
+    SQLITE_DDL = {
+        "buy_fact": """
+            CREATE TABLE buy_fact (
+                date DATE, user_id INTEGER, order_id TEXT, item_id INTEGER,
+                category_id INTEGER, price REAL, channel TEXT, age_group TEXT
+            )
+        """,
+        "user_rfm": """
+            CREATE TABLE user_rfm (
+                user_id INTEGER, rfm_label TEXT
+            )
+        """,
+        "cohort_matrix": """
+            CREATE TABLE cohort_matrix (
+                cohort_date DATE, day_diff INTEGER, active_users INTEGER, cohort_users INTEGER
+            )
+        """,
+        "user_funnel_mart": """
+            CREATE TABLE user_funnel_mart (
+                user_id INTEGER, has_pv INTEGER, has_cart INTEGER, has_buy INTEGER, date DATE
+            )
+        """,
+        "user_funnel_loose_mart": """
+            CREATE TABLE user_funnel_loose_mart (
+                user_id INTEGER, has_pv INTEGER, has_cart INTEGER, has_buy INTEGER, date DATE
+            )
+        """,
+    }
+
     def __init__(self, config, dq):
         self.config = config
         self.dq = dq
@@ -75,18 +141,22 @@ class DataWriter:
     def _detect_clickhouse(self):
         """尝试连接 ClickHouse"""
         try:
-            self.client = clickhouse_connect.get_client(
-                host=self.config["ch_host"],
-                port=self.config["ch_port"],
-                username=self.config["ch_user"],
-                password=self.config["ch_password"],
-            )
+            self.client = self._new_client()
             self.client.command("SELECT 1")
             self.ch_available = True
             print("  ✔ ClickHouse 连接成功，使用原子写入模式")
         except Exception as e:
             print(f"  [WARN] ClickHouse 不可用 ({e})，回退到 SQLite 写入")
 
+    def _new_client(self):
+        """按配置新建一个 ClickHouse 客户端"""
+        return clickhouse_connect.get_client(
+            host=self.config["ch_host"],
+            port=self.config["ch_port"],
+            username=self.config["ch_user"],
+            password=self.config["ch_password"],
+        )
+
     # ── ClickHouse 原子写入路径 ──
 
     def _write_clickhouse(self, write_tasks):
@@ -96,25 +166,69 @@ class DataWriter:
             self.client.command(ddl)
             print(f"  ✔ 表 {table_name} 已确保存在")
 
-        # 写入业务数据
-        for df_spark, table_name in write_tasks:
-            self._write_atomic(df_spark, table_name)
-            print(f"  ✔ {table_name} 原子写入 ClickHouse 完成")
+        # 各业务表的临时表长期保留、跨次复用，写入路径只需 TRUNCATE；
+        # 表结构与正式表不一致（正式表 DDL 变更后）时重建，避免旧结构的表被交换上线
+        for _, table_name in write_tasks:
+            self._ensure_tmp_table(table_name)
+
+        # 写入业务数据：各表相互独立，并发执行 Spark 收集与网络写入；
+        # 同一客户端会话不允许并发查询，每个任务使用独立客户端（Driver 内存上界见 _spark_to_arrow）
+        with ThreadPoolExecutor(max_workers=len(write_tasks)) as executor:
+            list(executor.map(lambda task: self._write_table(*task), write_tasks))
 
         # 写入 DQ 报告
         self._write_dq_log_clickhouse()
 
-    def _write_atomic(self, df, table_name):
-        """单表原子写入：先写临时表，再 EXCHANGE"""
+    def _ensure_tmp_table(self, table_name):
+        """确保 {table}_tmp_new 存在且列定义、引擎与排序键与正式表一致，否则删除重建"""
         tmp_table = f"{table_name}_tmp_new"
-        self.client.command(f"DROP TABLE IF EXISTS {tmp_table}")
-        self.client.command(f"CREATE TABLE {tmp_table} AS {table_name}")
+        self.client.command(f"CREATE TABLE IF NOT EXISTS {tmp_table} AS {table_name}")
+        if self._table_schema(table_name) != self._table_schema(tmp_table):
+            print(f"  [*] {tmp_table} 表结构与 {table_name} 不一致，重建临时表")
+            self.client.command(f"DROP TABLE {tmp_table}")
+            self.client.command(f"CREATE TABLE {tmp_table} AS {table_name}")
 
-        pdf = df.toPandas()
-        self.client.insert_df(tmp_table, pdf)
+    def _table_schema(self, table_name):
+        """从 system.columns / system.tables 读取 (列名, 类型) 序列与引擎定义"""
+        params = {"t": table_name}
+        columns = self.client.query(
+            "SELECT name, type FROM system.columns "
+            "WHERE database = currentDatabase() AND table = {t:String} ORDER BY position",
+            parameters=params,
+        ).result_rows
+        engine = self.client.query(
+            "SELECT engine_full FROM system.tables "
+            "WHERE database = currentDatabase() AND name = {t:String}",
+            parameters=params,
+        ).result_rows
+        return [tuple(r) for r in columns], [tuple(r) for r in engine]
 
-        self.client.command(f"EXCHANGE TABLES {table_name} AND {tmp_table}")
-        self.client.command(f"DROP TABLE IF EXISTS {tmp_table}")
+    def _write_table(self, df, table_name):
+        """在独立客户端上完成单表原子写入"""
+        client = self._new_client()
+        try:
+            self._write_atomic(client, df, table_name)
+        finally:
+            client.close()
+        print(f"  ✔ {table_name} 原子写入 ClickHouse 完成")
+
+    @staticmethod
+    def _write_atomic(client, df, table_name):
+        """
+        单表原子写入：清空临时表写入新数据，再 EXCHANGE。
+        交换后临时表中是上一版数据，随即清空，不在两次运行之间占用双份存储。
+        """
+        tmp_table = f"{table_name}_tmp_new"
+        client.command(f"TRUNCATE TABLE {tmp_table}")
+
+        # Arrow 表直接交给 insert_arrow，跳过 insert_df 的逐列 Python 转换；
+        # 按 ClickHouse 默认块大小零拷贝切片分批发送，限制单次请求体积
+        table = _spark_to_arrow(df)
+        for offset in range(0, table.num_rows, CH_INSERT_BLOCK_ROWS):
+            client.insert_arrow(tmp_table, table.slice(offset, CH_INSERT_BLOCK_ROWS))
+
+        client.command(f"EXCHANGE TABLES {table_name} AND {tmp_table}")
+        client.command(f"TRUNCATE TABLE {tmp_table}")
 
     def _write_dq_log_clickhouse(self):
         """将 DQ 报告写入 ClickHouse etl_dq_log 表"""
@@ -129,7 +243,9 @@ class DataWriter:
                     'mt': dq_data['metrics'],
                     'wn': dq_data['warnings'],
                     'cp': dq_data['cluster_profiles'],
-                }
+                },
+                # 单行小写入交由服务端异步缓冲合并落盘，避免每次运行生成一个小 part
+                settings=DQ_LOG_INSERT_SETTINGS,
             )
             print("  ✔ 数据质量报告已写入 etl_dq_log")
         except Exception as e:
@@ -144,25 +260,49 @@ class DataWriter:
         print(f"  SQLite 写入路径: {sqlite_path}")
 
         conn = sqlite3.connect(sqlite_path)
+        # 批量导入调优：WAL 模式（与 API 读连接池一致，写入期间不阻塞看板读取）、
+        # 降低 fsync 频率、加大页缓存、临时 B-Tree（建索引排序）放内存
+        for pragma in SQLITE_BULK_PRAGMAS:
+            conn.execute(f"PRAGMA {pragma}")
 
+        # 建表、导入、建索引全部在同一事务中完成，整个导入只提交一次
+        conn.execute("BEGIN")
         for df_spark, table_name in write_tasks:
+            # init_spark 已开启 arrow.pyspark：toPandas 由各分区并行产出 Arrow 批次，
+            # Driver 端按列拼接，无需逐行反序列化 Row
             pdf = df_spark.toPandas()
             conn.execute(f"DROP TABLE IF EXISTS {table_name}")
-            pdf.to_sql(table_name, conn, if_exists="replace", index=False)
+            conn.execute(self.SQLITE_DDL[table_name])
+            self._insert_sqlite_rows(conn, table_name, pdf)
             print(f"  ✔ {table_name} 已写入 SQLite ({len(pdf)} 行)")
 
-        # 创建索引加速查询
-        index_stmts = [
-            "CREATE INDEX IF NOT EXISTS idx_buy_fact_date ON buy_fact(date)",
-            "CREATE INDEX IF NOT EXISTS idx_buy_fact_user ON buy_fact(user_id)",
-            "CREATE INDEX IF NOT EXISTS idx_funnel_date ON user_funnel_mart(date)",
-            "CREATE INDEX IF NOT EXISTS idx_cohort_date ON cohort_matrix(cohort_date)",
-        ]
-        for stmt in index_stmts:
+        # 全部数据写入后再统一建索引（一次性排序构建快于逐行维护 B-Tree）
+        for stmt in SQLITE_INDEX_STMTS:
             try:
                 conn.execute(stmt)
             except Exception:
                 pass
+        # 按日预聚合表由 buy_fact 重建（GROUP BY date, 维度 可直接走上面建好的覆盖索引）
+        for table_name in SQLITE_ROLLUP_TABLES:
+            conn.execute(f"DROP TABLE IF EXISTS {table_name}")
+        for stmt in SQLITE_ROLLUP_STMTS:
+            conn.execute(stmt)
+        # 刷新统计信息，供查询规划器在多个索引间选择
+        conn.execute("ANALYZE")
         conn.commit()
         conn.close()
-        print("  ✔ SQLite 索引已建立")
+        print("  ✔ SQLite 索引与按日汇总表已建立")
+
+    @staticmethod
+    def _insert_sqlite_rows(conn, table_name, pdf):
+        """
+        以单条预编译 INSERT 语句 executemany 批量导入。
+        按列 tolist() 转为 Python 原生标量（numpy 标量无法直接绑定参数），
+        再 zip 成行迭代器交给 executemany 流式消费，不额外物化整表的行元组列表。
+        """
+        columns = list(pdf.columns)
+        stmt = (
+            f"INSERT INTO {table_name} ({', '.join(columns)}) "
+            f"VALUES ({', '.join('?' * len(columns))})"
+        )
+        conn.executemany(stmt, zip(*(pdf[c].tolist() for c in columns)))
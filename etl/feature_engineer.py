@@ -3,13 +3,15 @@
 负责 RFM 指标计算、StandardScaler 标准化、KMeans 聚类寻优和智能标签映射。
 """
 
-import functools
-
 from pyspark.sql import functions as F
-from pyspark.ml.feature import VectorAssembler, StandardScaler
+from pyspark.ml.feature import StandardScaler
+from pyspark.ml.functions import array_to_vector
 from pyspark.ml.clustering import KMeans
 from pyspark.ml.evaluation import ClusteringEvaluator
 
+# RFM 频次（F）近似去重的相对标准误差（HyperLogLog++），标准化后对聚类无可见影响
+RFM_F_APPROX_RSD = 0.01
+
 
 class FeatureEngineer:
     """RFM 特征工程 + KMeans 聚类打标"""
@@ -28,13 +30,13 @@ class FeatureEngineer:
         # Step 1: 计算 RFM 原始指标
         rfm_base = df_joined.filter(F.col("type") == "buy").groupBy("user_id").agg(
             F.datediff(F.lit(max_date_str), F.max("date")).alias("R"),
-            F.countDistinct("order_id").alias("F"),
+            F.approx_count_distinct("order_id", RFM_F_APPROX_RSD).alias("F"),
             F.sum("price").alias("M")
         )
 
-        # Step 2: VectorAssembler 组装特征向量
-        assembler = VectorAssembler(inputCols=["R", "F", "M"], outputCol="features_raw")
-        rfm_vec = assembler.transform(rfm_base)
+        # Step 2: 组装特征向量（三列数值直接拼数组转稠密向量，走内置表达式，
+        # 省去 VectorAssembler 逐行的类型分派与稀疏/稠密压缩判断）
+        rfm_vec = rfm_base.withColumn("features_raw", array_to_vector(F.array("R", "F", "M")))
 
         # Step 3: StandardScaler 标准化（消除量纲差异）
         scaler = StandardScaler(inputCol="features_raw", outputCol="features", withStd=True, withMean=True)
@@ -42,8 +44,16 @@ class FeatureEngineer:
         rfm_scaled = scaler_model.transform(rfm_vec)
 
         # Step 4: KMeans 轮廓系数自动选 K
+        # 3 组 K 值的 fit（多轮迭代）与 evaluate 均需扫描特征数据，先缓存并物化一次，
+        # 避免每次都从 df_joined 重新聚合 RFM
+        rfm_scaled = rfm_scaled.cache()
+        rfm_scaled.count()
         best_k, best_score, best_model = self._auto_kmeans(rfm_scaled)
-        rfm_clustered = best_model.transform(rfm_scaled)
+        # 聚类结果被画像统计、user_rfm 及下游计数/写库多次消费，缓存后复用；
+        # 先基于已缓存的 rfm_scaled 物化，再释放特征缓存
+        rfm_clustered = best_model.transform(rfm_scaled).cache()
+        rfm_clustered.count()
+        rfm_scaled.unpersist()
 
         # Step 5: 模型持久化（可选）
         self._persist_model(best_model, scaler_model)
@@ -54,14 +64,14 @@ class FeatureEngineer:
         # Step 7: 收集聚类画像到 DQ 报告
         self._collect_cluster_profiles(rfm_clustered, cluster_to_label)
 
-        # Step 8: 生成最终 user_rfm
-        mapping_expr = functools.reduce(
-            lambda acc, kv: acc.when(F.col("cluster") == kv[0], kv[1]),
-            cluster_to_label.items(),
-            F.when(F.lit(False), "")
-        ).otherwise("未知群体")
-
-        user_rfm = rfm_clustered.withColumn("rfm_label", mapping_expr).select("user_id", "rfm_label")
+        # Step 8: 生成最终 user_rfm（簇号 → 标签的小表广播关联，按哈希查找）
+        mapping_df = rfm_clustered.sparkSession.createDataFrame(
+            list(cluster_to_label.items()), "cluster INT, rfm_label STRING"
+        )
+        user_rfm = rfm_clustered \
+            .join(F.broadcast(mapping_df), "cluster", "left") \
+            .na.fill("未知群体", ["rfm_label"]) \
+            .select("user_id", "rfm_label")
         return user_rfm
 
     def _auto_kmeans(self, rfm_scaled):
@@ -16,11 +16,12 @@
   7. 用户留存指数衰减:              次日留存 ~35%, 7日留存 <10%
 """
 
-import csv
 import os
 import time
 import datetime
 import numpy as np
+import pyarrow as pa
+import pyarrow.csv as pa_csv
 from collections import defaultdict
 
 # --- 全局配置 ---
@@ -39,6 +40,15 @@ START_DATE = datetime.datetime(2017, 11, 1, 0, 0, 0)
 END_DATE = datetime.datetime(2017, 12, 10, 23, 59, 59)
 TOTAL_DAYS = (END_DATE.date() - START_DATE.date()).days + 1  # 40 天
 
+# 行为流水结构化数组的列定义（与 UserBehavior.csv 列顺序一致）
+BEHAVIOR_DTYPE = np.dtype([
+    ("user_id", "i4"),
+    ("item_id", "i4"),
+    ("category_id", "i4"),
+    ("type", "U4"),
+    ("ts", "i8"),
+])
+
 # 输出路径
 OUTPUT_DIR = os.path.dirname(os.path.abspath(__file__))
 BEHAVIOR_FILE = os.path.join(OUTPUT_DIR, "UserBehavior.csv")
@@ -46,6 +56,25 @@ ITEMS_FILE = os.path.join(OUTPUT_DIR, "items_simulated.csv")
 USERS_FILE = os.path.join(OUTPUT_DIR, "users_simulated.csv")
 
 
+def _write_dim_csv(columns, path):
+    """
+    列数组字典 → 带表头、不加引号的维表 CSV，内容与原 csv.DictWriter 输出一致。
+    Arrow 总是给表头加引号，表头由这里手写；浮点列按 repr 转为字符串，
+    保持 csv 模块的 "100.0" 写法（Arrow 会写成 "100"）。
+    """
+    table = pa.table({
+        name: [repr(v) for v in values.tolist()] if values.dtype.kind == "f" else values
+        for name, values in columns.items()
+    })
+    with open(path, "wb") as f:
+        f.write((",".join(columns) + "\n").encode("utf-8"))
+        pa_csv.write_csv(
+            table,
+            f,
+            write_options=pa_csv.WriteOptions(include_header=False, quoting_style="none"),
+        )
+
+
 # --- [1] 生成商品维表 (items_simulated.csv) ---
 
 def generate_items():
@@ -74,19 +103,13 @@ def generate_items():
     prices = np.clip(raw_prices, 5, 9999)
     prices = np.round(prices, 2)
 
-    items = []
-    for i in range(NUM_ITEMS):
-        items.append({
-            "item_id": i + 1,
-            "category_id": int(item_categories[i]),
-            "price": float(prices[i]),
-        })
-
-    # 写入 CSV
-    with open(ITEMS_FILE, "w", newline="", encoding="utf-8") as f:
-        writer = csv.DictWriter(f, fieldnames=["item_id", "category_id", "price"])
-        writer.writeheader()
-        writer.writerows(items)
+    # 列数组直接组表写入 CSV
+    items = {
+        "item_id": np.arange(1, NUM_ITEMS + 1),
+        "category_id": item_categories,
+        "price": prices,
+    }
+    _write_dim_csv(items, ITEMS_FILE)
 
     print(f"  商品维表: {NUM_ITEMS:,} 条 -> {ITEMS_FILE}")
     return items
@@ -108,21 +131,12 @@ def generate_users():
     channels = ["App Store", "官网", "小程序"]
     channel_probs = [0.34, 0.33, 0.33]
 
-    users = []
-    user_ages = np.random.choice(age_groups, size=NUM_USERS, p=age_probs)
-    user_channels = np.random.choice(channels, size=NUM_USERS, p=channel_probs)
-
-    for i in range(NUM_USERS):
-        users.append({
-            "user_id": i + 1,
-            "age_group": user_ages[i],
-            "channel": user_channels[i],
-        })
-
-    with open(USERS_FILE, "w", newline="", encoding="utf-8") as f:
-        writer = csv.DictWriter(f, fieldnames=["user_id", "age_group", "channel"])
-        writer.writeheader()
-        writer.writerows(users)
+    users = {
+        "user_id": np.arange(1, NUM_USERS + 1),
+        "age_group": np.random.choice(age_groups, size=NUM_USERS, p=age_probs),
+        "channel": np.random.choice(channels, size=NUM_USERS, p=channel_probs),
+    }
+    _write_dim_csv(users, USERS_FILE)
 
     print(f"  用户维表: {NUM_USERS:,} 条 -> {USERS_FILE}")
     return users
@@ -234,9 +248,9 @@ def generate_behaviors(items, users):
     item_popularity = np.random.zipf(a=1.3, size=NUM_ITEMS).astype(float)
     item_popularity /= item_popularity.sum()
 
-    # 商品价格查找表
-    item_prices = {item["item_id"]: item["price"] for item in items}
-    item_cats = {item["item_id"]: item["category_id"] for item in items}
+    # 商品价格 / 品类查找表（按 item_id - 1 下标访问）
+    item_prices = items["price"]
+    item_cats = items["category_id"]
 
     # 时间分布
     dates, daily_weights = build_daily_weights()
@@ -247,18 +261,14 @@ def generate_behaviors(items, users):
     #   次日留存 ~35%, 7日留存 ~8%, 30日 ~2%
     #   使用指数分布: P(active on day d) = exp(-d / τ), τ=3.5
     tau = 3.5  # 衰减时间常数
-    user_active_days = {}
-    for uid in range(1, NUM_USERS + 1):
-        # 每个用户有一个首次活跃日
-        first_day = np.random.choice(len(dates), p=daily_weights)
-        # 后续活跃日按指数衰减概率独立采样
-        active_days_set = {first_day}
-        for d in range(first_day + 1, TOTAL_DAYS):
-            days_since = d - first_day
-            retention_prob = np.exp(-days_since / tau)
-            if np.random.random() < retention_prob:
-                active_days_set.add(d)
-        user_active_days[uid] = sorted(active_days_set)
+    # 每个用户有一个首次活跃日
+    first_days = np.random.choice(len(dates), size=NUM_USERS, p=daily_weights)
+    # 后续活跃日按指数衰减概率独立采样: 整体构造 (用户 × 天) 的活跃矩阵
+    days_since = np.arange(TOTAL_DAYS)[np.newaxis, :] - first_days[:, np.newaxis]
+    retention_prob = np.exp(-np.maximum(days_since, 0) / tau)
+    user_active = (days_since == 0) | (
+        (days_since > 0) & (np.random.random((NUM_USERS, TOTAL_DAYS)) < retention_prob)
+    )
 
     # ── 价格对转化率的影响函数 ──
     def price_friction(price):
@@ -277,114 +287,83 @@ def generate_behaviors(items, users):
     # 基础转化率: PV→Cart=10%, Cart→Buy=20%
     BASE_PV_TO_CART = 0.10
     BASE_CART_TO_BUY = 0.20
-    item_cart_prob = {}
-    item_buy_prob = {}
-    for item in items:
-        friction = price_friction(item["price"])
-        item_cart_prob[item["item_id"]] = BASE_PV_TO_CART * friction
-        item_buy_prob[item["item_id"]] = BASE_CART_TO_BUY * friction
+    # 对价格数组整体求摩擦因子，结果同样按 item_id - 1 下标访问
+    friction = price_friction(item_prices)
+    item_cart_prob = BASE_PV_TO_CART * friction
+    item_buy_prob = BASE_CART_TO_BUY * friction
 
     # ── 双11 转化率加成 ──
     double11_idx = (datetime.date(2017, 11, 11) - START_DATE.date()).days
-    double11_range = set(range(max(0, double11_idx - 3), min(TOTAL_DAYS, double11_idx + 4)))
+    is_double11 = np.zeros(TOTAL_DAYS, dtype=bool)
+    is_double11[max(0, double11_idx - 3):min(TOTAL_DAYS, double11_idx + 4)] = True
 
-    # ── 主循环: 批量生成行为记录 ──
+    # ── 主流程: 全部事件展平为一维数组, 整批向量化生成 ──
     print(f"  [*] 目标: {TARGET_ROWS:,} 行, 用户: {NUM_USERS:,}, 商品: {NUM_ITEMS:,}")
 
-    # 预分配用户和商品的采样索引
-    user_ids = np.arange(1, NUM_USERS + 1)
     item_ids = np.arange(1, NUM_ITEMS + 1)
 
-    behaviors = []
-    total_pv = 0
-    total_cart = 0
-    total_buy = 0
-
-    # 按用户批量生成, 利用 Pareto 分布分配每个用户的行为数
-    events_per_user = np.random.pareto(a=1.2, size=NUM_USERS) + 1
-    events_per_user = events_per_user / events_per_user.sum() * TARGET_ROWS
-    events_per_user = np.maximum(events_per_user.astype(int), 1)
-
-    # 调整总数使其接近目标
-    diff = TARGET_ROWS - events_per_user.sum()
-    if diff > 0:
-        # 随机给一些用户加事件
-        bonus_users = np.random.choice(NUM_USERS, size=abs(diff), p=user_activity)
-        for u in bonus_users:
-            events_per_user[u] += 1
-
-    progress_interval = NUM_USERS // 20  # 每 5% 打印一次
-    for user_idx in range(NUM_USERS):
-        uid = user_idx + 1
-        n_events = int(events_per_user[user_idx])
-        if n_events == 0:
-            continue
-
-        # 该用户的活跃天列表
-        active_days = user_active_days.get(uid, [0])
-        n_days = len(active_days)
-
-        # 为该用户的所有事件分配: 日期 + 小时 + 商品
-        day_indices = np.random.choice(active_days, size=n_events)
-        hours = np.random.choice(24, size=n_events, p=hourly_weights)
-        minutes = np.random.randint(0, 60, size=n_events)
-        seconds = np.random.randint(0, 60, size=n_events)
-        chosen_items = np.random.choice(item_ids, size=n_events, p=item_popularity)
-
-        for ev in range(n_events):
-            iid = int(chosen_items[ev])
-            cat_id = item_cats[iid]
-            day_idx = int(day_indices[ev])
-            dt = dates[day_idx]
-
-            # 组装时间戳（北京时间 → Unix 时间戳需减掉 8 小时偏移）
-            event_dt = datetime.datetime(
-                dt.year, dt.month, dt.day,
-                int(hours[ev]), int(minutes[ev]), int(seconds[ev])
-            )
-            # datetime.timestamp() 在 Windows 上已按本地时区(UTC+8)转换，无需额外偏移
-            ts = int(event_dt.timestamp())
-
-            # ── 漏斗转化逻辑 ──
-            # 每条记录默认为 pv
-            behavior_type = "pv"
-            total_pv += 1
-
-            # 双11 期间转化率提升 50%
-            is_double11 = day_idx in double11_range
-            cart_boost = 1.5 if is_double11 else 1.0
-
-            # PV → Cart?
-            cart_prob = item_cart_prob[iid] * cart_boost
-            if np.random.random() < cart_prob:
-                behavior_type = "cart"
-                total_cart += 1
-
-                # Cart → Buy?
-                buy_prob = item_buy_prob[iid] * cart_boost
-                if np.random.random() < buy_prob:
-                    behavior_type = "buy"
-                    total_buy += 1
-
-            behaviors.append((uid, iid, cat_id, behavior_type, ts))
-
-        # 进度条
-        if (user_idx + 1) % progress_interval == 0:
-            pct = (user_idx + 1) / NUM_USERS * 100
-            elapsed = time.time() - t0
-            print(f"  [{'█' * int(pct // 5)}{' ' * (20 - int(pct // 5))}] "
-                  f"{pct:5.1f}% | {len(behaviors):>10,} 行 | {elapsed:.1f}s")
+    # 按 Pareto 活跃度一次多项分布抽样分配每个用户的行为数:
+    # 每人保底 1 条, 其余 TARGET_ROWS - NUM_USERS 条按活跃度分配, 总数恰为目标行数
+    events_per_user = np.random.multinomial(TARGET_ROWS - NUM_USERS, user_activity) + 1
+
+    # 每条事件所属用户（0 起始下标）
+    n_total = int(events_per_user.sum())
+    event_user_idx = np.repeat(np.arange(NUM_USERS), events_per_user)
+
+    # 日期: 在所属用户的活跃天中等概率抽取
+    # 活跃矩阵按行展开即各用户活跃天首尾拼接的一维数组, 用偏移量 + 随机下标定位
+    _, active_flat = np.nonzero(user_active)
+    active_counts = user_active.sum(axis=1)
+    active_offsets = np.concatenate(([0], np.cumsum(active_counts)[:-1]))
+    pick = (np.random.random(n_total) * active_counts[event_user_idx]).astype(np.int64)
+    day_indices = active_flat[active_offsets[event_user_idx] + pick]
+
+    hours = np.random.choice(24, size=n_total, p=hourly_weights)
+    minutes = np.random.randint(0, 60, size=n_total)
+    seconds = np.random.randint(0, 60, size=n_total)
+    chosen_items = np.random.choice(item_ids, size=n_total, p=item_popularity)
+
+    # 组装时间戳: 每天 0 点的 Unix 时间戳只算 TOTAL_DAYS 次, 再叠加时分秒
+    # datetime.timestamp() 在 Windows 上已按本地时区(UTC+8)转换，无需额外偏移
+    day_start_ts = np.array(
+        [int(datetime.datetime(d.year, d.month, d.day).timestamp()) for d in dates],
+        dtype=np.int64,
+    )
+    ts = day_start_ts[day_indices] + hours * 3600 + minutes * 60 + seconds
+
+    # ── 漏斗转化逻辑 ──
+    # 每条记录默认为 pv; 双11 期间转化率提升 50%
+    cart_boost = np.where(is_double11[day_indices], 1.5, 1.0)
+    item_idx = chosen_items - 1
+
+    # PV → Cart → Buy
+    cart_hit = np.random.random(n_total) < item_cart_prob[item_idx] * cart_boost
+    buy_hit = cart_hit & (np.random.random(n_total) < item_buy_prob[item_idx] * cart_boost)
+    behavior_types = np.where(buy_hit, "buy", np.where(cart_hit, "cart", "pv"))
+
+    total_pv = n_total
+    total_cart = int(cart_hit.sum())
+    total_buy = int(buy_hit.sum())
 
     # ── 按时间戳排序 ──
-    print(f"  [*] 排序 {len(behaviors):,} 条记录...")
-    behaviors.sort(key=lambda x: x[4])
-
-    # ── 写入 CSV (无 header, 兼容原始 UserBehavior.csv 格式) ──
+    print(f"  [*] 排序 {n_total:,} 条记录...")
+    # 行为记录组装为结构化数组, 按 ts 列做一次稳定 argsort 重排
+    behaviors = np.empty(n_total, dtype=BEHAVIOR_DTYPE)
+    behaviors["user_id"] = event_user_idx + 1
+    behaviors["item_id"] = chosen_items
+    behaviors["category_id"] = item_cats[item_idx]
+    behaviors["type"] = behavior_types
+    behaviors["ts"] = ts
+    behaviors = behaviors[np.argsort(behaviors["ts"], kind="stable")]
+
+    # ── 写入 CSV (无 header, 不加引号, 兼容原始 UserBehavior.csv 格式) ──
+    # 由 Arrow 在 C++ 层按列序列化, 不再逐行调用 csv.writer
     print(f"  [*] 写入 CSV...")
-    with open(BEHAVIOR_FILE, "w", newline="", encoding="utf-8") as f:
-        writer = csv.writer(f)
-        for row in behaviors:
-            writer.writerow(row)
+    pa_csv.write_csv(
+        pa.table({name: np.ascontiguousarray(behaviors[name]) for name in BEHAVIOR_DTYPE.names}),
+        BEHAVIOR_FILE,
+        write_options=pa_csv.WriteOptions(include_header=False, quoting_style="none"),
+    )
 
     elapsed = time.time() - t0
     actual_pv2cart = total_cart / max(total_pv, 1) * 100
@@ -408,45 +387,41 @@ def print_quality_report(behaviors, items):
     print("数据质量报告")
     print("=" * 60)
 
-    # 日期分布
-    from collections import Counter
-    date_counter = Counter()
-    for row in behaviors:
-        ts = row[4]
-        dt = datetime.datetime.fromtimestamp(ts)
-        date_counter[dt.strftime("%Y-%m-%d")] += 1
-
-    sorted_dates = sorted(date_counter.items())
+    ts = behaviors["ts"]
+
+    # 日期分布: 按本地时区每日 0 点分界, searchsorted 批量定位所属日期
+    dates = [START_DATE.date() + datetime.timedelta(days=d) for d in range(TOTAL_DAYS)]
+    day_start_ts = np.array(
+        [int(datetime.datetime(d.year, d.month, d.day).timestamp()) for d in dates],
+        dtype=np.int64,
+    )
+    day_counts = np.bincount(
+        np.searchsorted(day_start_ts, ts, side="right") - 1, minlength=TOTAL_DAYS
+    )
+    sorted_dates = [(d.strftime("%Y-%m-%d"), int(c)) for d, c in zip(dates, day_counts) if c > 0]
     print(f"\n  📅 日期分布 (共 {len(sorted_dates)} 天):")
     print(f"    {'日期':<12} {'行为数':>10} {'柱状图'}")
-    max_count = max(date_counter.values())
+    max_count = max(count for _, count in sorted_dates)
     for date_str, count in sorted_dates:
         bar = "█" * int(count / max_count * 40)
         print(f"    {date_str:<12} {count:>10,} {bar}")
 
     # 商品热度验证: Top 20% 的流量占比
-    item_counter = Counter()
-    for row in behaviors:
-        item_counter[row[1]] += 1
-
-    sorted_items = sorted(item_counter.values(), reverse=True)
+    item_counts = np.bincount(behaviors["item_id"])
+    sorted_items = np.sort(item_counts[item_counts > 0])[::-1]
     top_20_pct = int(len(sorted_items) * 0.2)
-    top_20_traffic = sum(sorted_items[:top_20_pct])
-    total_traffic = sum(sorted_items)
+    top_20_traffic = int(sorted_items[:top_20_pct].sum())
+    total_traffic = int(sorted_items.sum())
     print(f"\n  二八法则验证:")
     print(f"    Top 20% 商品流量占比: {top_20_traffic / total_traffic * 100:.1f}%")
 
-    # 时段分布
-    hour_counter = Counter()
-    for row in behaviors:
-        ts = row[4]
-        dt = datetime.datetime.utcfromtimestamp(ts + 8 * 3600)
-        hour_counter[dt.hour] += 1
+    # 时段分布（北京时间）
+    hour_counts = np.bincount((ts + 8 * 3600) // 3600 % 24, minlength=24)
 
     print(f"\n  ⏰ 日内时段分布:")
-    max_h = max(hour_counter.values())
+    max_h = int(hour_counts.max())
     for h in range(24):
-        c = hour_counter.get(h, 0)
+        c = int(hour_counts[h])
         bar = "█" * int(c / max_h * 30)
         label = "**" if h in (20, 21) else (".." if h in (3, 4) else "  ")
         print(f"    {h:02d}:00 {label} {c:>8,} {bar}")
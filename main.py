@@ -6,12 +6,14 @@
 from contextlib import asynccontextmanager
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
 
-from core.config import CORS_ORIGINS
+from core.config import CORS_ORIGINS, GZIP_MINIMUM_SIZE, GZIP_COMPRESS_LEVEL, SQLITE_INDEX_STMTS
 from core.logging import logger
 from db.manager import db_manager
 from api.exception_handlers import http_exception_handler, global_exception_handler
-from api.middleware import verify_jwt_token
+from api.middleware import JWTAuthMiddleware
+from api.responses import ORJSONResponse
 from api.routers import auth, dashboard, charts, ai_chat
 from fastapi.staticfiles import StaticFiles
 from fastapi.responses import FileResponse
@@ -25,14 +27,14 @@ async def lifespan(app: FastAPI):
     """应用生命周期管理器"""
     # Startup 阶段
     try:
-        db, is_sqlite = db_manager.get_connection()
+        _, is_sqlite = db_manager.get_connection()
         if is_sqlite:
-            with db_manager.get_sqlite_cursor() as cursor:
-                cursor.execute("CREATE INDEX IF NOT EXISTS idx_buy_fact_date ON buy_fact(date)")
-                cursor.execute("CREATE INDEX IF NOT EXISTS idx_funnel_date ON user_funnel_mart(date)")
-                cursor.execute("CREATE INDEX IF NOT EXISTS idx_cohort_date ON cohort_matrix(cohort_date)")
-                cursor.execute("CREATE INDEX IF NOT EXISTS idx_buy_fact_user ON buy_fact(user_id)")
-                db.commit()
+            with db_manager.get_sqlite_writer() as cursor:
+                for stmt in SQLITE_INDEX_STMTS:
+                    cursor.execute(stmt)
+            # 仅对统计信息过期/缺失的表增量 ANALYZE（ETL 导入后已做全量 ANALYZE）
+            with db_manager.get_sqlite_writer() as cursor:
+                cursor.execute("PRAGMA optimize")
             logger.info("SQLite 索引已建立/确认存在")
     except Exception as e:
         logger.warning("索引创建跳过（表可能不存在）: %s", e)
@@ -46,7 +48,17 @@ async def lifespan(app: FastAPI):
 
 # --- 创建 FastAPI 应用 ---
 
-app = FastAPI(title="电商数据看板 API", version="3.0.0", lifespan=lifespan)
+# 默认响应类使用 orjson 序列化，降低大列表接口（留存矩阵、趋势）的编码开销
+app = FastAPI(
+    title="电商数据看板 API",
+    version="3.0.0",
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse,
+)
+
+# Gzip 压缩：图表 JSON（留存矩阵、趋势）重复键多、压缩比高；小于阈值的响应不压缩。
+# 最先注册 → 位于中间件栈最内层，JWT 拦截返回的 401 不经过压缩
+app.add_middleware(GZipMiddleware, minimum_size=GZIP_MINIMUM_SIZE, compresslevel=GZIP_COMPRESS_LEVEL)
 
 # CORS: 允许前端跨域访问（白名单来自环境变量或默认本地开发地址）
 app.add_middleware(
@@ -58,7 +70,7 @@ app.add_middleware(
 )
 
 # JWT 认证中间件：拦截所有请求校验 Token（白名单路径除外）
-app.middleware("http")(verify_jwt_token)
+app.add_middleware(JWTAuthMiddleware)
 
 # 全局异常处理：HTTPException 保留业务错误信息，其余 500 兜底
 app.add_exception_handler(HTTPException, http_exception_handler)
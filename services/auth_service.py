@@ -3,15 +3,47 @@
 负责用户校验和 Token 签发，不包含 HTTP 相关逻辑。
 """
 
-from core.security import create_jwt_token
+import os
+import hmac
+import hashlib
 
+from core.cache import TTLCache
+from core.security import create_jwt_token, verify_password
 
-# 模拟用户数据（毕业设计演示：admin/123456 或 viewer/123456）
+
+# 模拟用户数据（毕业设计演示：admin/123456 或 viewer/123456），仅保存 scrypt 口令哈希
 VALID_USERS = {
-    "admin": {"password": "123456", "role": "admin"},
-    "viewer": {"password": "123456", "role": "viewer"},
+    "admin": {
+        "password_hash": "scrypt$16384$8$1$75b5b38d2dd5ac8397fa5d6a2c9ae3c8$"
+                         "4de365a8f3ca00e7de08b7eccf3b23a839801c495652773eeea6348f8bcbd4b8"
+                         "48b5709e82663904c1e0ed439d07950ea6261648eb2c2f032fb10b2165da1efb",
+        "role": "admin",
+    },
+    "viewer": {
+        "password_hash": "scrypt$16384$8$1$b9997a057c625eed6b95f06cd1d70320$"
+                         "c26d689b20753e8eeaf251ca912f02c83d394f902d0438c696b44170fa83f2e0"
+                         "bc312aaa51097b8e13dbc20a167e70a164878fb7e4f602a15d56c8e4678f36e5",
+        "role": "viewer",
+    },
 }
 
+# 校验成功结果缓存：看板刷新反复登录时跳过 scrypt 计算。
+# 键为进程内随机密钥的 HMAC 摘要，内存中不保留明文口令；校验失败不缓存，暴力尝试仍需逐次付出哈希代价
+_VERIFIED_CACHE_TTL = 600.0
+_verified_cache = TTLCache(maxsize=1024, ttl=_VERIFIED_CACHE_TTL)
+_cache_key_secret = os.urandom(32)
+
+
+def _check_password(username: str, password: str, password_hash: str) -> bool:
+    """校验口令，命中成功缓存时直接返回"""
+    key = (username, hmac.new(_cache_key_secret, password.encode(), hashlib.sha256).digest())
+    if _verified_cache.get(key):
+        return True
+    if not verify_password(password, password_hash):
+        return False
+    _verified_cache.set(key, True)
+    return True
+
 
 def authenticate_user(username: str, password: str) -> dict | None:
     """
@@ -19,7 +51,7 @@ def authenticate_user(username: str, password: str) -> dict | None:
     返回: 包含 token/role/username 的字典，校验失败返回 None。
     """
     user_info = VALID_USERS.get(username)
-    if not user_info or user_info["password"] != password:
+    if not user_info or not _check_password(username, password, user_info["password_hash"]):
         return None
 
     token = create_jwt_token(username, user_info["role"])
@@ -4,17 +4,43 @@
 不包含 SQL 查询和 HTTP 相关逻辑。
 """
 
+import asyncio
 import datetime
 from typing import Optional
 
 from fastapi import HTTPException
+from starlette.concurrency import run_in_threadpool
 from dateutil.relativedelta import relativedelta
 
-from core.config import PERIOD_MAP, DATE_PATTERN
+from core.config import PERIOD_MAP, TREND_TARGET_PIXELS
 from db.manager import db_manager
-from dao.base import safe_float, safe_int
+from dao.base import fast_float, fast_int
 from dao.user_dao import fetch_date_range
 
+# 环比偏移量（模块加载时构造一次，请求期间只做查表）
+_PREV_PERIOD_SHIFT = {
+    'month': relativedelta(months=1),
+    'week': datetime.timedelta(weeks=1),
+}
+_ONE_DAY = datetime.timedelta(days=1)
+_ONE_YEAR = relativedelta(years=1)
+_DEFAULT_LOOKBACK = datetime.timedelta(days=30)
+
+
+def _is_iso_date(value: str) -> bool:
+    """
+    校验 YYYY-MM-DD 日期字符串。
+    先以长度与分隔符位置排除 fromisoformat 额外接受的 YYYYMMDD / ISO 周日期等写法，
+    再由 C 实现的 date.fromisoformat 完成数字与日历合法性校验（比正则匹配更快，且拒绝 2017-13-45）。
+    """
+    if len(value) != 10 or value[4] != '-' or value[7] != '-':
+        return False
+    try:
+        datetime.date.fromisoformat(value)
+    except ValueError:
+        return False
+    return True
+
 
 def resolve_dates(
     start_date: Optional[str],
@@ -23,95 +49,117 @@ def resolve_dates(
 ) -> tuple:
     """
     解析和校验日期参数。
-    若未传入，则默认取数据库中最大日期往前回溯 30 天。
+    若未传入，则默认取数据库中最大日期往前回溯 30 天；
+    默认区间由 date.isoformat() 生成、格式必然合法，只对客户端传入的日期做校验。
     """
-    base_start, base_end = fetch_date_range(backend)
     if not start_date or not end_date:
-        end_date = base_end
+        _, base_end = fetch_date_range(backend)
         # 默认回溯 30 天（不钳制下界，前端 disabledDate 会负责标灰无数据日期）
-        start_date = (
-            datetime.datetime.strptime(base_end, '%Y-%m-%d')
-            - datetime.timedelta(days=30)
-        ).strftime('%Y-%m-%d')
-    if not DATE_PATTERN.match(start_date) or not DATE_PATTERN.match(end_date):
+        end = datetime.date.fromisoformat(base_end)
+        return (end - _DEFAULT_LOOKBACK).isoformat(), end.isoformat()
+    if not _is_iso_date(start_date) or not _is_iso_date(end_date):
         raise HTTPException(status_code=400, detail="日期格式非法，必须为 YYYY-MM-DD")
     return start_date, end_date
 
 
-def calculate_qoq_yoy(
-    total_sales: float,
+def comparison_periods(
     period: str,
-    curr_start: datetime.datetime,
-    curr_end: datetime.datetime,
-    backend
-) -> dict:
+    curr_start: datetime.date,
+    curr_end: datetime.date
+) -> tuple:
     """
-    计算环比（QoQ）和同比（YoY）增长率。
-    基于 period 类型动态判断对比周期。
+    计算环比与同比的对比周期。
+    基于 period 类型动态判断环比偏移，返回 (prev_start, prev_end, ly_start, ly_end) 日期字符串。
     """
-    period_days = (curr_end - curr_start).days + 1
-
-    # 环比周期计算
-    if period == 'month':
-        prev_start = curr_start - relativedelta(months=1)
-        prev_end = curr_end - relativedelta(months=1)
-    elif period == 'week':
-        prev_start = curr_start - datetime.timedelta(weeks=1)
-        prev_end = curr_end - datetime.timedelta(weeks=1)
+    # 环比周期计算：月/周按固定偏移平移，其余按当期天数向前顺延
+    shift = _PREV_PERIOD_SHIFT.get(period)
+    if shift is not None:
+        prev_start = curr_start - shift
+        prev_end = curr_end - shift
     else:
-        prev_end = curr_start - datetime.timedelta(days=1)
-        prev_start = prev_end - datetime.timedelta(days=period_days - 1)
+        prev_end = curr_start - _ONE_DAY
+        prev_start = prev_end - (curr_end - curr_start)
 
     # 同比：去年同期
-    ly_start = curr_start - relativedelta(years=1)
-    ly_end = curr_end - relativedelta(years=1)
+    ly_start = curr_start - _ONE_YEAR
+    ly_end = curr_end - _ONE_YEAR
 
-    prev_sales = backend.fetch_comparison_sales(
-        prev_start.strftime('%Y-%m-%d'),
-        prev_end.strftime('%Y-%m-%d')
-    )
-    ly_sales = backend.fetch_comparison_sales(
-        ly_start.strftime('%Y-%m-%d'),
-        ly_end.strftime('%Y-%m-%d')
+    return (
+        prev_start.isoformat(), prev_end.isoformat(),
+        ly_start.isoformat(), ly_end.isoformat(),
     )
 
+
+def growth_rates(total_sales: float, prev_sales: Optional[float], ly_sales: Optional[float]) -> dict:
+    """由当期与对比周期销售额计算环比/同比增长率，基期为空或 0 时返回 None"""
     qoq_rate = round((total_sales - prev_sales) / prev_sales * 100, 2) if prev_sales else None
     yoy_rate = round((total_sales - ly_sales) / ly_sales * 100, 2) if ly_sales else None
-    
-    from core.logging import logger
-    logger.info(f"DEBUG: prev_sales={prev_sales}, ly_sales={ly_sales} -> qoq={qoq_rate}, yoy={yoy_rate}")
-
     return {"qoq_rate": qoq_rate, "yoy_rate": yoy_rate}
 
 
-def get_core_metrics_data(sd: str, ed: str, period: str, backend) -> dict:
-    """组装核心指标数据（供路由层直接使用）"""
-    curr_start = datetime.datetime.strptime(sd, '%Y-%m-%d')
-    curr_end = datetime.datetime.strptime(ed, '%Y-%m-%d')
+def _fetch_core_block(sd: str, ed: str, period: str, backend) -> dict:
+    """单次查询取回当期核心指标与环比/同比基期销售额，并计算增长率"""
+    curr_start = datetime.date.fromisoformat(sd)
+    curr_end = datetime.date.fromisoformat(ed)
+    core = backend.fetch_core_with_comparison(
+        sd, ed, *comparison_periods(period, curr_start, curr_end)
+    )
+    core.update(growth_rates(core["total_sales"], core["prev_sales"], core["ly_sales"]))
+    return core
 
-    core = backend.fetch_core_metrics(sd, ed)
-    funnel_data = backend.fetch_funnel(sd, ed)
+
+def _assemble_core(core: dict, funnel_data: dict, period: str) -> dict:
+    """核心指标卡片数据结构"""
     total_sales = core.get("total_sales", 0.0)
     total_orders = core.get("total_orders", 0)
-    comparison = calculate_qoq_yoy(total_sales, period, curr_start, curr_end, backend)
-
     return {
         "total_sales": total_sales,
         "total_orders": total_orders,
         "paying_users": funnel_data.get('buy', 0),
         "avg_order_value": round(total_sales / total_orders, 2) if total_orders > 0 else 0.0,
-        "qoq_rate": comparison.get("qoq_rate"),
-        "yoy_rate": comparison.get("yoy_rate"),
+        "qoq_rate": core.get("qoq_rate"),
+        "yoy_rate": core.get("yoy_rate"),
         "period_label": PERIOD_MAP[period]["label"],
     }
 
 
-def format_trend(trend_raw: dict) -> dict:
-    return {
-        "dates": trend_raw.get("dates", []),
-        "sales": trend_raw.get("sales", []),
-        "orders": trend_raw.get("orders", []),
-    }
+def get_core_metrics_data(sd: str, ed: str, period: str, backend) -> dict:
+    """组装核心指标数据（供路由层直接使用）"""
+    core = _fetch_core_block(sd, ed, period, backend)
+    funnel_data = backend.fetch_funnel(sd, ed)
+    return _assemble_core(core, funnel_data, period)
+
+
+def _m4_indices(sales: list, orders: list, target_pixels: int) -> list:
+    """
+    M4 降采样：将序列按像素列均分为 target_pixels 个桶，每桶保留首点、末点及两条序列各自的
+    最小/最大值点（按原顺序去重），折线在该像素密度下与原序列渲染一致。
+    """
+    n = len(sales)
+    bucket = -(-n // target_pixels)  # ceil(n / target_pixels)
+    indices = []
+    for start in range(0, n, bucket):
+        span = range(start, min(start + bucket, n))
+        picks = {
+            span[0], span[-1],
+            min(span, key=sales.__getitem__), max(span, key=sales.__getitem__),
+            min(span, key=orders.__getitem__), max(span, key=orders.__getitem__),
+        }
+        indices.extend(sorted(picks))
+    return indices
+
+
+def format_trend(trend_raw: dict, target_pixels: int = TREND_TARGET_PIXELS) -> dict:
+    """点数超过 4 × target_pixels 时按 M4 降采样，仅保留渲染可见的点"""
+    dates = trend_raw.get("dates", [])
+    sales = trend_raw.get("sales", [])
+    orders = trend_raw.get("orders", [])
+    if len(dates) > target_pixels * 4:
+        indices = _m4_indices(sales, orders, target_pixels)
+        dates = [dates[i] for i in indices]
+        sales = [sales[i] for i in indices]
+        orders = [orders[i] for i in indices]
+    return {"dates": dates, "sales": sales, "orders": orders}
 
 
 def format_funnel(funnel_raw: dict) -> list:
@@ -123,85 +171,88 @@ def format_funnel(funnel_raw: dict) -> list:
 
 
 def format_rankings(top10_rows: list) -> dict:
+    """top10_rows: (item_id, sales) 行"""
     return {
-        "items": [f"商品{r.get('item_id', '未知')}" for r in top10_rows],
-        "sales": [round(safe_float(r.get('sales')), 2) for r in top10_rows],
+        "items": [f"商品{item_id}" for item_id, _ in top10_rows],
+        "sales": [round(fast_float(sales), 2) for _, sales in top10_rows],
     }
 
 
 def format_dimensions(cat_rows: list, chan_rows: list, age_rows: list) -> dict:
+    """各维度行均为 (维度键, sales)"""
     return {
         "category": [
-            {"name": f"品类{r.get('category_id', '未知')}", "value": round(safe_float(r.get('sales')), 2)}
-            for r in cat_rows
+            {"name": f"品类{category_id}", "value": round(fast_float(sales), 2)}
+            for category_id, sales in cat_rows
         ],
         "channel": [
-            {"name": r.get('channel', '未知'), "value": round(safe_float(r.get('sales')), 2)}
-            for r in chan_rows
+            {"name": channel, "value": round(fast_float(sales), 2)}
+            for channel, sales in chan_rows
         ],
         "age_group": [
-            {"name": r.get('age_group', '未知'), "value": round(safe_float(r.get('sales')), 2)}
-            for r in age_rows
+            {"name": age_group, "value": round(fast_float(sales), 2)}
+            for age_group, sales in age_rows
         ],
     }
 
 
 def format_rfm(rfm_rows: list) -> list:
+    """rfm_rows: (rfm_label, cnt) 行"""
     return [
-        {"name": r.get('rfm_label', '未知'), "value": safe_int(r.get('cnt'))}
-        for r in rfm_rows
+        {"name": rfm_label, "value": fast_int(cnt)}
+        for rfm_label, cnt in rfm_rows
     ]
 
 
 def format_retention(cohort_rows: list) -> list:
+    """
+    cohort_rows: (cohort_date, day_diff, active_users, cohort_users) 行，单次遍历直接产出最终结构。
+    留存矩阵规模有界（day_diff 仅 0~7），逐行纯 Python 计算即可；
+    分母以 `or 1` 兜底（人数非负，等价于 max(x, 1)），省去每行一次内置函数调用。
+    """
     return [
         [
-            safe_int(r.get('day_diff')),
-            str(r.get('cohort_date', '')),
-            round(safe_int(r.get('active_users')) / max(safe_int(r.get('cohort_users')), 1) * 100, 2),
-        ] for r in cohort_rows
+            fast_int(day_diff),
+            str(cohort_date),
+            round(fast_int(active_users) / (fast_int(cohort_users) or 1) * 100, 2),
+        ] for cohort_date, day_diff, active_users, cohort_users in cohort_rows
     ]
 
 
-def get_dashboard_all_data(sd: str, ed: str, period: str, backend) -> dict:
+async def get_dashboard_all_data(
+    sd: str, ed: str, period: str, backend, target_pixels: int = TREND_TARGET_PIXELS
+) -> dict:
     """
     组装全看板聚合数据（一次请求返回所有看板数据）。
     将 8 次 HTTP 请求合并为 1 次，内部只调用一次 resolve_dates。
-    """
-    curr_start = datetime.datetime.strptime(sd, '%Y-%m-%d')
-    curr_end = datetime.datetime.strptime(ed, '%Y-%m-%d')
 
-    # 一次性获取所有原生数据（直接通过 backend 策略接口调用）
-    core = backend.fetch_core_metrics(sd, ed)
-    total_sales = core.get("total_sales", 0.0)
-    total_orders = core.get("total_orders", 0)
-    comparison = calculate_qoq_yoy(total_sales, period, curr_start, curr_end, backend)
-    trend = backend.fetch_trend(sd, ed, PERIOD_MAP[period])
-    funnel_data = backend.fetch_funnel(sd, ed)
-    top10_rows = backend.fetch_top10(sd, ed)
-    cat_rows = backend.fetch_category(sd, ed)
-    chan_rows = backend.fetch_channel(sd, ed)
-    age_rows = backend.fetch_age_group(sd, ed)
-    rfm_rows = backend.fetch_rfm(sd, ed)
-    cohort_rows = backend.fetch_cohort(sd, ed)
-    base_start, base_end = fetch_date_range(backend)
+    各子查询相互独立，通过 asyncio.gather + 线程池并发执行，
+    总耗时由各查询之和降为最慢的单条查询。
+    SQLite 每条子查询从连接池借用独立连接（WAL 模式支持并发读）。
+    """
+    # 并发获取所有原生数据（直接通过 backend 策略接口调用）
+    (
+        core, trend, funnel_data, top10_rows, dims,
+        rfm_rows, cohort_rows, (base_start, base_end),
+    ) = await asyncio.gather(
+        run_in_threadpool(_fetch_core_block, sd, ed, period, backend),
+        run_in_threadpool(backend.fetch_trend, sd, ed, PERIOD_MAP[period]),
+        run_in_threadpool(backend.fetch_funnel, sd, ed),
+        run_in_threadpool(backend.fetch_top10, sd, ed),
+        run_in_threadpool(backend.fetch_dimensions, sd, ed),
+        run_in_threadpool(backend.fetch_rfm, sd, ed),
+        run_in_threadpool(backend.fetch_cohort, sd, ed),
+        run_in_threadpool(fetch_date_range, backend),
+    )
 
     # 交给 format 方法组装出安全结构
     return {
         "date_range": {"min": base_start, "max": base_end},
-        "core": {
-            "total_sales": total_sales,
-            "total_orders": total_orders,
-            "paying_users": funnel_data.get('buy', 0),
-            "avg_order_value": round(total_sales / total_orders, 2) if total_orders > 0 else 0.0,
-            "qoq_rate": comparison.get("qoq_rate"),
-            "yoy_rate": comparison.get("yoy_rate"),
-            "period_label": PERIOD_MAP[period]["label"],
-        },
-        "trend": format_trend(trend),
+        "core": _assemble_core(core, funnel_data, period),
+        "trend": format_trend(trend, target_pixels),
         "funnel": format_funnel(funnel_data),
         "rankings": format_rankings(top10_rows),
-        "dimensions": format_dimensions(cat_rows, chan_rows, age_rows),
+        "dimensions": format_dimensions(dims["category"], dims["channel"], dims["age_group"]),
         "rfm": format_rfm(rfm_rows),
         "retention": format_retention(cohort_rows),
     }
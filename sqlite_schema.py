@@ -0,0 +1,56 @@
+"""
+SQLite 库结构语句
+看板覆盖索引与按日预聚合表的 DDL/DML，由后端（core.config / db.manager）与 ETL（etl.data_writer）共用。
+本模块不依赖任何第三方包与项目模块，ETL 可在不安装后端依赖的环境中独立导入。
+"""
+
+# SQLite 看板索引
+# 看板查询均按日期区间过滤，再对 price 聚合并按某一维度分组：
+# 以 date 为前导列、带上分组列与 price 的覆盖索引可直接在索引内完成聚合，无需回表
+SQLITE_INDEX_STMTS = (
+    "CREATE INDEX IF NOT EXISTS idx_buy_fact_date_sales ON buy_fact(date, price, order_id, user_id)",
+    "CREATE INDEX IF NOT EXISTS idx_buy_fact_date_item ON buy_fact(date, item_id, price)",
+    "CREATE INDEX IF NOT EXISTS idx_buy_fact_date_category ON buy_fact(date, category_id, price)",
+    "CREATE INDEX IF NOT EXISTS idx_buy_fact_date_channel ON buy_fact(date, channel, price)",
+    "CREATE INDEX IF NOT EXISTS idx_buy_fact_date_age ON buy_fact(date, age_group, price)",
+    "CREATE INDEX IF NOT EXISTS idx_buy_fact_user_date ON buy_fact(user_id, date)",
+    "CREATE INDEX IF NOT EXISTS idx_funnel_date_flags ON user_funnel_mart(date, has_pv, has_cart, has_buy)",
+    "CREATE INDEX IF NOT EXISTS idx_cohort_date_diff ON cohort_matrix(cohort_date, day_diff)",
+    "CREATE INDEX IF NOT EXISTS idx_user_rfm_user ON user_rfm(user_id, rfm_label)",
+    # 已被上述复合索引前缀覆盖的旧单列索引
+    "DROP INDEX IF EXISTS idx_buy_fact_date",
+    "DROP INDEX IF EXISTS idx_buy_fact_user",
+    "DROP INDEX IF EXISTS idx_funnel_date",
+    "DROP INDEX IF EXISTS idx_cohort_date",
+)
+
+# SQLite 按日预聚合表
+# 核心指标、趋势、品类/渠道/年龄段分布均可由日粒度汇总再聚合得到，看板查询不再扫描 buy_fact 行级数据。
+# order_id 由 (user_id, ts, item_id) 派生，同一订单只落在一天内，按日 COUNT(DISTINCT) 求和即区间订单数。
+# SQLite 连接池首次创建时（含从 ClickHouse 降级）幂等建表，重算已汇总的最后一天并补齐其后的日期。
+# 更早日期的改写不会被检测到：buy_fact 仅由 ETL 整表写入，ETL 在同一事务内整表重建汇总表，
+# 建池时的补齐只用于 buy_fact 之后追加了新日期、或汇总表由旧版本创建的情况。
+SQLITE_ROLLUP_TABLES = ("sales_daily", "sales_daily_category", "sales_daily_channel", "sales_daily_age_group")
+SQLITE_ROLLUP_STMTS = (
+    "CREATE TABLE IF NOT EXISTS sales_daily (date TEXT, total_sales REAL, total_orders INTEGER)",
+    "CREATE TABLE IF NOT EXISTS sales_daily_category (date TEXT, category_id INTEGER, sales REAL)",
+    "CREATE TABLE IF NOT EXISTS sales_daily_channel (date TEXT, channel TEXT, sales REAL)",
+    "CREATE TABLE IF NOT EXISTS sales_daily_age_group (date TEXT, age_group TEXT, sales REAL)",
+    "CREATE INDEX IF NOT EXISTS idx_sales_daily_date ON sales_daily(date, total_sales, total_orders)",
+    "CREATE INDEX IF NOT EXISTS idx_sales_daily_category_date ON sales_daily_category(date, category_id, sales)",
+    "CREATE INDEX IF NOT EXISTS idx_sales_daily_channel_date ON sales_daily_channel(date, channel, sales)",
+    "CREATE INDEX IF NOT EXISTS idx_sales_daily_age_group_date ON sales_daily_age_group(date, age_group, sales)",
+    # 已汇总的最后一天可能只导入了一部分：先删除，随后的 INSERT 以剩余最大日期为界将其重算
+    "DELETE FROM sales_daily WHERE date = (SELECT MAX(date) FROM sales_daily)",
+    "DELETE FROM sales_daily_category WHERE date = (SELECT MAX(date) FROM sales_daily_category)",
+    "DELETE FROM sales_daily_channel WHERE date = (SELECT MAX(date) FROM sales_daily_channel)",
+    "DELETE FROM sales_daily_age_group WHERE date = (SELECT MAX(date) FROM sales_daily_age_group)",
+    "INSERT INTO sales_daily SELECT date, SUM(price), COUNT(DISTINCT order_id) FROM buy_fact "
+    "WHERE date > COALESCE((SELECT MAX(date) FROM sales_daily), '') GROUP BY date",
+    "INSERT INTO sales_daily_category SELECT date, category_id, SUM(price) FROM buy_fact "
+    "WHERE date > COALESCE((SELECT MAX(date) FROM sales_daily_category), '') GROUP BY date, category_id",
+    "INSERT INTO sales_daily_channel SELECT date, channel, SUM(price) FROM buy_fact "
+    "WHERE date > COALESCE((SELECT MAX(date) FROM sales_daily_channel), '') GROUP BY date, channel",
+    "INSERT INTO sales_daily_age_group SELECT date, age_group, SUM(price) FROM buy_fact "
+    "WHERE date > COALESCE((SELECT MAX(date) FROM sales_daily_age_group), '') GROUP BY date, age_group",
+)
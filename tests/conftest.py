@@ -14,8 +14,8 @@ from main import app
 
 @pytest.fixture
 def sqlite_db():
-    """创建内存 SQLite 数据库并插入模拟数据"""
-    conn = sqlite3.connect(":memory:")
+    """创建内存 SQLite 数据库并插入模拟数据（允许跨线程使用，供并发聚合测试）"""
+    conn = sqlite3.connect(":memory:", check_same_thread=False)
     conn.row_factory = sqlite3.Row
     cursor = conn.cursor()
 
@@ -39,6 +39,10 @@ def sqlite_db():
         INSERT INTO user_rfm VALUES (1, '核心高价值客户');
         INSERT INTO user_rfm VALUES (2, '一般维持客户');
     """)
+    # 按日汇总表由上面的 buy_fact 构建（与应用启动时一致）
+    from core.config import SQLITE_ROLLUP_STMTS
+    for stmt in SQLITE_ROLLUP_STMTS:
+        cursor.execute(stmt)
     conn.commit()
     yield conn
     conn.close()
@@ -63,6 +67,7 @@ def sqlite_backend(sqlite_db):
             cursor.close()
 
     mock_manager.get_sqlite_cursor = mock_cursor
+    mock_manager.sqlite_rollups_ready = True
     return SqliteBackend(mock_manager)
 
 
@@ -70,3 +75,12 @@ def sqlite_backend(sqlite_db):
 def test_client():
     """创建 FastAPI TestClient（不启动真实服务器）"""
     return TestClient(app)
+
+
+@pytest.fixture(autouse=True)
+def clear_response_cache():
+    """每个用例前后清空进程内响应缓存，避免用例间相互污染"""
+    from core.cache import response_cache
+    response_cache.clear()
+    yield
+    response_cache.clear()
@@ -26,6 +26,7 @@ class TestAuthApi:
         """错误密码 → 401"""
         resp = test_client.post("/api/auth/login", json={"username": "admin", "password": "wrong"})
         assert resp.status_code == 401
+        assert resp.json() == {"code": 401, "message": "用户名或密码错误"}
 
     def test_login_missing_fields(self, test_client):
         """缺少字段 → 422 (Pydantic 校验失败)"""
@@ -53,6 +54,48 @@ class TestAuthMiddleware:
         )
         assert resp.status_code == 401
 
+    def test_non_bearer_scheme(self, test_client):
+        """非 Bearer 认证方式 → 401 且返回标准 JSON 错误体"""
+        resp = test_client.get(
+            "/api/dashboard/all",
+            headers={"Authorization": "Basic YWRtaW46MTIzNDU2"}
+        )
+        assert resp.status_code == 401
+        assert resp.headers["content-type"] == "application/json"
+        assert resp.json() == {"code": 401, "message": "缺失或无效的认证 Token"}
+
+    def test_options_preflight_passthrough(self, test_client):
+        """CORS 预检请求不校验 Token"""
+        resp = test_client.options(
+            "/api/dashboard/all",
+            headers={
+                "Origin": "http://localhost:5173",
+                "Access-Control-Request-Method": "GET",
+            }
+        )
+        assert resp.status_code != 401
+
+
+# ═══════════════════════════════════════
+#  响应压缩测试
+# ═══════════════════════════════════════
+
+class TestGzipCompression:
+    """GZipMiddleware 按阈值压缩"""
+
+    def test_large_response_gzipped(self, test_client):
+        """超过阈值的响应（OpenAPI 文档）按 Accept-Encoding 压缩"""
+        resp = test_client.get("/openapi.json", headers={"Accept-Encoding": "gzip"})
+        assert resp.status_code == 200
+        assert resp.headers["content-encoding"] == "gzip"
+        assert "paths" in resp.json()
+
+    def test_unauthorized_not_gzipped(self, test_client):
+        """JWT 拦截的 401 不经过压缩"""
+        resp = test_client.get("/api/dashboard/all", headers={"Accept-Encoding": "gzip"})
+        assert resp.status_code == 401
+        assert "content-encoding" not in resp.headers
+
 
 # ═══════════════════════════════════════
 #  看板聚合端点测试
@@ -95,6 +138,17 @@ class TestDashboardApi:
         )
         assert resp.status_code == 400
 
+    @pytest.mark.parametrize("path", ["/api/dashboard/all", "/api/charts/trend"])
+    @pytest.mark.parametrize("target_pixels", [0, -5, 4097, 10 ** 9])
+    def test_target_pixels_out_of_range(self, test_client, path, target_pixels):
+        """target_pixels 越界 → 422，不进入接口缓存"""
+        token = self._get_token(test_client)
+        resp = test_client.get(
+            f"{path}?target_pixels={target_pixels}",
+            headers={"Authorization": f"Bearer {token}"}
+        )
+        assert resp.status_code == 422
+
     def test_date_range_config_api(self, test_client):
         """GET /api/config/date_range → 200 + min/max"""
         token = self._get_token(test_client)
@@ -106,3 +160,43 @@ class TestDashboardApi:
         data = resp.json()["data"]
         assert "min" in data
         assert "max" in data
+
+
+# ═══════════════════════════════════════
+#  日期范围 ETag 协商缓存测试
+# ═══════════════════════════════════════
+
+class TestDateRangeETag:
+    """GET /api/config/date_range 的 ETag / 304 行为"""
+
+    @pytest.fixture
+    def auth_headers(self, test_client, monkeypatch):
+        import api.routers.dashboard as dashboard_router
+        monkeypatch.setattr(dashboard_router.db_manager, "get_backend", lambda: None)
+        monkeypatch.setattr(dashboard_router, "fetch_date_range",
+                            lambda backend: ("2017-11-01", "2017-12-10"))
+        resp = test_client.post("/api/auth/login", json={"username": "admin", "password": "123456"})
+        return {"Authorization": f"Bearer {resp.json()['data']['token']}"}
+
+    def test_etag_header_present(self, test_client, auth_headers):
+        resp = test_client.get("/api/config/date_range", headers=auth_headers)
+        assert resp.status_code == 200
+        assert resp.json()["data"] == {"min": "2017-11-01", "max": "2017-12-10"}
+        assert resp.headers["ETag"].startswith('"')
+        assert "max-age" in resp.headers["Cache-Control"]
+
+    def test_if_none_match_returns_304(self, test_client, auth_headers):
+        etag = test_client.get("/api/config/date_range", headers=auth_headers).headers["ETag"]
+        resp = test_client.get(
+            "/api/config/date_range",
+            headers={**auth_headers, "If-None-Match": etag}
+        )
+        assert resp.status_code == 304
+        assert resp.content == b""
+
+    def test_stale_etag_returns_200(self, test_client, auth_headers):
+        resp = test_client.get(
+            "/api/config/date_range",
+            headers={**auth_headers, "If-None-Match": '"stale"'}
+        )
+        assert resp.status_code == 200
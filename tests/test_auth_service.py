@@ -6,7 +6,9 @@
 import jwt as pyjwt
 
 from services.auth_service import authenticate_user
-from core.security import create_jwt_token, decode_jwt_token, is_jwt_whitelisted
+from core.security import (
+    create_jwt_token, decode_jwt_token, is_jwt_whitelisted, hash_password, verify_password
+)
 from core.config import JWT_SECRET, JWT_ALGORITHM
 
 
@@ -41,6 +43,45 @@ class TestAuthenticateUser:
         result = authenticate_user("nobody", "123456")
         assert result is None
 
+    def test_verified_login_cached(self, monkeypatch):
+        """同一账密重复登录命中成功缓存，不再重复计算口令哈希；错误口令不缓存"""
+        import services.auth_service as auth_service
+        calls = []
+        real_verify = auth_service.verify_password
+
+        def counting_verify(password, password_hash):
+            calls.append(password)
+            return real_verify(password, password_hash)
+
+        monkeypatch.setattr(auth_service, "_verified_cache", auth_service.TTLCache(maxsize=8, ttl=60.0))
+        monkeypatch.setattr(auth_service, "verify_password", counting_verify)
+        assert authenticate_user("admin", "123456") is not None
+        assert authenticate_user("admin", "123456") is not None
+        assert authenticate_user("admin", "bad") is None
+        assert authenticate_user("admin", "bad") is None
+        assert calls == ["123456", "bad", "bad"]
+
+
+# ═══════════════════════════════════════
+#  口令哈希测试
+# ═══════════════════════════════════════
+
+class TestPasswordHash:
+    """scrypt 口令哈希与校验"""
+
+    def test_hash_and_verify(self):
+        """同一口令每次加盐不同，均可校验通过；错误口令校验失败"""
+        h1, h2 = hash_password("secret"), hash_password("secret")
+        assert h1 != h2 and h1.startswith("scrypt$")
+        assert verify_password("secret", h1) and verify_password("secret", h2)
+        assert not verify_password("wrong", h1)
+
+    def test_malformed_hash_rejected(self):
+        """非法哈希格式返回 False 而非抛异常"""
+        assert verify_password("123456", "123456") is False
+        assert verify_password("123456", "scrypt$16384$8$1$zz$zz") is False
+        assert verify_password("123456", "md5$1$1$1$00$00") is False
+
 
 # ═══════════════════════════════════════
 #  JWT 工具函数测试
@@ -57,6 +98,24 @@ class TestJwtSecurity:
         assert payload["role"] == "admin"
         assert "exp" in payload
 
+    def test_fast_path_matches_pyjwt(self):
+        """HS256 快速签发的 Token 可被 PyJWT 校验，exp 按分钟取整"""
+        token = create_jwt_token("viewer", "viewer")
+        payload = pyjwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGORITHM])
+        assert payload["sub"] == "viewer" and payload["role"] == "viewer"
+        assert payload["exp"] % 60 == 0
+        assert pyjwt.get_unverified_header(token) == {"alg": "HS256", "typ": "JWT"}
+
+    def test_same_minute_reuses_token(self, monkeypatch):
+        """同一分钟内重复签发返回同一 Token，跨分钟则重新签发"""
+        import time
+        monkeypatch.setattr(time, "time", lambda: 1_800_000_000.0)
+        first = create_jwt_token("admin", "admin")
+        monkeypatch.setattr(time, "time", lambda: 1_800_000_030.0)
+        assert create_jwt_token("admin", "admin") == first
+        monkeypatch.setattr(time, "time", lambda: 1_800_000_061.0)
+        assert create_jwt_token("admin", "admin") != first
+
     def test_invalid_token_raises(self):
         """伪造的 Token 解码应抛出异常"""
         import pytest
@@ -74,6 +133,27 @@ class TestJwtSecurity:
         with pytest.raises(pyjwt.InvalidSignatureError):
             decode_jwt_token(bad_token)
 
+    def test_expired_token_raises(self):
+        """过期 Token 解码应抛出 ExpiredSignatureError"""
+        import pytest
+        expired = pyjwt.encode(
+            {"sub": "admin", "role": "admin", "exp": 1},
+            JWT_SECRET,
+            algorithm=JWT_ALGORITHM
+        )
+        with pytest.raises(pyjwt.ExpiredSignatureError):
+            decode_jwt_token(expired)
+
+    def test_cached_token_still_checks_exp(self, monkeypatch):
+        """解码结果命中缓存后，exp 仍按当前时间重新校验"""
+        import time
+        import pytest
+        token = create_jwt_token("viewer", "viewer")
+        payload = decode_jwt_token(token)
+        monkeypatch.setattr(time, "time", lambda: payload["exp"] + 1)
+        with pytest.raises(pyjwt.ExpiredSignatureError):
+            decode_jwt_token(token)
+
 
 # ═══════════════════════════════════════
 #  JWT 白名单路径测试
@@ -98,3 +178,15 @@ class TestJwtWhitelist:
     def test_random_path_not_whitelisted(self):
         """随机路径不在白名单中"""
         assert is_jwt_whitelisted("/random/path") is False
+
+    def test_frontend_static_whitelisted(self):
+        """前端首页与静态资源在白名单中"""
+        assert is_jwt_whitelisted("/") is True
+        assert is_jwt_whitelisted("/openapi.json") is True
+        assert is_jwt_whitelisted("/assets/index-abc123.js") is True
+        assert is_jwt_whitelisted("/favicon.ico") is True
+
+    def test_whitelist_requires_full_match(self):
+        """白名单为整串匹配，前缀相同的路径不会被放行"""
+        assert is_jwt_whitelisted("/api/auth/login/extra") is False
+        assert is_jwt_whitelisted("/openapi.jsonx") is False
@@ -54,18 +54,38 @@ class TestSqliteBackendTrend:
 # ═══════════════════════════════════════
 
 class TestSqliteBackendComparison:
-    """fetch_comparison_sales 测试"""
-
-    def test_normal_range(self, sqlite_backend):
-        """正常范围 → 返回销售额"""
-        result = sqlite_backend.fetch_comparison_sales("2017-11-15", "2017-11-16")
-        assert result is not None
-        assert abs(result - 348.9) < 0.01
-
-    def test_no_data(self, sqlite_backend):
-        """无数据 → 返回 None"""
-        result = sqlite_backend.fetch_comparison_sales("2099-01-01", "2099-12-31")
-        assert result is None
+    """fetch_core_with_comparison 测试"""
+
+    def test_core_with_comparison_matches_separate_queries(self, sqlite_backend):
+        """合并查询 → 当期与 fetch_core_metrics 一致，对比周期取各自区间销售额"""
+        result = sqlite_backend.fetch_core_with_comparison(
+            "2017-11-16", "2017-11-16",
+            "2017-11-15", "2017-11-15",
+            "2016-11-16", "2016-11-16",
+        )
+        core = sqlite_backend.fetch_core_metrics("2017-11-16", "2017-11-16")
+        assert result["total_sales"] == core["total_sales"]
+        assert result["total_orders"] == core["total_orders"]
+        assert result["prev_sales"] == sqlite_backend.fetch_core_metrics("2017-11-15", "2017-11-15")["total_sales"]
+        assert result["ly_sales"] is None
+
+    def test_core_with_comparison_no_data(self, sqlite_backend):
+        """无数据 → 当期为 0，对比周期销售额为 None"""
+        result = sqlite_backend.fetch_core_with_comparison(
+            "2099-01-01", "2099-12-31", "2098-01-01", "2098-12-31", "2097-01-01", "2097-12-31",
+        )
+        assert result == {"total_sales": 0.0, "total_orders": 0, "prev_sales": None, "ly_sales": None}
+
+    def test_core_with_comparison_overlapping_ranges(self, sqlite_backend):
+        """对比区间与当期重叠时同一行分别计入各列"""
+        result = sqlite_backend.fetch_core_with_comparison(
+            "2017-11-15", "2017-11-16",
+            "2017-11-15", "2017-11-16",
+            "2099-01-01", "2099-01-01",
+        )
+        assert abs(result["total_sales"] - 348.9) < 0.01
+        assert abs(result["prev_sales"] - 348.9) < 0.01
+        assert result["total_orders"] == 3
 
 
 # ═══════════════════════════════════════
@@ -85,7 +105,7 @@ class TestSqliteBackendTop10:
         """按销售额降序"""
         result = sqlite_backend.fetch_top10("2017-11-15", "2017-11-16")
         if len(result) > 1:
-            assert result[0]["sales"] >= result[1]["sales"]
+            assert result[0][1] >= result[1][1]
 
 
 # ═══════════════════════════════════════
@@ -98,17 +118,31 @@ class TestSqliteBackendDimensions:
     def test_category_returns_list(self, sqlite_backend):
         result = sqlite_backend.fetch_category("2017-11-15", "2017-11-16")
         assert isinstance(result, list)
-        assert all("category_id" in r for r in result)
+        assert all(len(r) == 2 for r in result)
+        assert {r[0] for r in result} == {10, 20}
 
     def test_channel_returns_list(self, sqlite_backend):
         result = sqlite_backend.fetch_channel("2017-11-15", "2017-11-16")
         assert isinstance(result, list)
-        assert all("channel" in r for r in result)
+        assert {r[0] for r in result} == {"App Store", "官网", "小程序"}
 
     def test_age_group_returns_list(self, sqlite_backend):
         result = sqlite_backend.fetch_age_group("2017-11-15", "2017-11-16")
         assert isinstance(result, list)
-        assert all("age_group" in r for r in result)
+        assert {r[0] for r in result} == {"25-34", "18-24", "35-45"}
+
+    def test_dimensions_bundle_matches_single_queries(self, sqlite_backend):
+        """合并查询结果与三个独立查询一致"""
+        sd, ed = "2017-11-15", "2017-11-16"
+        result = sqlite_backend.fetch_dimensions(sd, ed)
+        assert set(result.keys()) == {"category", "channel", "age_group"}
+        assert result["category"] == sqlite_backend.fetch_category(sd, ed)
+        assert result["channel"] == sqlite_backend.fetch_channel(sd, ed)
+        assert result["age_group"] == sqlite_backend.fetch_age_group(sd, ed)
+
+    def test_dimensions_bundle_no_data(self, sqlite_backend):
+        result = sqlite_backend.fetch_dimensions("2099-01-01", "2099-12-31")
+        assert result == {"category": [], "channel": [], "age_group": []}
 
 
 # ═══════════════════════════════════════
@@ -157,7 +191,7 @@ class TestSqliteBackendRfm:
     def test_returns_labels(self, sqlite_backend):
         result = sqlite_backend.fetch_rfm("2017-11-15", "2017-11-16")
         assert isinstance(result, list)
-        labels = [r["rfm_label"] for r in result]
+        labels = [label for label, _ in result]
         assert "核心高价值客户" in labels
 
 
@@ -172,6 +206,195 @@ class TestSqliteBackendCohort:
         result = sqlite_backend.fetch_cohort("2017-11-15", "2017-11-16")
         assert isinstance(result, list)
         assert len(result) == 2
-        assert result[0]["day_diff"] == 0
-        assert result[1]["day_diff"] == 1
-        assert result[1]["active_users"] == 72
+        # (cohort_date, day_diff, active_users, cohort_users)
+        assert result[0][1] == 0
+        assert result[1][1] == 1
+        assert result[1][2] == 72
+
+
+# ═══════════════════════════════════════
+#  看板覆盖索引
+# ═══════════════════════════════════════
+
+class TestSqliteIndexes:
+    """SQLITE_INDEX_STMTS 覆盖索引命中测试"""
+
+    @pytest.fixture
+    def indexed_db(self, sqlite_db):
+        from core.config import SQLITE_INDEX_STMTS
+        for stmt in SQLITE_INDEX_STMTS:
+            sqlite_db.execute(stmt)
+        sqlite_db.execute("ANALYZE")
+        return sqlite_db
+
+    def _plan(self, db, sql):
+        return " ".join(row[3] for row in db.execute("EXPLAIN QUERY PLAN " + sql, ("2017-11-15", "2017-11-16")))
+
+    @pytest.mark.parametrize("column, index", [
+        ("channel", "idx_buy_fact_date_channel"),
+        ("category_id", "idx_buy_fact_date_category"),
+        ("age_group", "idx_buy_fact_date_age"),
+        ("item_id", "idx_buy_fact_date_item"),
+    ])
+    def test_dimension_query_uses_covering_index(self, indexed_db, column, index):
+        plan = self._plan(
+            indexed_db,
+            f"SELECT {column}, SUM(price) FROM buy_fact WHERE date BETWEEN ? AND ? GROUP BY {column}"
+        )
+        assert f"COVERING INDEX {index}" in plan
+
+    def test_core_query_uses_covering_index(self, indexed_db):
+        plan = self._plan(
+            indexed_db,
+            "SELECT SUM(price), COUNT(DISTINCT order_id) FROM buy_fact WHERE date BETWEEN ? AND ?"
+        )
+        assert "COVERING INDEX idx_buy_fact_date_sales" in plan
+
+
+# ═══════════════════════════════════════
+#  按日汇总表
+# ═══════════════════════════════════════
+
+class TestSqliteRollups:
+    """SQLITE_ROLLUP_STMTS 建表与增量补齐测试"""
+
+    def _rerun(self, db):
+        from core.config import SQLITE_ROLLUP_STMTS
+        for stmt in SQLITE_ROLLUP_STMTS:
+            db.execute(stmt)
+
+    def test_rollup_matches_fact(self, sqlite_db):
+        """汇总表按日合计与 buy_fact 明细一致"""
+        rollup = sqlite_db.execute(
+            "SELECT date, total_sales, total_orders FROM sales_daily ORDER BY date"
+        ).fetchall()
+        fact = sqlite_db.execute(
+            "SELECT date, SUM(price), COUNT(DISTINCT order_id) FROM buy_fact GROUP BY date ORDER BY date"
+        ).fetchall()
+        assert [tuple(r) for r in rollup] == [tuple(r) for r in fact]
+
+    def test_rerun_is_idempotent(self, sqlite_db):
+        """重复执行不产生重复汇总行"""
+        self._rerun(sqlite_db)
+        assert sqlite_db.execute("SELECT COUNT(*) FROM sales_daily").fetchone()[0] == 2
+        assert sqlite_db.execute("SELECT COUNT(*) FROM sales_daily_channel").fetchone()[0] == 3
+
+    def test_partial_last_day_recomputed(self, sqlite_backend, sqlite_db):
+        """已汇总的最后一天追加数据后重跑 → 该日按 buy_fact 重算，不产生重复行"""
+        sqlite_db.execute(
+            "INSERT INTO buy_fact VALUES (4, 104, 20, 10.0, '2017-11-16', '小程序', '35-45', 'ORD004')"
+        )
+        self._rerun(sqlite_db)
+        rows = sqlite_db.execute(
+            "SELECT total_sales, total_orders FROM sales_daily WHERE date = '2017-11-16'"
+        ).fetchall()
+        assert [tuple(r) for r in rows] == [(60.0, 2)]
+        assert dict(sqlite_backend.fetch_channel("2017-11-16", "2017-11-16")) == {"小程序": 60.0}
+        # 更早的日期不受影响
+        assert sqlite_backend.fetch_core_metrics("2017-11-15", "2017-11-15")["total_orders"] == 2
+
+    def test_new_dates_backfilled(self, sqlite_backend, sqlite_db):
+        """buy_fact 追加新日期后重跑 → 仅补齐新日期，查询结果随之更新"""
+        sqlite_db.execute(
+            "INSERT INTO buy_fact VALUES (4, 104, 20, 10.0, '2017-11-17', '官网', '18-24', 'ORD004')"
+        )
+        self._rerun(sqlite_db)
+        result = sqlite_backend.fetch_core_metrics("2017-11-15", "2017-11-17")
+        assert abs(result["total_sales"] - 358.9) < 0.01
+        assert result["total_orders"] == 4
+        assert dict(sqlite_backend.fetch_channel("2017-11-17", "2017-11-17")) == {"官网": 10.0}
+
+
+class TestSqliteSchemaShared:
+    """后端与 ETL 写入使用同一份 sqlite_schema 语句"""
+
+    NAMES = ("SQLITE_INDEX_STMTS", "SQLITE_ROLLUP_TABLES", "SQLITE_ROLLUP_STMTS")
+
+    def test_backend_uses_shared_statements(self):
+        import sqlite_schema
+        import core.config
+        import db.manager
+        for name in self.NAMES:
+            assert getattr(core.config, name) is getattr(sqlite_schema, name)
+        assert db.manager.SQLITE_ROLLUP_STMTS is sqlite_schema.SQLITE_ROLLUP_STMTS
+        assert db.manager.SQLITE_ROLLUP_TABLES is sqlite_schema.SQLITE_ROLLUP_TABLES
+
+    def test_writer_uses_shared_statements(self):
+        pytest.importorskip("pyarrow")
+        pytest.importorskip("clickhouse_connect")
+        import sqlite_schema
+        import etl.data_writer
+        for name in self.NAMES:
+            assert getattr(etl.data_writer, name) is getattr(sqlite_schema, name)
+
+    def test_writer_does_not_redefine_statements(self):
+        """不依赖 ETL 第三方包：按源码确认 data_writer 从 sqlite_schema 导入、未另行定义"""
+        import ast
+        import pathlib
+        source = pathlib.Path(__file__).resolve().parents[1] / "etl" / "data_writer.py"
+        tree = ast.parse(source.read_text(encoding="utf-8"))
+        imported = {
+            alias.name
+            for node in tree.body
+            if isinstance(node, ast.ImportFrom) and node.module == "sqlite_schema"
+            for alias in node.names
+        }
+        assigned = {
+            target.id
+            for node in ast.walk(tree)
+            if isinstance(node, ast.Assign)
+            for target in node.targets
+            if isinstance(target, ast.Name)
+        }
+        assert set(self.NAMES) <= imported
+        assert not set(self.NAMES) & assigned
+
+
+class TestSqliteBackendWithoutRollups:
+    """汇总表不存在（sqlite_rollups_ready=False）时回退到 buy_fact 明细聚合"""
+
+    @staticmethod
+    def _backend(db, rollups_ready):
+        from contextlib import contextmanager
+        from unittest.mock import MagicMock
+        from dao.backend import SqliteBackend
+
+        manager = MagicMock()
+
+        @contextmanager
+        def cursor():
+            cur = db.cursor()
+            try:
+                yield cur
+            finally:
+                cur.close()
+
+        manager.get_sqlite_cursor = cursor
+        manager.sqlite_rollups_ready = rollups_ready
+        return SqliteBackend(manager)
+
+    def _collect(self, backend):
+        period_cfg = {"sqlite": "%Y-%m-%d", "ch": "%Y-%m-%d", "label": "日"}
+        return (
+            backend.fetch_core_metrics("2017-11-15", "2017-11-16"),
+            backend.fetch_trend("2017-11-15", "2017-11-16", period_cfg),
+            backend.fetch_core_with_comparison(
+                "2017-11-16", "2017-11-16", "2017-11-15", "2017-11-15", "2016-11-16", "2016-11-16",
+            ),
+            backend.fetch_category("2017-11-15", "2017-11-16"),
+            backend.fetch_channel("2017-11-15", "2017-11-16"),
+            backend.fetch_age_group("2017-11-15", "2017-11-16"),
+            backend.fetch_dimensions("2017-11-15", "2017-11-16"),
+        )
+
+    def test_fact_fallback_matches_rollups(self, sqlite_db):
+        """仅有 buy_fact、无汇总表的库 → 各查询正常返回，且与汇总表结果一致"""
+        from core.config import SQLITE_ROLLUP_TABLES
+        expected = self._collect(self._backend(sqlite_db, True))
+        for table in SQLITE_ROLLUP_TABLES:
+            sqlite_db.execute(f"DROP TABLE {table}")
+
+        result = self._collect(self._backend(sqlite_db, False))
+        assert result == expected
+        assert abs(result[0]["total_sales"] - 348.9) < 0.01
+        assert result[0]["total_orders"] == 3
@@ -0,0 +1,112 @@
+"""
+进程内 TTL 缓存单元测试
+覆盖 TTLCache 过期/淘汰逻辑和 ttl_cache_by_args 路由装饰器。
+"""
+
+import orjson
+
+from core.cache import TTLCache, ttl_cache_by_args, response_cache
+
+
+# ═══════════════════════════════════════
+#  TTLCache 测试
+# ═══════════════════════════════════════
+
+class TestTTLCache:
+    """TTLCache 基础行为"""
+
+    def test_set_and_get(self):
+        cache = TTLCache(maxsize=4, ttl=60)
+        cache.set("k", b"v")
+        assert cache.get("k") == b"v"
+
+    def test_miss_returns_none(self):
+        cache = TTLCache(maxsize=4, ttl=60)
+        assert cache.get("missing") is None
+
+    def test_expired_entry_evicted(self, monkeypatch):
+        """超过 TTL 的条目视为未命中并被删除"""
+        import core.cache as cache_module
+        now = [1000.0]
+        monkeypatch.setattr(cache_module.time, "monotonic", lambda: now[0])
+        cache = TTLCache(maxsize=4, ttl=10)
+        cache.set("k", b"v")
+        now[0] += 11
+        assert cache.get("k") is None
+        assert len(cache) == 0
+
+    def test_lru_eviction_on_maxsize(self):
+        """超出容量时淘汰最久未使用的条目"""
+        cache = TTLCache(maxsize=2, ttl=60)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")          # a 变为最近使用
+        cache.set("c", 3)       # 淘汰 b
+        assert cache.get("a") == 1
+        assert cache.get("b") is None
+        assert cache.get("c") == 3
+
+    def test_clear(self):
+        cache = TTLCache(maxsize=4, ttl=60)
+        cache.set("k", 1)
+        cache.clear()
+        assert cache.get("k") is None
+
+
+# ═══════════════════════════════════════
+#  路由装饰器测试
+# ═══════════════════════════════════════
+
+class TestTtlCacheByArgs:
+    """ttl_cache_by_args 装饰器"""
+
+    def test_same_args_hit_cache(self):
+        """相同参数第二次调用不再执行函数体"""
+        calls = []
+
+        @ttl_cache_by_args
+        def endpoint(start_date=None, end_date=None, period="day"):
+            calls.append(1)
+            return {"code": 200, "data": {"sd": start_date}}
+
+        r1 = endpoint(start_date="2017-11-01", end_date="2017-11-30", period="day")
+        r2 = endpoint(start_date="2017-11-01", end_date="2017-11-30", period="day")
+        assert len(calls) == 1
+        assert r1.body == r2.body
+        assert orjson.loads(r2.body) == {"code": 200, "data": {"sd": "2017-11-01"}}
+
+    def test_different_args_miss(self):
+        """不同参数分别缓存"""
+        calls = []
+
+        @ttl_cache_by_args
+        def endpoint(start_date=None, end_date=None):
+            calls.append(1)
+            return {"sd": start_date}
+
+        endpoint(start_date="2017-11-01", end_date="2017-11-30")
+        endpoint(start_date="2017-11-02", end_date="2017-11-30")
+        assert len(calls) == 2
+
+    def test_exception_not_cached(self):
+        """函数抛出异常时不写入缓存"""
+        import pytest
+
+        @ttl_cache_by_args
+        def endpoint(period="day"):
+            raise ValueError("bad")
+
+        with pytest.raises(ValueError):
+            endpoint(period="x")
+        assert len(response_cache) == 0
+
+    def test_prebuilt_response_body_cached(self):
+        """路由直接返回 Response 时缓存其 body，不再二次编码"""
+        from api.responses import ok_response
+
+        @ttl_cache_by_args
+        def endpoint(start_date=None):
+            return ok_response([[0, "2017-11-15", 100.0]])
+
+        resp = endpoint(start_date="2017-11-15")
+        assert orjson.loads(resp.body) == {"code": 200, "message": "ok", "data": [[0, "2017-11-15", 100.0]]}
@@ -1,9 +1,9 @@
 """
 DAO 工具函数单元测试
-覆盖 safe_float / safe_int 的各种边界情况。
+覆盖 safe_float / safe_int / fast_float / fast_int 的各种边界情况。
 """
 
-from dao.base import safe_float, safe_int
+from dao.base import safe_float, safe_int, fast_float, fast_int
 
 
 # ═══════════════════════════════════════
@@ -73,3 +73,34 @@ class TestSafeInt:
     def test_custom_default(self):
         """自定义默认兜底值"""
         assert safe_int(None, default=-1) == -1
+
+
+# ═══════════════════════════════════════
+#  fast_float / fast_int 测试
+# ═══════════════════════════════════════
+
+class TestFastConverters:
+    """聚合列快速转换函数测试集"""
+
+    def test_float_passthrough(self):
+        assert fast_float(3.14) == 3.14
+
+    def test_float_from_int_and_decimal(self):
+        from decimal import Decimal
+        assert fast_float(42) == 42.0
+        assert fast_float(Decimal("99.90")) == 99.9
+
+    def test_float_none_is_zero(self):
+        assert fast_float(None) == 0.0
+
+    def test_int_passthrough(self):
+        assert fast_int(7) == 7
+
+    def test_int_none_is_zero(self):
+        assert fast_int(None) == 0
+
+    def test_int_from_numpy_like(self):
+        """ClickHouse 可能返回 numpy / 无符号整型，统一转为 int"""
+        import numpy as np
+        assert fast_int(np.uint64(5)) == 5
+        assert type(fast_int(np.uint64(5))) is int
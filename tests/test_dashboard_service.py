@@ -7,7 +7,8 @@ from unittest.mock import patch, MagicMock
 import datetime
 
 from services.dashboard_service import (
-    calculate_qoq_yoy,
+    comparison_periods,
+    growth_rates,
     format_trend,
     format_funnel,
     format_rankings,
@@ -17,6 +18,42 @@ from services.dashboard_service import (
 )
 
 
+# ═══════════════════════════════════════
+#  日期参数解析测试
+# ═══════════════════════════════════════
+
+class TestResolveDates:
+    """resolve_dates 日期校验"""
+
+    @patch("services.dashboard_service.fetch_date_range", return_value=("2017-11-01", "2017-12-10"))
+    def test_valid_dates_passthrough(self, _):
+        from services.dashboard_service import resolve_dates
+        assert resolve_dates("2017-11-15", "2017-11-16", None) == ("2017-11-15", "2017-11-16")
+
+    @patch("services.dashboard_service.fetch_date_range", return_value=("2017-11-01", "2017-12-10"))
+    def test_default_range_from_max_date(self, _):
+        from services.dashboard_service import resolve_dates
+        assert resolve_dates(None, None, None) == ("2017-11-10", "2017-12-10")
+
+    @patch("services.dashboard_service.fetch_date_range")
+    def test_client_dates_skip_date_range_lookup(self, mock_range):
+        """客户端已传入起止日期时不查询数据库日期范围"""
+        from services.dashboard_service import resolve_dates
+        resolve_dates("2017-11-15", "2017-11-16", None)
+        mock_range.assert_not_called()
+
+    @patch("services.dashboard_service.fetch_date_range", return_value=("2017-11-01", "2017-12-10"))
+    def test_invalid_formats_rejected(self, _):
+        """非 YYYY-MM-DD 写法与不存在的日期 → 400"""
+        import pytest
+        from fastapi import HTTPException
+        from services.dashboard_service import resolve_dates
+        for bad in ("20171115", "2017-W46-3", "2017-13-45", "2017/11/15", "2017-11-1"):
+            with pytest.raises(HTTPException) as exc_info:
+                resolve_dates(bad, "2017-11-16", None)
+            assert exc_info.value.status_code == 400
+
+
 # ═══════════════════════════════════════
 #  环比/同比核心算法测试
 # ═══════════════════════════════════════
@@ -25,71 +62,72 @@ class TestCalculateQoqYoy:
     """环比/同比增长率计算逻辑"""
 
     # 固定的测试日期区间
-    CURR_START = datetime.datetime(2017, 11, 10)
-    CURR_END = datetime.datetime(2017, 11, 20)
-
-    def _make_backend(self, side_effect):
-        """构建 mock backend，控制 fetch_comparison_sales 返回值"""
-        backend = MagicMock()
-        backend.fetch_comparison_sales = MagicMock(side_effect=side_effect)
-        return backend
+    CURR_START = datetime.date(2017, 11, 10)
+    CURR_END = datetime.date(2017, 11, 20)
 
     def test_normal_growth(self):
         """正常增长场景：上期 1000 → 本期 1500 = +50%"""
-        backend = self._make_backend([1000.0, 800.0])
-        result = calculate_qoq_yoy(1500.0, "day", self.CURR_START, self.CURR_END, backend)
+        result = growth_rates(1500.0, 1000.0, 800.0)
         assert result["qoq_rate"] == 50.0
         assert result["yoy_rate"] is not None
 
     def test_negative_growth(self):
         """负增长场景：上期 2000 → 本期 1000 = -50%"""
-        backend = self._make_backend([2000.0, 2000.0])
-        result = calculate_qoq_yoy(1000.0, "day", self.CURR_START, self.CURR_END, backend)
+        result = growth_rates(1000.0, 2000.0, 2000.0)
         assert result["qoq_rate"] == -50.0
 
     def test_no_baseline_returns_none(self):
         """无基线数据场景：上期为 None → 环比应为 None"""
-        backend = self._make_backend([None, None])
-        result = calculate_qoq_yoy(1500.0, "day", self.CURR_START, self.CURR_END, backend)
+        result = growth_rates(1500.0, None, None)
         assert result["qoq_rate"] is None
         assert result["yoy_rate"] is None
 
     def test_zero_baseline_returns_none(self):
         """基线为 0 场景：不能做除法，应返回 None"""
-        backend = self._make_backend([0, 0])
-        result = calculate_qoq_yoy(1500.0, "day", self.CURR_START, self.CURR_END, backend)
+        result = growth_rates(1500.0, 0, 0)
         assert result["qoq_rate"] is None
         assert result["yoy_rate"] is None
 
     def test_qoq_has_value_but_yoy_is_none(self):
         """混合场景：环比有数据，同比无数据"""
-        backend = self._make_backend([1000.0, None])
-        result = calculate_qoq_yoy(1500.0, "day", self.CURR_START, self.CURR_END, backend)
+        result = growth_rates(1500.0, 1000.0, None)
         assert result["qoq_rate"] == 50.0
         assert result["yoy_rate"] is None
 
     def test_week_period_offset(self):
         """周期为 week 时，环比偏移 7 天"""
-        backend = self._make_backend([1000.0, 800.0])
-        result = calculate_qoq_yoy(1500.0, "week", self.CURR_START, self.CURR_END, backend)
-        # 验证 fetch_comparison_sales 的第一次调用参数（环比）
-        call_args = backend.fetch_comparison_sales.call_args_list[0]
-        prev_start = call_args[0][0]
-        prev_end = call_args[0][1]
+        prev_start, prev_end, _, _ = comparison_periods("week", self.CURR_START, self.CURR_END)
         assert prev_start == "2017-11-03"  # 11-10 减 7 天
         assert prev_end == "2017-11-13"    # 11-20 减 7 天
-        assert result["qoq_rate"] == 50.0
 
     def test_month_period_offset(self):
         """周期为 month 时，环比偏移 1 个月"""
-        backend = self._make_backend([1000.0, 800.0])
-        result = calculate_qoq_yoy(1500.0, "month", self.CURR_START, self.CURR_END, backend)
-        call_args = backend.fetch_comparison_sales.call_args_list[0]
-        prev_start = call_args[0][0]
-        prev_end = call_args[0][1]
+        prev_start, prev_end, _, _ = comparison_periods("month", self.CURR_START, self.CURR_END)
         assert prev_start == "2017-10-10"  # 11-10 减 1 个月
         assert prev_end == "2017-10-20"    # 11-20 减 1 个月
+
+    def test_day_period_and_last_year(self):
+        """周期为 day 时，环比取紧邻的等长区间；同比回退一年"""
+        assert comparison_periods("day", self.CURR_START, self.CURR_END) == (
+            "2017-10-30", "2017-11-09", "2016-11-10", "2016-11-20",
+        )
+
+    def test_core_metrics_single_query(self):
+        """get_core_metrics_data 通过一次合并查询拿到增长率，不再单独查询对比周期"""
+        from services.dashboard_service import get_core_metrics_data
+        backend = MagicMock()
+        backend.fetch_core_with_comparison.return_value = {
+            "total_sales": 1500.0, "total_orders": 10, "prev_sales": 1000.0, "ly_sales": None,
+        }
+        backend.fetch_funnel.return_value = {"pv": 100, "cart": 20, "buy": 5}
+        result = get_core_metrics_data("2017-11-10", "2017-11-20", "day", backend)
+        backend.fetch_core_with_comparison.assert_called_once_with(
+            "2017-11-10", "2017-11-20", "2017-10-30", "2017-11-09", "2016-11-10", "2016-11-20",
+        )
         assert result["qoq_rate"] == 50.0
+        assert result["yoy_rate"] is None
+        assert result["avg_order_value"] == 150.0
+        assert result["paying_users"] == 5
 
 
 # ═══════════════════════════════════════
@@ -112,6 +150,30 @@ class TestFormatTrend:
         assert result["sales"] == []
         assert result["orders"] == []
 
+    def test_below_threshold_not_downsampled(self):
+        """点数不超过 4 × target_pixels → 原样返回"""
+        raw = {"dates": list(range(40)), "sales": list(range(40)), "orders": list(range(40))}
+        assert format_trend(raw, target_pixels=10) == raw
+
+    def test_m4_downsampling_keeps_extremes(self):
+        """M4 降采样：每桶保留首末点及两条序列的极值点，点数显著减少"""
+        n = 1000
+        sales = [float(i % 7) for i in range(n)]
+        sales[503] = 999.0
+        orders = [i % 5 for i in range(n)]
+        orders[250] = -1
+        raw = {"dates": [f"d{i}" for i in range(n)], "sales": sales, "orders": orders}
+
+        result = format_trend(raw, target_pixels=10)
+        assert len(result["dates"]) <= 10 * 6
+        assert result["dates"][0] == "d0" and result["dates"][-1] == f"d{n - 1}"
+        assert "d503" in result["dates"] and max(result["sales"]) == 999.0
+        assert "d250" in result["dates"] and min(result["orders"]) == -1
+        # 保持原始顺序且三列对齐
+        idx = [int(d[1:]) for d in result["dates"]]
+        assert idx == sorted(set(idx))
+        assert result["sales"] == [sales[i] for i in idx]
+
 
 class TestFormatFunnel:
     """漏斗数据格式化"""
@@ -136,8 +198,8 @@ class TestFormatRankings:
 
     def test_normal_rankings(self):
         rows = [
-            {"item_id": 101, "sales": 5000.0},
-            {"item_id": 102, "sales": 3000.555},
+            (101, 5000.0),
+            (102, 3000.555),
         ]
         result = format_rankings(rows)
         assert result["items"] == ["商品101", "商品102"]
@@ -153,9 +215,9 @@ class TestFormatDimensions:
     """维度分布数据格式化"""
 
     def test_normal_dimensions(self):
-        cat = [{"category_id": 10, "sales": 1000.0}]
-        chan = [{"channel": "App Store", "sales": 2000.0}]
-        age = [{"age_group": "25-34", "sales": 3000.0}]
+        cat = [(10, 1000.0)]
+        chan = [("App Store", 2000.0)]
+        age = [("25-34", 3000.0)]
         result = format_dimensions(cat, chan, age)
         assert result["category"][0]["name"] == "品类10"
         assert result["channel"][0]["name"] == "App Store"
@@ -172,7 +234,7 @@ class TestFormatRfm:
     """RFM 标签数据格式化"""
 
     def test_normal_rfm(self):
-        rows = [{"rfm_label": "核心高价值客户", "cnt": 50}]
+        rows = [("核心高价值客户", 50)]
         result = format_rfm(rows)
         assert result[0]["name"] == "核心高价值客户"
         assert result[0]["value"] == 50
@@ -183,8 +245,8 @@ class TestFormatRetention:
 
     def test_normal_retention(self):
         rows = [
-            {"day_diff": 0, "cohort_date": "2017-11-15", "cohort_users": 100, "active_users": 100},
-            {"day_diff": 1, "cohort_date": "2017-11-15", "cohort_users": 100, "active_users": 72},
+            ("2017-11-15", 0, 100, 100),
+            ("2017-11-15", 1, 72, 100),
         ]
         result = format_retention(rows)
         assert result[0] == [0, "2017-11-15", 100.0]
@@ -192,6 +254,32 @@ class TestFormatRetention:
 
     def test_zero_cohort_users(self):
         """分母为 0 时不应崩溃（除以 max(0,1) 保护）"""
-        rows = [{"day_diff": 0, "cohort_date": "2017-11-15", "cohort_users": 0, "active_users": 0}]
+        rows = [("2017-11-15", 0, 0, 0)]
         result = format_retention(rows)
         assert result[0][2] == 0.0  # 0/1 = 0.0，不会除零
+
+
+# ═══════════════════════════════════════
+#  看板聚合并发组装测试
+# ═══════════════════════════════════════
+
+class TestGetDashboardAllData:
+    """get_dashboard_all_data 并发聚合结果"""
+
+    def test_aggregates_all_sections(self, sqlite_backend):
+        """基于内存 SQLite 组装完整看板数据"""
+        import asyncio
+        from services.dashboard_service import get_dashboard_all_data
+
+        with patch("services.dashboard_service.fetch_date_range",
+                   return_value=("2017-11-15", "2017-11-16")):
+            data = asyncio.run(
+                get_dashboard_all_data("2017-11-15", "2017-11-16", "day", sqlite_backend)
+            )
+
+        assert data["date_range"] == {"min": "2017-11-15", "max": "2017-11-16"}
+        assert data["core"]["total_orders"] == 3
+        assert data["core"]["paying_users"] == 20
+        assert data["trend"]["dates"] == ["2017-11-15", "2017-11-16"]
+        assert len(data["rankings"]["items"]) == 3
+        assert data["retention"][1] == [1, "2017-11-15", 72.0]
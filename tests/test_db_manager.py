@@ -0,0 +1,293 @@
+"""
+数据库连接管理器单元测试
+覆盖 SQLite 连接池的创建、借还与关闭。
+"""
+
+import sqlite3
+from unittest.mock import MagicMock
+
+import pytest
+
+import db.manager as manager_module
+from db.manager import DatabaseManager
+
+
+@pytest.fixture
+def fresh_manager(tmp_path, monkeypatch):
+    """构建独立于全局单例的 DatabaseManager，指向临时 SQLite 文件"""
+    db_file = tmp_path / "test.db"
+    conn = sqlite3.connect(db_file)
+    conn.execute("CREATE TABLE t (x INTEGER)")
+    conn.execute("INSERT INTO t VALUES (1)")
+    conn.commit()
+    conn.close()
+
+    monkeypatch.setattr(manager_module, "SQLITE_DB", str(db_file))
+    monkeypatch.setattr(manager_module, "SQLITE_POOL_SIZE", 2)
+
+    mgr = DatabaseManager()
+    yield mgr
+    mgr.close_all()
+
+
+class TestSqlitePool:
+    """SQLite 长连接池"""
+
+    def test_pool_created_lazily(self, fresh_manager):
+        assert fresh_manager._sqlite_pool is None
+        with fresh_manager.get_sqlite_cursor() as cursor:
+            assert cursor.execute("SELECT x FROM t").fetchone()["x"] == 1
+        assert fresh_manager._sqlite_pool.qsize() == 2
+
+    def test_connection_returned_to_pool(self, fresh_manager):
+        """借出期间池容量减少，退出上下文后归还"""
+        with fresh_manager.get_sqlite_cursor():
+            assert fresh_manager._sqlite_pool.qsize() == 1
+        assert fresh_manager._sqlite_pool.qsize() == 2
+
+    def test_connections_reused(self, fresh_manager):
+        """连接跨调用复用，不会重复创建"""
+        for _ in range(5):
+            with fresh_manager.get_sqlite_cursor() as cursor:
+                cursor.execute("SELECT 1")
+        assert len(fresh_manager._sqlite_conns) == 2
+
+    def test_pragmas_applied(self, fresh_manager):
+        with fresh_manager.get_sqlite_cursor() as cursor:
+            assert cursor.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+            assert cursor.execute("PRAGMA temp_store").fetchone()[0] == 2
+            assert cursor.execute("PRAGMA synchronous").fetchone()[0] == 1   # NORMAL
+            assert cursor.execute("PRAGMA cache_size").fetchone()[0] == -65536
+            assert cursor.execute("PRAGMA busy_timeout").fetchone()[0] == 5000
+
+    def test_reader_rejects_writes(self, fresh_manager):
+        """只读池连接开启 query_only，写入直接报错"""
+        with pytest.raises(sqlite3.OperationalError):
+            with fresh_manager.get_sqlite_cursor() as cursor:
+                cursor.execute("INSERT INTO t VALUES (2)")
+        assert fresh_manager._sqlite_pool.qsize() == 2
+
+
+class TestSqliteRollups:
+    """建池时准备按日汇总表"""
+
+    @pytest.fixture
+    def fact_manager(self, tmp_path, monkeypatch):
+        """指向仅含 buy_fact（无汇总表）的临时库"""
+        db_file = tmp_path / "fact.db"
+        conn = sqlite3.connect(db_file)
+        conn.execute(
+            "CREATE TABLE buy_fact (user_id INTEGER, item_id INTEGER, category_id INTEGER, "
+            "price REAL, date TEXT, channel TEXT, age_group TEXT, order_id TEXT)"
+        )
+        conn.execute("INSERT INTO buy_fact VALUES (1, 101, 10, 99.9, '2017-11-15', '官网', '18-24', 'O1')")
+        conn.commit()
+        conn.close()
+        monkeypatch.setattr(manager_module, "SQLITE_DB", str(db_file))
+        monkeypatch.setattr(manager_module, "SQLITE_POOL_SIZE", 2)
+        mgr = DatabaseManager()
+        yield mgr
+        mgr.close_all()
+
+    def test_pool_build_creates_rollups(self, fact_manager):
+        fact_manager._get_sqlite_pool()
+        assert fact_manager.sqlite_rollups_ready is True
+        with fact_manager.get_sqlite_cursor() as cursor:
+            row = cursor.execute("SELECT date, total_sales, total_orders FROM sales_daily").fetchone()
+        assert tuple(row) == ("2017-11-15", 99.9, 1)
+
+    def test_clickhouse_fallback_creates_rollups(self, fact_manager):
+        """断路器打开、运行中降级到 SQLite 时同样准备汇总表"""
+        import time
+        fact_manager._ch_cb_open_until = time.time() + 60
+        assert fact_manager.get_connection() == (None, True)
+        assert fact_manager.sqlite_rollups_ready is True
+        backend = fact_manager.get_backend()
+        assert backend.fetch_core_metrics("2017-11-15", "2017-11-15")["total_orders"] == 1
+
+    def test_missing_fact_table_marks_not_ready(self, fresh_manager):
+        """buy_fact 不存在时构建失败只告警，不影响建池"""
+        with fresh_manager.get_sqlite_cursor() as cursor:
+            assert cursor.execute("SELECT x FROM t").fetchone()["x"] == 1
+        assert fresh_manager.sqlite_rollups_ready is False
+
+    def test_close_all_resets_ready(self, fact_manager):
+        fact_manager._get_sqlite_pool()
+        fact_manager.close_all()
+        assert fact_manager.sqlite_rollups_ready is False
+
+
+class TestSqliteWriter:
+    """SQLite 单写连接"""
+
+    def test_writer_commits_on_exit(self, fresh_manager):
+        """写连接正常退出时提交，读连接池可见"""
+        with fresh_manager.get_sqlite_writer() as cursor:
+            cursor.execute("INSERT INTO t VALUES (2)")
+        with fresh_manager.get_sqlite_cursor() as cursor:
+            assert cursor.execute("SELECT COUNT(*) FROM t").fetchone()[0] == 2
+
+    def test_writer_holds_reserved_lock(self, fresh_manager, tmp_path):
+        """写事务进入即持有写锁：其他连接的写入立即冲突，读取不受影响"""
+        other = sqlite3.connect(tmp_path / "test.db", timeout=0)
+        try:
+            with fresh_manager.get_sqlite_writer() as cursor:
+                assert cursor.connection.in_transaction
+                with pytest.raises(sqlite3.OperationalError, match="locked"):
+                    other.execute("BEGIN IMMEDIATE")
+                assert other.execute("SELECT COUNT(*) FROM t").fetchone()[0] == 1
+        finally:
+            other.close()
+
+    def test_writer_rolls_back_on_error(self, fresh_manager):
+        with pytest.raises(RuntimeError):
+            with fresh_manager.get_sqlite_writer() as cursor:
+                cursor.execute("INSERT INTO t VALUES (2)")
+                raise RuntimeError("boom")
+        with fresh_manager.get_sqlite_cursor() as cursor:
+            assert cursor.execute("SELECT COUNT(*) FROM t").fetchone()[0] == 1
+
+    def test_close_all_closes_writer(self, fresh_manager):
+        with fresh_manager.get_sqlite_writer():
+            pass
+        fresh_manager.close_all()
+        assert fresh_manager._sqlite_writer is None
+
+    def test_missing_db_raises(self, fresh_manager, monkeypatch, tmp_path):
+        monkeypatch.setattr(manager_module, "SQLITE_DB", str(tmp_path / "missing.db"))
+        with pytest.raises(Exception, match="不存在"):
+            with fresh_manager.get_sqlite_cursor():
+                pass
+
+    def test_close_all_resets_pool(self, fresh_manager):
+        with fresh_manager.get_sqlite_cursor():
+            pass
+        fresh_manager.close_all()
+        assert fresh_manager._sqlite_pool is None
+        assert fresh_manager._sqlite_conns == []
+
+
+class TestDateRangeCache:
+    """日期范围缓存与手动失效"""
+
+    def test_cached_until_invalidated(self, fresh_manager):
+        from unittest.mock import MagicMock
+        backend = MagicMock()
+        backend.fetch_date_range_impl.side_effect = [
+            ("2017-11-01", "2017-12-10"),
+            ("2017-11-01", "2017-12-11"),
+        ]
+        assert fresh_manager.get_date_range_cached(backend) == ("2017-11-01", "2017-12-10")
+        assert fresh_manager.get_date_range_cached(backend) == ("2017-11-01", "2017-12-10")
+        assert backend.fetch_date_range_impl.call_count == 1
+
+        fresh_manager.invalidate_date_range()
+        assert fresh_manager.get_date_range_cached(backend) == ("2017-11-01", "2017-12-11")
+        assert backend.fetch_date_range_impl.call_count == 2
+
+    def test_expires_on_monotonic_clock(self, fresh_manager, monkeypatch):
+        """TTL 按单调时钟计算，墙上时间回拨不影响过期判断"""
+        backend = MagicMock()
+        backend.fetch_date_range_impl.return_value = ("2017-11-01", "2017-12-10")
+        clock = [1000.0]
+        monkeypatch.setattr(manager_module.time, "monotonic", lambda: clock[0])
+        monkeypatch.setattr(manager_module.time, "time", lambda: 0.0)
+
+        fresh_manager.get_date_range_cached(backend)
+        clock[0] += fresh_manager._date_range_ttl - 1
+        fresh_manager.get_date_range_cached(backend)
+        assert backend.fetch_date_range_impl.call_count == 1
+
+        clock[0] += 2
+        fresh_manager.get_date_range_cached(backend)
+        assert backend.fetch_date_range_impl.call_count == 2
+
+
+class TestClickHouseHeartbeat:
+    """ClickHouse 心跳 TTL 与查询失败后的惰性过期"""
+
+    @pytest.fixture
+    def ch_manager(self, fresh_manager):
+        import time
+        fresh_manager._ch_state = (True, MagicMock())
+        fresh_manager._ch_heartbeat_ts = time.time()
+        return fresh_manager
+
+    def test_fresh_heartbeat_skips_probe(self, ch_manager):
+        """TTL 内获取连接不发送 SELECT 1"""
+        client, is_sqlite = ch_manager.get_connection()
+        assert client is ch_manager._ch_state[1] and is_sqlite is False
+        client.query.assert_not_called()
+
+    def test_failed_query_expires_heartbeat(self, ch_manager):
+        """真实查询失败后，下一次获取连接立即重新探测"""
+        from dao.backend import ClickHouseBackend
+        client = ch_manager._ch_state[1]
+        client.query.side_effect = [ConnectionError("down"), MagicMock()]
+        backend = ClickHouseBackend(client)
+        with pytest.raises(ConnectionError):
+            with pytest.MonkeyPatch.context() as mp:
+                mp.setattr(manager_module, "db_manager", ch_manager)
+                backend.fetch_top10("2017-11-15", "2017-11-16")
+        assert ch_manager._ch_heartbeat_ts == 0.0
+
+        ch_manager.get_connection()
+        client.query.assert_called_with("SELECT 1")
+
+
+class TestClickHouseRetry:
+    """ClickHouse 重连指数退避"""
+
+    def test_backoff_with_jitter(self, fresh_manager, monkeypatch):
+        """每次重试的等待时长 = 基础延迟 × 退避倍数^(n-1) × 抖动系数"""
+        import sys
+        fake_ch = MagicMock()
+        fake_ch.get_client.side_effect = ConnectionError("refused")
+        monkeypatch.setitem(sys.modules, "clickhouse_connect", fake_ch)
+        sleeps = []
+        monkeypatch.setattr(manager_module.time, "sleep", sleeps.append)
+        monkeypatch.setattr(manager_module.random, "uniform", lambda a, b: 1.5)
+
+        assert fresh_manager._try_clickhouse_with_retry() is False
+        base, factor = manager_module.CH_RETRY_BASE_DELAY, manager_module.CH_RETRY_BACKOFF
+        assert sleeps == [base * factor ** n * 1.5 for n in range(manager_module.CH_MAX_RETRIES - 1)]
+
+    def test_client_uses_configured_endpoint(self, fresh_manager, monkeypatch):
+        """连接参数来自 core.config，且关闭自动 session_id"""
+        import sys
+        fake_ch = MagicMock()
+        monkeypatch.setitem(sys.modules, "clickhouse_connect", fake_ch)
+
+        assert fresh_manager._try_clickhouse_with_retry() is True
+        kwargs = fake_ch.get_client.call_args.kwargs
+        assert kwargs["host"] == manager_module.CH_HOST
+        assert kwargs["port"] == manager_module.CH_PORT
+        assert kwargs["autogenerate_session_id"] is False
+
+    def test_missing_driver_falls_back_without_retry(self, fresh_manager, monkeypatch):
+        """未安装 clickhouse_connect 时不重试、不等待"""
+        import sys
+        monkeypatch.setitem(sys.modules, "clickhouse_connect", None)
+        sleeps = []
+        monkeypatch.setattr(manager_module.time, "sleep", sleeps.append)
+
+        assert fresh_manager._try_clickhouse_with_retry() is False
+        assert fresh_manager._ch_state == (False, None)
+        assert sleeps == []
+
+    def test_failed_heartbeat_resets_state_atomically(self, fresh_manager, monkeypatch):
+        """心跳失败后状态整体重置并重新连接，新 client 与可用标志同时生效"""
+        old_client = MagicMock()
+        old_client.query.side_effect = ConnectionError("down")
+        fresh_manager._ch_state = (True, old_client)
+        fresh_manager._ch_heartbeat_ts = 0.0
+        new_client = MagicMock()
+
+        def reconnect():
+            fresh_manager._ch_state = (True, new_client)
+            return True
+
+        monkeypatch.setattr(fresh_manager, "_try_clickhouse_with_retry", reconnect)
+        client, is_sqlite = fresh_manager.get_connection()
+        assert client is new_client and is_sqlite is False
+        assert fresh_manager._ch_state == (True, new_client)
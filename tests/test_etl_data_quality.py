@@ -48,6 +48,13 @@ class TestDataQualityReportBasic:
         assert profile["label"] == "核心高价值"
         assert profile["user_count"] == 1500
 
+    def test_slots_reject_unknown_attributes(self):
+        """__slots__ 固定属性集，拼写错误的属性赋值会直接报错"""
+        import pytest
+        dq = DataQualityReport()
+        with pytest.raises(AttributeError):
+            dq.metric = {}
+
     def test_empty_report(self):
         """空报告的初始状态正确"""
         dq = DataQualityReport()
@@ -126,6 +133,15 @@ class TestDataQualityReportJsonExport:
         profiles = json.loads(result["cluster_profiles"])
         assert profiles[0]["label"] == "标签A"
 
+    def test_elapsed_uses_monotonic_clock(self, monkeypatch):
+        """耗时按单调时钟计算，墙上时间回拨不会得到负值"""
+        import time
+        clock = [100.0]
+        monkeypatch.setattr(time, "monotonic", lambda: clock[0])
+        dq = DataQualityReport()
+        clock[0] += 2.5
+        assert dq.to_json_dict()["elapsed_seconds"] == 2.5
+
     def test_empty_json_dict(self):
         """空报告的 JSON 导出"""
         dq = DataQualityReport()
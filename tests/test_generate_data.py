@@ -0,0 +1,84 @@
+"""
+模拟数据生成器单元测试
+缩小数据规模后实际运行 generate_items / generate_users / generate_behaviors，
+校验 Arrow 写出的 CSV 与原 csv.writer 的输出逐行一致（表头、引号、浮点写法、列数）。
+"""
+
+import csv
+import io
+
+import pytest
+
+pytest.importorskip("numpy")
+pytest.importorskip("pyarrow")
+
+import generate_data  # noqa: E402
+
+
+@pytest.fixture
+def small_generator(tmp_path, monkeypatch):
+    """缩小规模并把输出重定向到临时目录"""
+    monkeypatch.setattr(generate_data, "NUM_USERS", 200)
+    monkeypatch.setattr(generate_data, "NUM_ITEMS", 100)
+    monkeypatch.setattr(generate_data, "NUM_CATEGORIES", 10)
+    monkeypatch.setattr(generate_data, "TARGET_ROWS", 2000)
+    monkeypatch.setattr(generate_data, "ITEMS_FILE", str(tmp_path / "items_simulated.csv"))
+    monkeypatch.setattr(generate_data, "USERS_FILE", str(tmp_path / "users_simulated.csv"))
+    monkeypatch.setattr(generate_data, "BEHAVIOR_FILE", str(tmp_path / "UserBehavior.csv"))
+    generate_data.np.random.seed(generate_data.SEED)
+    return generate_data
+
+
+def _read_lines(path):
+    with open(path, encoding="utf-8") as f:
+        return f.read().splitlines()
+
+
+def _csv_writer_lines(rows, header=None):
+    """原实现的 csv.writer 输出（行尾差异不影响 Spark 读取，按行比较）"""
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    if header:
+        writer.writerow(header)
+    writer.writerows(rows)
+    return buf.getvalue().splitlines()
+
+
+class TestGenerateCsv:
+    """Arrow CSV 写出格式与原 csv.writer 一致"""
+
+    def test_items_csv(self, small_generator):
+        items = small_generator.generate_items()
+        lines = _read_lines(small_generator.ITEMS_FILE)
+
+        assert lines[0] == "item_id,category_id,price"
+        expected = _csv_writer_lines(
+            zip(items["item_id"].tolist(), items["category_id"].tolist(), items["price"].tolist()),
+            header=["item_id", "category_id", "price"],
+        )
+        assert lines == expected
+        assert all(len(line.split(",")) == 3 for line in lines)
+
+    def test_users_csv(self, small_generator):
+        users = small_generator.generate_users()
+        lines = _read_lines(small_generator.USERS_FILE)
+
+        assert lines[0] == "user_id,age_group,channel"
+        expected = _csv_writer_lines(
+            zip(users["user_id"].tolist(), users["age_group"].tolist(), users["channel"].tolist()),
+            header=["user_id", "age_group", "channel"],
+        )
+        assert lines == expected
+        assert all(len(line.split(",")) == 3 for line in lines)
+
+    def test_behavior_csv_no_header_unquoted(self, small_generator):
+        items = small_generator.generate_items()
+        users = small_generator.generate_users()
+        behaviors = small_generator.generate_behaviors(items, users)
+        lines = _read_lines(small_generator.BEHAVIOR_FILE)
+
+        # 无表头、不加引号，与原始 UserBehavior.csv 格式一致
+        assert len(lines) == len(behaviors) == 2000
+        assert lines == _csv_writer_lines(behaviors.tolist())
+        assert all(len(line.split(",")) == 5 for line in lines)
+        assert '"' not in "".join(lines)
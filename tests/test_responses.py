@@ -0,0 +1,59 @@
+"""
+orjson 响应类单元测试
+验证 ORJSONResponse 对 Decimal、日期等数据库原生类型的序列化兜底。
+"""
+
+import datetime
+from decimal import Decimal
+
+import orjson
+
+from api.responses import ORJSONResponse
+
+
+class TestORJSONResponse:
+    """ORJSONResponse.render 序列化测试"""
+
+    def test_plain_dict(self):
+        """普通字典正常序列化，中文不转义"""
+        resp = ORJSONResponse(content={"code": 200, "message": "成功"})
+        assert orjson.loads(resp.body) == {"code": 200, "message": "成功"}
+        assert resp.media_type == "application/json"
+
+    def test_decimal_and_date(self):
+        """ClickHouse 返回的 Decimal / date 可被序列化"""
+        resp = ORJSONResponse(content={
+            "sales": Decimal("99.90"),
+            "date": datetime.date(2017, 11, 15),
+        })
+        parsed = orjson.loads(resp.body)
+        assert parsed["sales"] == 99.9
+        assert parsed["date"] == "2017-11-15"
+
+    def test_non_str_keys(self):
+        """非字符串键（如 day_diff 整数）可被序列化"""
+        resp = ORJSONResponse(content={0: 100, 1: 72})
+        assert orjson.loads(resp.body) == {"0": 100, "1": 72}
+
+    def test_ok_response_envelope(self):
+        """ok_response 产出与 ApiResponse 一致的标准信封"""
+        from api.responses import ok_response
+        from api.schemas import ApiResponse
+        data = [[0, "2017-11-15", 100.0], [1, "2017-11-15", 72.0]]
+        resp = ok_response(data)
+        assert orjson.loads(resp.body) == ApiResponse(data=data).model_dump()
+
+
+class TestExceptionHandlers:
+    """全局异常处理器响应体"""
+
+    def test_global_handler_prebuilt_body(self):
+        """未捕获异常 → 500 + 标准错误信封"""
+        import asyncio
+        from unittest.mock import MagicMock
+        from api.exception_handlers import global_exception_handler
+        request = MagicMock()
+        resp = asyncio.run(global_exception_handler(request, RuntimeError("boom")))
+        assert resp.status_code == 500
+        assert resp.media_type == "application/json"
+        assert orjson.loads(resp.body) == {"code": 500, "message": "Internal Server Error"}